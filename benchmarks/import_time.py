@@ -0,0 +1,62 @@
+# benchmarks/import_time.py
+#
+# Measures the cold-start import cost of the root agent and guards the lazy loading
+# of sub-agents: importing the root agent must not import the heavy dependencies
+# that only the sub-agents' tools need.
+#
+# Usage: python benchmarks/import_time.py [--module src.txn_agent.agents.root] [--runs 3] [--max-seconds 3.0]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["google.cloud.bigquery", "vertexai", "pandas", "numpy"]
+
+def measure_import(module: str) -> tuple[float, list[tuple[int, str]], list[str]]:
+    """Imports module in a fresh interpreter and returns its cumulative import time, the slowest imports and the heavy modules it loaded."""
+    check = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", check],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative), name.strip()))
+    total_us = next(cumulative for cumulative, name in timings if name == module)
+    loaded_heavy = [name for name in result.stdout.strip().split(",") if name]
+    return total_us / 1e6, sorted(timings, reverse=True), loaded_heavy
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the agent package.")
+    parser.add_argument("--module", default="src.txn_agent.agents.root")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail when the median import time exceeds this.")
+    args = parser.parse_args()
+
+    durations = []
+    for _ in range(args.runs):
+        duration, timings, loaded_heavy = measure_import(args.module)
+        durations.append(duration)
+
+    median = statistics.median(durations)
+    print(f"Import of {args.module}: median {median:.3f}s over {args.runs} runs (min {min(durations):.3f}s, max {max(durations):.3f}s)")
+    print("Slowest top-level imports of the last run (cumulative):")
+    top_level = [(cumulative, name) for cumulative, name in timings if "." not in name or name.startswith("src.")]
+    for cumulative, name in top_level[:10]:
+        print(f"  {cumulative / 1e3:9.1f} ms  {name}")
+
+    failures = []
+    if loaded_heavy:
+        failures.append(f"importing {args.module} loaded heavy modules eagerly: {', '.join(loaded_heavy)}")
+    if args.max_seconds is not None and median > args.max_seconds:
+        failures.append(f"median import time {median:.3f}s exceeds {args.max_seconds:.3f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 # Generates high-fidelity, narratively cohesive synthetic data for testing
 # AI/ML models for credit scoring based on transaction history.
-# Version 8.3 - Standardized cleaned fields to uppercase.
+# Version 8.5 - Catalogs are requested in chunks that fit the output limit; failed catalogs are retried by the next consumer.
 
 import os
 import json
@@ -18,6 +18,8 @@ from typing import List, Dict, Any, Optional, Tuple
 from faker import Faker
 # NumPy for statistical modeling
 import numpy as np
+# pandas for building sampled transactions column-wise
+import pandas as pd
 
 # Using Vertex AI SDK for GCP integration
 import vertexai
@@ -38,6 +40,14 @@ MIN_VARIABLE_TRANSACTIONS_PER_MONTH = 25
 MAX_VARIABLE_TRANSACTIONS_PER_MONTH = 35
 TRANSACTION_HISTORY_MONTHS = 24
 CONCURRENT_CONSUMER_JOBS = 10
+# "monthly" asks Gemini for every consumer-month; "catalog" asks once per persona for a merchant
+# catalog and samples every month locally from it, which needs far fewer LLM calls for large datasets.
+GENERATION_MODE = os.getenv("GENERATION_MODE", "monthly")
+CATALOG_ENTRIES_PER_PERSONA = 80
+# Catalogs are requested in chunks so no response comes close to the output limit; the limit also
+# covers the model's thinking tokens, so catalog requests get more headroom than monthly ones.
+CATALOG_ENTRIES_PER_REQUEST = 20
+CATALOG_MAX_OUTPUT_TOKENS = 32768
 
 
 # --- Setup Logging ---
@@ -103,17 +113,20 @@ LIFE_EVENT_IMPACT_MATRIX = {
     "Unexpected Major Car Repair": {
         "category": "Negative Financial Shock", "magnitude_range": (-2500, -1000), "duration": 2,
         "primary_signature": {"secondary_category": "Auto & Transport", "merchant_options": ["Firestone Auto Care", "Pep Boys", "Local Mechanic LLC"]},
-        "secondary_effects_prompt": "Reflect a period of reduced discretionary spending (less Food & Dining, Shopping, Entertainment) for the next 2 months to recover from the car repair cost."
+        "secondary_effects_prompt": "Reflect a period of reduced discretionary spending (less Food & Dining, Shopping, Entertainment) for the next 2 months to recover from the car repair cost.",
+        "category_multipliers": {"Food & Dining": 0.6, "Shopping": 0.5, "Entertainment": 0.5, "Coffee Shop": 0.7, "Travel & Vacation": 0.3}
     },
     "Significant Medical Bill": {
         "category": "Negative Financial Shock", "magnitude_range": (-3000, -500), "duration": 3,
         "primary_signature": {"secondary_category": "Medical", "merchant_options": ["Local Hospital Billing", "Specialist Co-Pay", "Out-of-Network Dr."]},
-        "secondary_effects_prompt": "Significantly reduce non-essential spending for the next 3 months to accommodate this large, unexpected medical cost."
+        "secondary_effects_prompt": "Significantly reduce non-essential spending for the next 3 months to accommodate this large, unexpected medical cost.",
+        "category_multipliers": {"Food & Dining": 0.5, "Shopping": 0.4, "Entertainment": 0.4, "Coffee Shop": 0.6, "Travel & Vacation": 0.2, "Pharmacy": 1.5}
     },
     "Annual Work Bonus": {
         "category": "Positive Financial Shock", "magnitude_range": (2000, 5000), "duration": 2,
         "primary_signature": {"secondary_category": "Payroll", "merchant_options": ["ADP PAYROLL BONUS", "COMPANY BONUS DIRECT DEPOSIT"]},
-        "secondary_effects_prompt": "Reflect a temporary increase in high-ticket or premium spending (e.g., Travel & Vacation, Shopping) for the next 2 months following the bonus."
+        "secondary_effects_prompt": "Reflect a temporary increase in high-ticket or premium spending (e.g., Travel & Vacation, Shopping) for the next 2 months following the bonus.",
+        "category_multipliers": {"Travel & Vacation": 2.5, "Shopping": 1.6, "Food & Dining": 1.2, "Entertainment": 1.3}
     },
 }
 
@@ -194,6 +207,15 @@ AMOUNT_DISTRIBUTIONS = {
     "Default": {"log_mean": 3.0, "log_std": 1.0}
 }
 
+# Relative change in how often each category occurs, by calendar month (catalog mode).
+SEASONAL_CATEGORY_MULTIPLIERS = {
+    11: {"Shopping": 1.6, "Entertainment": 1.2},
+    12: {"Shopping": 2.0, "Food & Dining": 1.3, "Entertainment": 1.3, "Travel & Vacation": 1.4},
+    6: {"Travel & Vacation": 1.8, "Entertainment": 1.2},
+    7: {"Travel & Vacation": 1.8, "Entertainment": 1.2},
+    8: {"Travel & Vacation": 1.5, "Entertainment": 1.2},
+}
+
 WEEKDAY_HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 5, 8, 9, 7, 5, 6, 10, 10, 8, 6, 7, 9, 9, 8, 6, 4, 3, 2]
 WEEKEND_HOUR_WEIGHTS = [2, 2, 1, 1, 1, 2, 3, 4, 6, 8, 10, 10, 9, 8, 7, 7, 8, 9, 9, 8, 6, 5, 4, 3]
 
@@ -229,19 +251,23 @@ TRANSACTION_SCHEMA_FOR_LLM = {
     }
 }
 
-def build_monthly_prompt(profile: Dict, month_date: datetime, transactions_this_month: int, active_event: Optional[Dict], seasonal_context: Optional[str]) -> str:
-    month_name = month_date.strftime("%B %Y")
-    persona = profile['persona']
-    narrative_block = "This was a typical month."
-    if active_event:
-        narrative_block = f"CRITICAL NARRATIVE EVENT: This month, the consumer is dealing with '{active_event['name']}'. {active_event['details']['secondary_effects_prompt']}"
-    elif seasonal_context:
-        narrative_block = f"SEASONAL CONTEXT: {seasonal_context}"
+CATALOG_SCHEMA_FOR_LLM = {
+    "type": "array", "items": {
+        "type": "object", "properties": {
+            "description_raw": {"type": "string", "description": "A typical raw transaction line item for this merchant, including prefixes (SQ*, POS Debit), location or reference details."},
+            "merchant_name_raw": {"type": "string", "description": "The raw merchant name as it appears in the description."},
+            "merchant_name_cleaned": {"type": "string", "description": "The cleaned, canonical merchant name."},
+            "secondary_category": {"type": "string", "enum": VALID_CATEGORIES["Income"] + VALID_CATEGORIES["Expense"], "description": "The detailed sub-category of transactions at this merchant."},
+            "channel": {"type": "string", "enum": CHANNELS, "description": "The channel transactions at this merchant typically use."},
+            "frequency_weight": {"type": "number", "description": "How often this persona transacts here relative to the other entries, from 1 (rarely) to 10 (several times a week)."}
+        }, "required": ["description_raw", "merchant_name_raw", "merchant_name_cleaned", "secondary_category", "channel", "frequency_weight"]
+    }
+}
 
+def build_persona_system_instruction(profile: Dict) -> str:
+    persona = profile['persona']
     income_merchant_example = random.choice(persona.get("income_merchants", ["DEPOSIT"]))
     
-    persona_expense_categories = random.sample(VALID_CATEGORIES["Expense"], k=5)
-    
     few_shot_examples = f"""
     **High-Quality Output Examples (for style guidance only):**
     ```json
@@ -256,11 +282,10 @@ def build_monthly_prompt(profile: Dict, month_date: datetime, transactions_this_
     """
     
     return f"""
-    Generate a flat JSON array of exactly {transactions_this_month} realistic, variable bank transactions for '{profile["consumer_name"]}' for **{month_name}**.
+    You generate realistic, variable bank transactions for '{profile["consumer_name"]}', one month at a time.
     - Persona: '{persona["persona_name"]}'.
     - **Income Focus:** Primary income should be categorized as '{persona['income_type']}' from sources like: {', '.join(persona['income_merchants'])}. Also include other income types like 'Refund' or 'Peer-to-Peer Credit' where appropriate.
-    - **Expense Focus:** Generate transactions reflecting spending in categories like: {', '.join(persona_expense_categories)}. Also include 'Peer-to-Peer Debit' transactions where logical (e.g., paying a friend).
-    - **Monthly Narrative:** {narrative_block}
+    - Also include 'Peer-to-Peer Debit' transactions where logical (e.g., paying a friend).
     **CRITICAL INSTRUCTIONS:**
     1.  **Use Valid Categories:** The `secondary_category` MUST be one of the allowed values.
     2.  **Differentiate Descriptions:** The `description_raw` MUST be more detailed than `merchant_name_raw`. It should contain the merchant name plus other realistic data like store numbers, transaction type prefixes (e.g. 'SQ *', 'POS Debit'), locations, or reference IDs. For Peer-to-Peer transactions, the merchant name should be a person's name.
@@ -269,7 +294,39 @@ def build_monthly_prompt(profile: Dict, month_date: datetime, transactions_this_
     5.  Do NOT generate predictable monthly bills; they are handled separately.
     6.  The entire output MUST be ONLY the raw JSON array, conforming strictly to the provided schema.
     {few_shot_examples}
-    **Your Task:** Generate the JSON array for **{month_name}**.
+    """
+
+def build_monthly_prompt(month_date: datetime, transactions_this_month: int, active_event: Optional[Dict], seasonal_context: Optional[str]) -> str:
+    month_name = month_date.strftime("%B %Y")
+    narrative_block = "This was a typical month."
+    if active_event:
+        narrative_block = f"CRITICAL NARRATIVE EVENT: This month, the consumer is dealing with '{active_event['name']}'. {active_event['details']['secondary_effects_prompt']}"
+    elif seasonal_context:
+        narrative_block = f"SEASONAL CONTEXT: {seasonal_context}"
+
+    persona_expense_categories = random.sample(VALID_CATEGORIES["Expense"], k=5)
+
+    return f"""
+    Generate a flat JSON array of exactly {transactions_this_month} transactions for **{month_name}**.
+    - **Expense Focus:** Generate transactions reflecting spending in categories like: {', '.join(persona_expense_categories)}.
+    - **Monthly Narrative:** {narrative_block}
+    """
+
+def build_catalog_prompt(persona: Dict, num_entries: int, known_merchants: Optional[List[str]] = None) -> str:
+    exclusion_block = ""
+    if known_merchants:
+        exclusion_block = f"    5.  The catalog is generated in parts. Do NOT repeat any of these merchants from earlier parts: {', '.join(known_merchants)}."
+    return f"""
+    Generate a merchant catalog of exactly {num_entries} entries for a consumer with the persona '{persona["persona_name"]}'.
+    Each entry is a merchant, employer or person this consumer transacts with, with a typical raw description, a category, a channel and a relative frequency.
+    - **Income:** Include the primary income, categorized as '{persona['income_type']}', from sources like: {', '.join(persona['income_merchants'])}. Also include 'Refund', 'Interest Income' and 'Peer-to-Peer Credit' sources where appropriate.
+    - **Expenses:** Cover the everyday spending of this persona across many expense categories, with several merchants per common category (e.g., Groceries, Food & Dining, Coffee Shop, Shopping, Auto & Transport), plus 'Peer-to-Peer Debit' payments to people.
+    **CRITICAL INSTRUCTIONS:**
+    1.  The `secondary_category` MUST be one of the allowed values, and the `channel` MUST fit the merchant (e.g., 'Point-of-Sale' for in-store purchases, 'Card-Not-Present' for online ones, 'ACH' for payroll).
+    2.  The `description_raw` MUST be more detailed than `merchant_name_raw`, and `merchant_name_raw` MUST be a logical part of it. For Peer-to-Peer transactions, the merchant name should be a person's name.
+    3.  Do NOT include predictable monthly bills such as rent, mortgage, loans, insurance or utilities; they are handled separately.
+    4.  The entire output MUST be ONLY the raw JSON array, conforming strictly to the provided schema.
+{exclusion_block}
     """
 
 # --- IV. CLIENT & BQ SETUP ---
@@ -291,6 +348,7 @@ TRANSACTIONS_SCHEMA = [
     bigquery.SchemaField("institution_name", "STRING"), bigquery.SchemaField("account_type", "STRING"),
     bigquery.SchemaField("transaction_date", "TIMESTAMP"), bigquery.SchemaField("transaction_type", "STRING"),
     bigquery.SchemaField("amount", "FLOAT"), bigquery.SchemaField("is_recurring", "BOOLEAN"),
+    bigquery.SchemaField("recurring_period", "STRING"),
     bigquery.SchemaField("description_raw", "STRING"), bigquery.SchemaField("description_cleaned", "STRING"),
     bigquery.SchemaField("merchant_name_raw", "STRING"), bigquery.SchemaField("merchant_name_cleaned", "STRING"),
     bigquery.SchemaField("primary_category", "STRING"), bigquery.SchemaField("secondary_category", "STRING"),
@@ -299,11 +357,12 @@ TRANSACTIONS_SCHEMA = [
 ]
 
 @retry_async.AsyncRetry(predicate=retry_async.if_exception_type(exceptions.Aborted, exceptions.DeadlineExceeded, exceptions.ServiceUnavailable, exceptions.TooManyRequests), initial=1.0, maximum=16.0, multiplier=2.0)
-async def generate_data_with_gemini(prompt: str) -> List[Dict[str, Any]]:
+async def generate_data_with_gemini(prompt: str, llm: Optional[GenerativeModel] = None, response_schema: Dict = TRANSACTION_SCHEMA_FOR_LLM, max_output_tokens: int = 8192) -> List[Dict[str, Any]]:
+    llm = llm or model
     logging.info(f"Sending prompt to Gemini (first 120 chars): {prompt[:120].strip().replace('/n', '')}...")
     try:
-        generation_config = GenerationConfig(response_mime_type="application/json", response_schema=TRANSACTION_SCHEMA_FOR_LLM, temperature=1.0, max_output_tokens=8192)
-        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        generation_config = GenerationConfig(response_mime_type="application/json", response_schema=response_schema, temperature=1.0, max_output_tokens=max_output_tokens)
+        response = await llm.generate_content_async(prompt, generation_config=generation_config)
         text_response = response.text.strip().replace("```json", "").replace("```", "")
         return json.loads(text_response)
     except json.JSONDecodeError as e:
@@ -323,6 +382,8 @@ def setup_bigquery_table():
     bq_client.delete_table(table_ref, not_found_ok=True)
     logging.info(f"Ensured old table '{TABLE_ID}' is removed.")
     table = bigquery.Table(table_ref, schema=TRANSACTIONS_SCHEMA)
+    table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.MONTH, field="transaction_date")
+    table.clustering_fields = ["account_id"]
     bq_client.create_table(table)
     logging.info(f"Sent request to create table '{TABLE_ID}'.")
     time.sleep(5) 
@@ -382,7 +443,7 @@ def inject_recurring_transactions(profile: Dict, history_months: int) -> List[Di
                 "transaction_id": f"TXN-{uuid.uuid4()}", "account_id": checking_account['account_id'],
                 "consumer_name": profile['consumer_name'], "persona_type": persona['persona_name'],
                 "institution_name": checking_account['institution_name'], "account_type": "Checking Account",
-                "transaction_date": date.isoformat(), "transaction_type": "Debit", "amount": amount, "is_recurring": True,
+                "transaction_date": date.isoformat(), "transaction_type": "Debit", "amount": amount, "is_recurring": True, "recurring_period": "monthly",
                 "description_raw": raw_desc, "description_cleaned": clean_description(raw_desc),
                 "merchant_name_raw": bill['merchant_name'],
                 # MODIFICATION: Ensure uppercase
@@ -419,19 +480,141 @@ def inject_programmatic_event_transactions(profile: Dict, life_events: List[Dict
         })
     return txns
 
+# --- CATALOG MODE ---
+
+# One catalog request per persona, shared by all consumers of that persona.
+_persona_catalog_tasks: Dict[str, asyncio.Task] = {}
+
+async def generate_persona_catalog(persona: Dict) -> List[Dict[str, Any]]:
+    valid_categories = set(VALID_CATEGORIES["Income"] + VALID_CATEGORIES["Expense"])
+    catalog_by_merchant: Dict[str, Dict[str, Any]] = {}
+    for _ in range(-(-CATALOG_ENTRIES_PER_PERSONA // CATALOG_ENTRIES_PER_REQUEST)):
+        num_entries = min(CATALOG_ENTRIES_PER_REQUEST, CATALOG_ENTRIES_PER_PERSONA - len(catalog_by_merchant))
+        if num_entries <= 0:
+            break
+        prompt = build_catalog_prompt(persona, num_entries, list(catalog_by_merchant))
+        entries = await generate_data_with_gemini(prompt, response_schema=CATALOG_SCHEMA_FOR_LLM, max_output_tokens=CATALOG_MAX_OUTPUT_TOKENS)
+        added = 0
+        for entry in entries:
+            if entry.get('secondary_category') not in valid_categories or not entry.get('merchant_name_cleaned') or not entry.get('description_raw'):
+                logging.warning(f"Skipping invalid catalog entry: {entry}")
+                continue
+            entry['merchant_name_cleaned'] = entry['merchant_name_cleaned'].upper()
+            if entry['merchant_name_cleaned'] in catalog_by_merchant:
+                continue
+            entry['channel'] = entry.get('channel') if entry.get('channel') in CHANNELS else "Card-Not-Present"
+            entry['frequency_weight'] = min(max(float(entry.get('frequency_weight') or 1.0), 0.5), 10.0)
+            catalog_by_merchant[entry['merchant_name_cleaned']] = entry
+            added += 1
+        if not added:
+            logging.warning(f"A catalog request for persona '{persona['persona_name']}' returned no new merchants; stopping at {len(catalog_by_merchant)} merchants.")
+            break
+    catalog = list(catalog_by_merchant.values())
+    logging.info(f"Generated a catalog of {len(catalog)} merchants for persona '{persona['persona_name']}'.")
+    return catalog
+
+async def get_persona_catalog(persona: Dict) -> List[Dict[str, Any]]:
+    name = persona['persona_name']
+    if name not in _persona_catalog_tasks:
+        _persona_catalog_tasks[name] = asyncio.ensure_future(generate_persona_catalog(persona))
+    task = _persona_catalog_tasks[name]
+    try:
+        catalog = await task
+    except Exception as e:
+        logging.error(f"Catalog generation failed for persona '{name}': {e}")
+        catalog = []
+    # Failed or empty catalogs are not cached, so the next consumer of this persona tries again.
+    if not catalog and _persona_catalog_tasks.get(name) is task:
+        del _persona_catalog_tasks[name]
+    return catalog
+
+def get_category_multipliers(month: int, active_event: Optional[Dict]) -> Dict[str, float]:
+    multipliers = dict(SEASONAL_CATEGORY_MULTIPLIERS.get(month, {}))
+    if active_event:
+        for category, multiplier in active_event['details'].get('category_multipliers', {}).items():
+            multipliers[category] = multipliers.get(category, 1.0) * multiplier
+    return multipliers
+
+def sample_catalog_transactions(profile: Dict, catalog: List[Dict[str, Any]], life_events: List[Dict], history_months: int, min_txns: int, max_txns: int) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng()
+    catalog_df = pd.DataFrame(catalog)
+    categories = [entry['secondary_category'] for entry in catalog]
+    base_weights = np.array([entry['frequency_weight'] for entry in catalog])
+    log_means = np.array([AMOUNT_DISTRIBUTIONS.get(c, AMOUNT_DISTRIBUTIONS["Default"])['log_mean'] for c in categories])
+    log_stds = np.array([AMOUNT_DISTRIBUTIONS.get(c, AMOUNT_DISTRIBUTIONS["Default"])['log_std'] for c in categories])
+    is_credit = np.isin(categories, VALID_CATEGORIES["Income"])
+    spending_accounts = [acc for acc in profile['accounts'].keys() if acc != "Savings Account"]
+    weekday_hours = np.array(WEEKDAY_HOUR_WEIGHTS) / sum(WEEKDAY_HOUR_WEIGHTS)
+    weekend_hours = np.array(WEEKEND_HOUR_WEIGHTS) / sum(WEEKEND_HOUR_WEIGHTS)
+    now = datetime.now(timezone.utc)
+    account_ids = {account_type: account['account_id'] for account_type, account in profile['accounts'].items()}
+    institutions = {account_type: account['institution_name'] for account_type, account in profile['accounts'].items()}
+    month_frames = []
+
+    for i in range(history_months):
+        month_date = now - relativedelta(months=i)
+        active_event = next((e for e in life_events if e['end_month_ago'] < i <= e['start_month_ago']), None)
+        multipliers = get_category_multipliers(month_date.month, active_event)
+        weights = base_weights * np.array([multipliers.get(c, 1.0) for c in categories])
+        # Multipliers change both the mix and the volume: a shock that halves dining also means fewer transactions.
+        count = int(round(rng.integers(min_txns, max_txns + 1) * weights.sum() / base_weights.sum()))
+        picks = rng.choice(len(catalog), size=count, p=weights / weights.sum())
+
+        amounts = np.round(rng.lognormal(log_means[picks], log_stds[picks]), 2)
+        days = rng.integers(1, 29, size=count)
+        is_weekday = (month_date.replace(day=1).weekday() + days - 1) % 7 < 5
+        hours = np.where(is_weekday, rng.choice(24, size=count, p=weekday_hours), rng.choice(24, size=count, p=weekend_hours))
+        minutes, seconds = rng.integers(0, 60, size=(2, count))
+        debit_accounts = rng.choice(spending_accounts, size=count)
+        store_numbers = np.where(rng.random(count) < 0.5, rng.integers(100, 10000, size=count), 0)
+
+        credit = is_credit[picks]
+        account_types = pd.Series(np.where(credit, "Checking Account", debit_accounts))
+        month_df = catalog_df.iloc[picks].reset_index(drop=True)
+        raw_descs = month_df['description_raw'].where(store_numbers == 0, month_df['description_raw'] + " #" + store_numbers.astype(str))
+        month_start = month_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        dates = (pd.Timestamp(month_start) + pd.to_timedelta(days - 1, unit='D') + pd.to_timedelta(hours, unit='h')
+                 + pd.to_timedelta(minutes, unit='m') + pd.to_timedelta(seconds, unit='s'))
+        month_frames.append(pd.DataFrame({
+            "transaction_id": [f"TXN-{uuid.uuid4()}" for _ in range(count)], "account_id": account_types.map(account_ids),
+            "consumer_name": profile['consumer_name'], "persona_type": profile['persona']['persona_name'],
+            "institution_name": account_types.map(institutions), "account_type": account_types,
+            "transaction_date": dates.strftime("%Y-%m-%dT%H:%M:%S+00:00"), "transaction_type": np.where(credit, "Credit", "Debit"),
+            "amount": np.where(credit, amounts, -amounts), "is_recurring": False,
+            "description_raw": raw_descs, "description_cleaned": raw_descs.map(clean_description),
+            "merchant_name_raw": month_df['merchant_name_raw'], "merchant_name_cleaned": month_df['merchant_name_cleaned'],
+            "primary_category": np.where(credit, "Income", "Expense"), "secondary_category": month_df['secondary_category'],
+            "channel": month_df['channel'].mask(month_df['secondary_category'].str.startswith("Peer-to-Peer"), "P2P"),
+            "categorization_update_timestamp": now.isoformat(),
+        }))
+    if not month_frames:
+        return []
+    return pd.concat(month_frames, ignore_index=True).to_dict('records')
+
 async def generate_cohesive_txns_for_consumer(profile: Dict, history_months: int, min_txns: int, max_txns: int) -> List[Dict[str, Any]]:
     logging.info(f"Generating full history for '{profile['consumer_name']}'...")
     life_events = generate_life_events(history_months)
     final_txns = inject_recurring_transactions(profile, history_months)
     final_txns.extend(inject_programmatic_event_transactions(profile, life_events))
+
+    if GENERATION_MODE == "catalog":
+        catalog = await get_persona_catalog(profile['persona'])
+        if catalog:
+            final_txns.extend(sample_catalog_transactions(profile, catalog, life_events, history_months, min_txns, max_txns))
+            return final_txns
+        logging.warning(f"⚠️ CATALOG FALLBACK: No catalog could be generated for persona '{profile['persona']['persona_name']}'; "
+                        f"'{profile['consumer_name']}' falls back to monthly generation with {history_months} LLM calls.")
+
+    # The persona context is identical for every month, so it is sent once as a system instruction.
+    consumer_model = GenerativeModel("gemini-2.5-flash", system_instruction=build_persona_system_instruction(profile))
     
     for i in range(history_months):
         month_date = datetime.now(timezone.utc) - relativedelta(months=i)
         active_event = next((e for e in life_events if e['end_month_ago'] < i <= e['start_month_ago']), None)
         seasonal = "Holiday season spending." if month_date.month in [11, 12] else "Summer vacation spending." if month_date.month in [6, 7, 8] else None
         
-        prompt = build_monthly_prompt(profile, month_date, random.randint(min_txns, max_txns), active_event, seasonal)
-        monthly_txns_from_llm = await generate_data_with_gemini(prompt)
+        prompt = build_monthly_prompt(month_date, random.randint(min_txns, max_txns), active_event, seasonal)
+        monthly_txns_from_llm = await generate_data_with_gemini(prompt, consumer_model)
         
         for txn in monthly_txns_from_llm:
             try:
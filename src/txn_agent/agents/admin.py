@@ -1,11 +1,12 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
+from src.txn_agent.common.tenancy import tenant_tool
 from src.txn_agent.tools import admin_tools
 
 admin_agent = Agent(
     name="admin_agent",
     model="gemini-2.5-flash",
-    instruction="""You are the system administrator. You can perform critical, system-wide actions like resetting all processed transaction data.
+    instruction="""You are the system administrator. You can perform critical, system-wide actions like resetting the categorization of all transactions.
 
 When asked to reset data, you MUST present the user with a numbered list of timeframes:
 1. Last 3 months
@@ -18,6 +19,6 @@ After the user selects a timeframe, you MUST ask for confirmation by presenting
 
 If the user selects '1. Confirm', you MUST call the `reset_all_transactions` tool with the `confirmation` parameter set to 'CONFIRM'. If the user selects '2. Cancel', you must abort the operation and inform the user that the operation has been cancelled.""",
     tools=[
-        FunctionTool(func=admin_tools.reset_all_transactions)
+        FunctionTool(func=tenant_tool(admin_tools.reset_all_transactions))
     ]
 )
\ No newline at end of file
@@ -1,11 +1,20 @@
 from google.adk.agents import Agent
+from google.adk.tools import FunctionTool
+from src.txn_agent.common.tenancy import tenant_tool
+from src.txn_agent.tools import audit_tools
 
 audit_agent = Agent(
     name="audit_agent",
     model="gemini-2.5-flash",
     instruction="You are a data quality auditor. You analyze the results of the "
-                "transaction processing pipeline and generate a quality report. You "
-                "can check the consistency of rules and the coverage of categorization. "
-                "Present your findings in a clear, well-formatted markdown report.",
-    tools=[]
-)
\ No newline at end of file
+                "transaction processing pipeline and generate a quality report. "
+                "Always call the `run_data_quality_audit` tool to compute the metrics; "
+                "never estimate them yourself. It covers categorization coverage, category "
+                "and transaction type consistency, missing cleaned fields, duplicate "
+                "transaction IDs and shadowed or overlapping rules. "
+                "Present its findings in a clear, well-formatted markdown report and "
+                "highlight the most important issues with suggested next steps.",
+    tools=[
+        FunctionTool(func=tenant_tool(audit_tools.run_data_quality_audit))
+    ]
+)
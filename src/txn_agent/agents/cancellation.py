@@ -2,6 +2,7 @@
 
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
+from src.txn_agent.common.tenancy import tenant_tool
 from src.txn_agent.tools import cancellation_tools
 
 cancellation_agent = Agent(
@@ -9,6 +10,6 @@ cancellation_agent = Agent(
     model="gemini-2.5-flash",
     instruction="You can stop ongoing processes.",
     tools=[
-        FunctionTool(func=cancellation_tools.request_cancellation)
+        FunctionTool(func=tenant_tool(cancellation_tools.request_cancellation, offload=False))
     ]
 )
\ No newline at end of file
@@ -1,5 +1,6 @@
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
+from src.txn_agent.common.tenancy import tenant_tool
 from src.txn_agent.tools import cleanup_tools
 
 cleanup_agent = Agent(
@@ -8,6 +9,6 @@ cleanup_agent = Agent(
     instruction="You are a data cleaning specialist. Use your tools to standardize "
                 "text fields and resolve logical conflicts in the `transactions` table.",
     tools=[
-        FunctionTool(func=cleanup_tools.run_full_cleanup)
+        FunctionTool(func=tenant_tool(cleanup_tools.run_full_cleanup))
     ]
 )
\ No newline at end of file
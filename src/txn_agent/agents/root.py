@@ -1,48 +1,85 @@
 # src/txn_agent/agents/root.py
 
 from google.adk.agents import Agent
-from google.adk.tools import AgentTool
-
-# Import all the specialized sub-agent instances that the root agent will orchestrate.
-from .cleanup import cleanup_agent
-from .categorization import categorization_agent
-from .rules_manager import rules_manager
-from .audit import audit_agent
-from .analyst import transaction_analyst
-from .admin import admin_agent
-from .cancellation import cancellation_agent
+from src.txn_agent.agents.routing import MAIN_MENU, route_menu_selection
+from src.txn_agent.common.lazy import LazyAgentTool, LazyFunctionTool
 
+# The specialized sub-agents are only imported when the root agent first delegates to them,
+# so a cold start does not load BigQuery, Vertex AI and pandas for workflows a session never uses.
 root_agent = Agent(
     name="root_agent",
     model="gemini-2.5-flash",
-    instruction="""
+    instruction=f"""
     You are the root agent, the central orchestrator for a team of specialized financial data agents. Your role is to manage the user interaction from start to finish, ensuring a clear and guided experience.
 
     **Step 1: Present the Main Menu**
     When the user starts a conversation, you MUST greet them and present the following numbered menu of options:
 
-    👋 **Welcome to your Financial Data Assistant!** 📈
-
-    I'm here to help you with a variety of tasks. Please select one of the following workflows:
-
-    1.  🗂️  **Categorize Transactions**: Assign categories to transactions using rules and AI.
-    2.  📊  **Analyze Transactions**: Ask questions about your transaction data.
-    3.  ⚖️  **Manage Rules**: Create, update, or suggest new categorization rules.
-    4.  🛡️  **Audit Data Quality**: Get a report on the quality of your data.
-    5.  🧹  **Data Cleanup**: Standardize text fields and correct transaction types.
-    6.  ⚙️  **System Administration**: Perform system-wide actions like resetting data.
+{MAIN_MENU}
 
     **Step 2: Delegate to the Appropriate Sub-Agent**
     Based on the user's selection, delegate the task to the correct sub-agent.
 
     """,
+    # Menu selections and unambiguous commands are routed without a model call.
+    before_model_callback=route_menu_selection,
     tools=[
-        AgentTool(agent=cleanup_agent),
-        AgentTool(agent=categorization_agent),
-        AgentTool(agent=rules_manager),
-        AgentTool(agent=audit_agent),
-        AgentTool(agent=transaction_analyst),
-        AgentTool(agent=admin_agent),
-        AgentTool(agent=cancellation_agent)
+        LazyAgentTool(
+            name="cleanup_agent",
+            description="Standardizes text fields and corrects transaction types in the transactions table.",
+            agent_path="src.txn_agent.agents.cleanup:cleanup_agent",
+        ),
+        LazyAgentTool(
+            name="categorization_agent",
+            description="Categorizes transactions using rules, a local model and AI, and reports the results.",
+            agent_path="src.txn_agent.agents.categorization:categorization_agent",
+        ),
+        LazyAgentTool(
+            name="rules_manager",
+            description="Suggests, creates, updates and prunes categorization rules.",
+            agent_path="src.txn_agent.agents.rules_manager:rules_manager",
+        ),
+        LazyAgentTool(
+            name="audit_agent",
+            description="Runs a data quality audit of the transactions and rules.",
+            agent_path="src.txn_agent.agents.audit:audit_agent",
+        ),
+        LazyAgentTool(
+            name="transaction_analyst",
+            description="Answers questions about the transaction data.",
+            agent_path="src.txn_agent.agents.analyst:transaction_analyst",
+        ),
+        LazyAgentTool(
+            name="admin_agent",
+            description="Performs system-wide administrative actions such as resetting categorizations.",
+            agent_path="src.txn_agent.agents.admin:admin_agent",
+        ),
+        LazyAgentTool(
+            name="cancellation_agent",
+            description="Stops ongoing processes such as a running categorization.",
+            agent_path="src.txn_agent.agents.cancellation:cancellation_agent",
+        ),
+        # Single-tool workflows are also offered directly, so a routed selection skips the sub-agent's model call.
+        LazyFunctionTool(
+            name="run_categorization",
+            description="Categorizes all uncategorized transactions and returns a report of the results.",
+            func_path="src.txn_agent.tools.categorization_tools:run_categorization",
+        ),
+        LazyFunctionTool(
+            name="run_full_cleanup",
+            description="Standardizes text fields and corrects transaction types in the transactions table.",
+            func_path="src.txn_agent.tools.cleanup_tools:run_full_cleanup",
+        ),
+        LazyFunctionTool(
+            name="run_data_quality_audit",
+            description="Runs a data quality audit of the transactions and rules and returns a markdown report.",
+            func_path="src.txn_agent.tools.audit_tools:run_data_quality_audit",
+        ),
+        LazyFunctionTool(
+            name="request_cancellation",
+            description="Requests to cancel the ongoing operation.",
+            func_path="src.txn_agent.tools.cancellation_tools:request_cancellation",
+            offload=False,
+        ),
     ]
-)
\ No newline at end of file
+)
@@ -0,0 +1,121 @@
+# src/txn_agent/agents/routing.py
+
+from __future__ import annotations
+import logging
+import re
+import uuid
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+
+MAIN_MENU = """👋 **Welcome to your Financial Data Assistant!** 📈
+
+I'm here to help you with a variety of tasks. Please select one of the following workflows:
+
+1.  🗂️  **Categorize Transactions**: Assign categories to transactions using rules and AI.
+2.  📊  **Analyze Transactions**: Ask questions about your transaction data.
+3.  ⚖️  **Manage Rules**: Create, update, or suggest new categorization rules.
+4.  🛡️  **Audit Data Quality**: Get a report on the quality of your data.
+5.  🧹  **Data Cleanup**: Standardize text fields and correct transaction types.
+6.  ⚙️  **System Administration**: Perform system-wide actions like resetting data."""
+_MENU_MARKER = "Please select one of the following workflows"
+
+# Tool names of routed calls are kept in session state until their response arrives.
+ROUTED_CALL_STATE_KEY = "routed_tool_call"
+
+# Menu number -> (tool, request forwarded to a sub-agent, or None for a direct tool call).
+_MENU_ROUTES = {
+    "1": ("run_categorization", None),
+    "2": ("transaction_analyst", "Analyze Transactions"),
+    "3": ("rules_manager", "Manage Rules"),
+    "4": ("run_data_quality_audit", None),
+    "5": ("run_full_cleanup", None),
+    "6": ("admin_agent", "System Administration"),
+}
+# Unambiguous commands, matched against the whole normalized message.
+_COMMAND_ROUTES = {
+    "categorize": "1", "categorize transactions": "1", "run categorization": "1",
+    "analyze": "2", "analyze transactions": "2",
+    "manage rules": "3", "rules": "3",
+    "audit": "4", "audit data quality": "4", "run audit": "4",
+    "cleanup": "5", "clean up": "5", "data cleanup": "5", "run cleanup": "5",
+    "system administration": "6", "admin": "6",
+}
+_CANCEL_COMMANDS = {"cancel", "stop", "cancel categorization", "stop categorization"}
+_MENU_COMMANDS = {"hi", "hello", "hey", "start", "menu", "main menu", "help"}
+
+def _normalize(text: str) -> str:
+    """Lower-cases a message and strips emojis, punctuation and the list markers of menu selections."""
+    text = re.sub(r"[^a-z0-9 ]+", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+def _text_response(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+def _menu_was_shown(contents: list[types.Content]) -> bool:
+    """Returns whether the last text the agent sent was the main menu."""
+    for content in reversed(contents):
+        if content.role == "model":
+            text = "".join(part.text for part in content.parts or [] if part.text)
+            if text:
+                return _MENU_MARKER in text
+    return False
+
+def _routed_response_text(content: types.Content, tool_name: str) -> str | None:
+    """Returns the result of the routed tool call if content carries its response."""
+    for part in content.parts or []:
+        if part.function_response and part.function_response.name == tool_name:
+            response = part.function_response.response or {}
+            result = response.get("result", response)
+            return result if isinstance(result, str) else str(result)
+    return None
+
+def route_menu_selection(callback_context: CallbackContext, llm_request: LlmRequest) -> LlmResponse | None:
+    """
+    A before_model_callback that answers the root agent's routine turns without a
+    model call. Greetings get the main menu; menu numbers (right after the menu)
+    and unambiguous commands are turned into a direct call of the matching tool
+    or sub-agent, and the result of that call is returned to the user as is.
+    Anything else falls through to the model.
+    """
+    if not llm_request.contents:
+        return _text_response(MAIN_MENU)
+    last_content = llm_request.contents[-1]
+
+    routed_tool = callback_context.state.get(ROUTED_CALL_STATE_KEY)
+    if routed_tool:
+        result = _routed_response_text(last_content, routed_tool)
+        if result is not None:
+            callback_context.state[ROUTED_CALL_STATE_KEY] = None
+            return _text_response(result)
+
+    if last_content.role != "user":
+        return None
+    message = "".join(part.text for part in last_content.parts or [] if part.text)
+    command = _normalize(message)
+    if not command:
+        return None
+    if command in _MENU_COMMANDS:
+        return _text_response(MAIN_MENU)
+
+    if command in _CANCEL_COMMANDS:
+        tool_name, request = "request_cancellation", None
+    elif command in _COMMAND_ROUTES:
+        tool_name, request = _MENU_ROUTES[_COMMAND_ROUTES[command]]
+        request = request and message.strip()
+    elif command in _MENU_ROUTES and _menu_was_shown(llm_request.contents[:-1]):
+        tool_name, request = _MENU_ROUTES[command]
+    else:
+        return None
+
+    logger.info(f"Routing '{message.strip()}' directly to {tool_name}.")
+    callback_context.state[ROUTED_CALL_STATE_KEY] = tool_name
+    function_call = types.FunctionCall(
+        id=f"route-{uuid.uuid4()}",
+        name=tool_name,
+        args={"request": request} if request else {},
+    )
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=function_call)]))
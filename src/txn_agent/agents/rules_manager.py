@@ -2,7 +2,8 @@
 
 from google.adk.agents import Agent
 from google.adk.tools import FunctionTool
-from src.txn_agent.tools import rules_manager_tools 
+from src.txn_agent.common.tenancy import tenant_tool
+from src.txn_agent.tools import categorization_tools, rules_manager_tools
 
 rules_manager = Agent(
     name="rules_manager",
@@ -17,6 +18,8 @@ rules_manager = Agent(
     1.  **Suggest New Rules**: Analyze transaction data to find and suggest new categorization rules.
     2.  **Create a New Rule**: Manually create a single, specific categorization rule.
     3.  **Update a Rule's Status**: Change a rule's status to 'active' or 'inactive'.
+    4.  **Prune Dead Rules**: Deactivate rules that have not matched any transactions for a year or are exact duplicates of another rule.
+    5.  **Apply Rule Changes**: Re-categorize only the existing transactions affected by created or updated rules.
 
     **Workflow for Rule Suggestions and Approvals:**
 
@@ -27,10 +30,25 @@ rules_manager = Agent(
         * You MUST extract all the necessary parameters (`primary_category`, `secondary_category`, `identifier`, `identifier_type`, `transaction_type`) directly from the markdown table you previously displayed in the conversation history.
         * You MUST then call the `create_rule` tool with these extracted parameters.
     5.  **If the user approves all rules** (e.g., "approve all," "yes approve all of them"):
-        * You MUST call the `bulk_create_rules` tool. This tool does not require any parameters as it uses a cached list of the suggestions.
+        * You MUST call the `bulk_create_rules` tool with the `suggestion_set_id` shown below the suggestions table you previously displayed. The tool creates exactly the rules of that set.
+        * A suggestion set can only be approved once. To approve new suggestions, call `suggest_new_rules` again.
     6.  After the tool call is complete, confirm the action to the user with the result from the tool.
         * Present a summary recap of the rules created, including identifier, identifier_type, transaction_type, primary_category, secondary_category.
 
+    **Workflow for Applying Rule Changes:**
+
+    1.  New or updated rules only categorize transactions of future categorization runs. After rules were created (individually or in bulk), had their status updated or were pruned, ask the user whether to apply the change to existing transactions.
+    2.  If the user agrees, or selects option 5, call `apply_rule_changes` with the Rule IDs of all the rules that changed, taken from the previous tool results in the conversation history.
+    3.  Present the report of the tool. Never suggest resetting transactions to apply a rule change.
+
+    **Workflow for Pruning Dead Rules:**
+
+    1.  When the user selects option 4, call the `prune_dead_rules` tool without a confirmation and present the listed rules.
+    2.  Ask the user to confirm by presenting the following numbered menu:
+        ‼️  **1. Confirm**
+        ⏹️  **2. Cancel**
+    3.  If the user confirms, call `prune_dead_rules` again with the same `min_age_days` and `confirmation` set to 'CONFIRM'.
+
     **General Instructions:**
 
     * **Clarity is Key**: Always be clear and concise in your responses.
@@ -38,9 +56,11 @@ rules_manager = Agent(
     * **Error Handling**: If a tool call returns an error, apologize to the user and clearly state the error message.
     """,
     tools=[
-        FunctionTool(func=rules_manager_tools.create_rule),
-        FunctionTool(func=rules_manager_tools.update_rule_status),
-        FunctionTool(func=rules_manager_tools.suggest_new_rules),
-        FunctionTool(func=rules_manager_tools.bulk_create_rules)
+        FunctionTool(func=tenant_tool(rules_manager_tools.create_rule)),
+        FunctionTool(func=tenant_tool(rules_manager_tools.update_rule_status)),
+        FunctionTool(func=tenant_tool(rules_manager_tools.suggest_new_rules)),
+        FunctionTool(func=tenant_tool(rules_manager_tools.bulk_create_rules)),
+        FunctionTool(func=tenant_tool(rules_manager_tools.prune_dead_rules)),
+        FunctionTool(func=tenant_tool(categorization_tools.apply_rule_changes))
     ]
 )
\ No newline at end of file
@@ -0,0 +1,94 @@
+# src/txn_agent/common/batching.py
+
+from __future__ import annotations
+import logging
+import pandas as pd
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+
+# Rough token estimates; Gemini averages about four characters per token for this kind of text.
+CHARS_PER_TOKEN = 4
+ROW_OVERHEAD_TOKENS = 8
+OUTPUT_TOKENS_PER_ROW = 24
+
+class AdaptiveBatchSizer:
+    """
+    Chooses how many transactions go into each LLM categorization call.
+    Every batch is capped by an input and output token budget derived from the
+    model's limits, and the target size is adapted from the outcome of each
+    call: it grows additively while calls succeed within the target latency and
+    shrinks multiplicatively on truncation, errors or slow responses. The default
+    budgets are placeholders; the categorization tools pass the ones prompts.py
+    derives for CATEGORIZATION_MODEL.
+    """
+
+    def __init__(self, initial_size: int = 100, min_size: int = 5, max_size: int = 400,
+                 max_input_tokens: int = 32000, max_output_tokens: int = 16384,
+                 output_headroom: float = 0.5, target_latency_seconds: float = 30.0, growth_step: int = 25):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(initial_size, max_size))
+        self.max_input_tokens = max_input_tokens
+        # Part of the output budget is left for the model's thinking tokens.
+        self.max_output_rows = max(1, int(max_output_tokens * output_headroom) // OUTPUT_TOKENS_PER_ROW)
+        self.target_latency_seconds = target_latency_seconds
+        self.growth_step = growth_step
+        self.chosen_sizes = []
+        self.calls = 0
+        self.truncated_calls = 0
+        self.failed_calls = 0
+        self.rows_categorized = 0
+        self.llm_seconds = 0.0
+
+    @staticmethod
+    def estimate_input_tokens(batch_df: pd.DataFrame) -> pd.Series:
+        """Estimates the prompt tokens each row contributes to a batch payload."""
+        chars = (batch_df['description_cleaned'].str.len().fillna(0).astype(int)
+                 + batch_df['merchant_name_cleaned'].str.len().fillna(0).astype(int))
+        return chars // CHARS_PER_TOKEN + ROW_OVERHEAD_TOKENS
+
+    def fit(self, candidates_df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the leading rows of candidates_df that fit the current size and token budget."""
+        batch_df = candidates_df.iloc[:min(self.size, self.max_output_rows)]
+        input_tokens = self.estimate_input_tokens(batch_df).cumsum()
+        batch_df = batch_df[(input_tokens <= self.max_input_tokens).to_numpy()]
+        # Always make progress, even if a single row exceeds the budget.
+        if batch_df.empty:
+            batch_df = candidates_df.iloc[:1]
+        self.chosen_sizes.append(len(batch_df))
+        return batch_df
+
+    def record(self, batch_size: int, latency_seconds: float, categorized_rows: int, truncated: bool = False, failed: bool = False):
+        """Records the outcome of one LLM call and adapts the target batch size."""
+        self.calls += 1
+        self.llm_seconds += latency_seconds
+        self.rows_categorized += categorized_rows
+        previous_size = self.size
+
+        if truncated or failed or categorized_rows < batch_size:
+            self.truncated_calls += truncated
+            self.failed_calls += failed
+            self.size = max(self.min_size, min(self.size, batch_size) // 2)
+        elif latency_seconds > self.target_latency_seconds:
+            self.size = max(self.min_size, int(self.size * self.target_latency_seconds / latency_seconds))
+        elif batch_size >= self.size:
+            # Only grow when the full target size was actually exercised.
+            self.size = min(self.max_size, self.size + self.growth_step)
+
+        if self.size != previous_size:
+            logger.info(f"Adjusted LLM batch size from {previous_size} to {self.size} "
+                        f"(batch={batch_size}, latency={latency_seconds:.1f}s, categorized={categorized_rows}, truncated={truncated}).")
+
+    def summary(self) -> dict:
+        """Returns the batch sizing metrics for the run report."""
+        return {
+            "batches": len(self.chosen_sizes),
+            "min_batch_size": min(self.chosen_sizes, default=0),
+            "max_batch_size": max(self.chosen_sizes, default=0),
+            "avg_batch_size": round(sum(self.chosen_sizes) / len(self.chosen_sizes), 1) if self.chosen_sizes else 0,
+            "llm_calls": self.calls,
+            "truncated_calls": self.truncated_calls,
+            "failed_calls": self.failed_calls,
+            "rows_per_second": round(self.rows_categorized / self.llm_seconds, 1) if self.llm_seconds else 0,
+        }
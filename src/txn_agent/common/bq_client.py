@@ -1,10 +1,16 @@
 # src/txn_agent/common/bq_client.py
 
+import logging
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 from google.adk.tools.bigquery import BigQueryToolset, BigQueryCredentialsConfig
 from google.adk.tools.bigquery.config import BigQueryToolConfig, WriteMode
 import google.auth
+from src.txn_agent.common.features import FEATURE_COLUMNS
+from src.txn_agent.common.tenancy import current_dataset
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
 
 def get_bq_toolset(read_only: bool = False) -> BigQueryToolset:
     """Creates a configured BigQueryToolset."""
@@ -22,11 +28,192 @@ def get_bq_toolset(read_only: bool = False) -> BigQueryToolset:
         credentials_config=credentials_config
     )
 
+# Tables the categorized_transactions view reads from; results derived from the view are cached on their versions.
+CATEGORIZED_TRANSACTIONS_SOURCES = ["transactions", "categorization_state", "categorization_ledger", "categorization_resets", "recurring_flags"]
+
+# Ledger entries younger than this are left to the view, so a compaction never passes
+# over an entry whose insert was still running when the compaction started.
+LEDGER_COMPACTION_LAG_MINUTES = 15
+
+CATEGORIZATION_LEDGER_SCHEMA = [
+    bigquery.SchemaField("transaction_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("primary_category", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("secondary_category", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("categorization_method", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("rule_id", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("run_id", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("categorized_at", "TIMESTAMP", mode="REQUIRED"),
+]
+
+# Recurring detection appends a row per re-scored transaction; the latest row of a transaction wins.
+RECURRING_FLAGS_SCHEMA = [
+    bigquery.SchemaField("transaction_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("is_recurring", "BOOLEAN", mode="NULLABLE"),
+    bigquery.SchemaField("recurring_period", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("detected_at", "TIMESTAMP", mode="REQUIRED"),
+]
+
+RULE_CANDIDATES_SCHEMA = [
+    bigquery.SchemaField("transaction_id", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("identifier", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("identifier_type", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("primary_category", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("secondary_category", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("transaction_type", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("categorized_at", "TIMESTAMP", mode="NULLABLE"),
+]
+
+CREDIT_FEATURES_SCHEMA = [
+    bigquery.SchemaField(name, field_type, mode="REQUIRED" if name == "account_id" else "NULLABLE")
+    for name, field_type in FEATURE_COLUMNS.items()
+]
+# The table also keeps a fingerprint of the transactions each account's features were computed from.
+CREDIT_FEATURES_TABLE_SCHEMA = CREDIT_FEATURES_SCHEMA + [bigquery.SchemaField("source_fingerprint", "INTEGER", mode="NULLABLE")]
+
+# Arguments of the categorized_transactions_in_scope table function and the transactions they select.
+SCOPED_TRANSACTIONS_ARGUMENTS = "scope_start TIMESTAMP, scope_end TIMESTAMP, scope_consumer STRING, scope_persona STRING"
+SCOPED_TRANSACTIONS_FILTER = """
+    transaction_date >= scope_start AND transaction_date < scope_end
+    AND (scope_consumer IS NULL OR consumer_name = scope_consumer)
+    AND (scope_persona IS NULL OR persona_type = scope_persona)
+"""
+
+def _categorized_transactions_view_query(dataset_id: str, scope_filter: str | None = None) -> str:
+    """
+    Returns the query of the categorized_transactions view. A transaction takes its
+    latest categorization unless a later reset covers its date; without a valid
+    categorization, categories loaded with the transaction itself are used if no
+    reset covers them, otherwise the transaction is uncategorized. The latest
+    categorizations come from the compacted categorization_state table and the
+    ledger entries appended after its newest entry, so a read never aggregates
+    the whole ledger. The latest entry of a transaction in recurring_flags
+    overrides the recurring flag and period loaded with it. With scope_filter, a
+    condition on the transactions table, only matching transactions are read and
+    the state, ledger and flags are aggregated for those transactions alone.
+    """
+    transactions_source, scoped_cte, scope_where, scope_and = f"`{dataset_id}.transactions`", "", "", ""
+    if scope_filter:
+        scoped_ids = "transaction_id IN (SELECT transaction_id FROM ScopedTransactions)"
+        transactions_source, scope_where, scope_and = "ScopedTransactions", f"WHERE {scoped_ids}", f"AND {scoped_ids}"
+        scoped_cte = f"""ScopedTransactions AS (
+        SELECT * FROM `{dataset_id}.transactions` WHERE {scope_filter}
+    ),
+    """
+    return f"""
+    WITH {scoped_cte}LedgerTail AS (
+        SELECT *
+        FROM `{dataset_id}.categorization_ledger`
+        WHERE categorized_at > (
+            SELECT IFNULL(MAX(categorized_at), TIMESTAMP '0001-01-01') FROM `{dataset_id}.categorization_state`
+        ) {scope_and}
+    ),
+    LatestCategorizations AS (
+        SELECT
+            transaction_id,
+            ARRAY_AGG(
+                STRUCT(primary_category, secondary_category, categorization_method, rule_id, run_id, categorized_at)
+                ORDER BY categorized_at DESC LIMIT 1
+            )[OFFSET(0)] AS latest
+        FROM (
+            SELECT * FROM `{dataset_id}.categorization_state` {scope_where}
+            UNION ALL
+            SELECT * FROM LedgerTail
+        )
+        GROUP BY transaction_id
+    ),
+    LatestRecurringFlags AS (
+        SELECT transaction_id, ARRAY_AGG(STRUCT(is_recurring, recurring_period) ORDER BY detected_at DESC LIMIT 1)[OFFSET(0)] AS flags
+        FROM `{dataset_id}.recurring_flags` {scope_where}
+        GROUP BY transaction_id
+    ),
+    ResolvedTransactions AS (
+        SELECT
+            t.*,
+            l.latest,
+            f.flags,
+            (
+                SELECT MAX(r.reset_at)
+                FROM `{dataset_id}.categorization_resets` AS r
+                WHERE (r.range_start IS NULL OR t.transaction_date >= r.range_start)
+                  AND (r.range_end IS NULL OR t.transaction_date <= r.range_end)
+            ) AS last_reset_at
+        FROM {transactions_source} AS t
+        LEFT JOIN LatestCategorizations AS l USING (transaction_id)
+        LEFT JOIN LatestRecurringFlags AS f USING (transaction_id)
+    ),
+    SourcedTransactions AS (
+        SELECT
+            *,
+            CASE
+                WHEN latest.categorized_at > IFNULL(last_reset_at, TIMESTAMP '0001-01-01') THEN 'ledger'
+                WHEN last_reset_at IS NULL OR categorization_update_timestamp > last_reset_at THEN 'loaded'
+            END AS categorization_source
+        FROM ResolvedTransactions
+    )
+    SELECT
+        * EXCEPT (primary_category, secondary_category, categorization_method, categorization_update_timestamp, rule_id,
+                  is_recurring, recurring_period, latest, flags, last_reset_at, categorization_source),
+        IF(flags IS NULL, is_recurring, flags.is_recurring) AS is_recurring,
+        IF(flags IS NULL, recurring_period, flags.recurring_period) AS recurring_period,
+        CASE categorization_source WHEN 'ledger' THEN latest.primary_category WHEN 'loaded' THEN primary_category END AS primary_category,
+        CASE categorization_source WHEN 'ledger' THEN latest.secondary_category WHEN 'loaded' THEN secondary_category END AS secondary_category,
+        CASE categorization_source WHEN 'ledger' THEN latest.categorization_method WHEN 'loaded' THEN categorization_method END AS categorization_method,
+        CASE categorization_source WHEN 'ledger' THEN latest.categorized_at WHEN 'loaded' THEN categorization_update_timestamp END AS categorization_update_timestamp,
+        CASE categorization_source WHEN 'ledger' THEN latest.rule_id WHEN 'loaded' THEN rule_id END AS rule_id,
+        IF(categorization_source = 'ledger', latest.run_id, NULL) AS run_id
+    FROM SourcedTransactions
+    """
+
+def compact_categorization_ledger(bq_client) -> int:
+    """
+    Folds the ledger entries appended since the last compaction, up to
+    LEDGER_COMPACTION_LAG_MINUTES ago, into categorization_state, which keeps
+    the latest entry of every transaction. The ledger itself stays append-only.
+    Returns the number of transactions whose state changed.
+    """
+    dataset_id = current_dataset()
+    compaction_script = f"""
+    DECLARE watermark TIMESTAMP DEFAULT (
+        SELECT IFNULL(MAX(categorized_at), TIMESTAMP '0001-01-01') FROM `{dataset_id}.categorization_state`
+    );
+
+    MERGE `{dataset_id}.categorization_state` AS S
+    USING (
+        SELECT *
+        FROM `{dataset_id}.categorization_ledger`
+        WHERE categorized_at > watermark
+          AND categorized_at <= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @lag_minutes MINUTE)
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY transaction_id ORDER BY categorized_at DESC) = 1
+    ) AS L
+    ON S.transaction_id = L.transaction_id
+    WHEN MATCHED THEN
+        UPDATE SET primary_category = L.primary_category, secondary_category = L.secondary_category,
+            categorization_method = L.categorization_method, rule_id = L.rule_id, run_id = L.run_id,
+            categorized_at = L.categorized_at
+    WHEN NOT MATCHED THEN
+        INSERT ROW;
+
+    SELECT @@row_count AS compacted;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("lag_minutes", "INT64", LEDGER_COMPACTION_LAG_MINUTES)]
+    )
+    return next(iter(bq_client.query(compaction_script, job_config=job_config).result()))['compacted']
+
 def setup_bigquery_tables(bq_client):
-    """Creates the necessary BigQuery tables if they don't exist."""
-    dataset_id = "fsi-banking-agentspace.txns"
+    """Creates the necessary BigQuery tables in the current tenant's dataset if they don't exist."""
+    dataset_id = current_dataset()
     transactions_table_id = f"{dataset_id}.transactions"
     rules_table_id = f"{dataset_id}.rules"
+    rule_stats_table_id = f"{dataset_id}.rule_stats"
+    rule_candidates_table_id = f"{dataset_id}.rule_candidates"
+    ledger_table_id = f"{dataset_id}.categorization_ledger"
+    state_table_id = f"{dataset_id}.categorization_state"
+    resets_table_id = f"{dataset_id}.categorization_resets"
+    recurring_flags_table_id = f"{dataset_id}.recurring_flags"
+    view_id = f"{dataset_id}.categorized_transactions"
+    scoped_function_id = f"{dataset_id}.categorized_transactions_in_scope"
+    credit_features_table_id = f"{dataset_id}.credit_features"
 
     transactions_schema = [
         bigquery.SchemaField("transaction_id", "STRING", mode="REQUIRED"),
@@ -39,6 +226,7 @@ def setup_bigquery_tables(bq_client):
         bigquery.SchemaField("transaction_type", "STRING", mode="NULLABLE"),
         bigquery.SchemaField("amount", "FLOAT", mode="NULLABLE"),
         bigquery.SchemaField("is_recurring", "BOOLEAN", mode="NULLABLE"),
+        bigquery.SchemaField("recurring_period", "STRING", mode="NULLABLE"),
         bigquery.SchemaField("description_raw", "STRING", mode="NULLABLE"),
         bigquery.SchemaField("description_cleaned", "STRING", mode="NULLABLE"),
         bigquery.SchemaField("merchant_name_raw", "STRING", "NULLABLE"),
@@ -63,15 +251,165 @@ def setup_bigquery_tables(bq_client):
         bigquery.SchemaField("status", "STRING", mode="NULLABLE"),
     ]
 
+    rule_stats_schema = [
+        bigquery.SchemaField("rule_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("hit_count", "INTEGER", mode="NULLABLE"),
+        bigquery.SchemaField("last_hit_at", "TIMESTAMP", mode="NULLABLE"),
+        bigquery.SchemaField("created_at", "TIMESTAMP", mode="NULLABLE"),
+        bigquery.SchemaField("reactivated_at", "TIMESTAMP", mode="NULLABLE"),
+    ]
+
+    resets_schema = [
+        bigquery.SchemaField("reset_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("range_start", "TIMESTAMP", mode="NULLABLE"),
+        bigquery.SchemaField("range_end", "TIMESTAMP", mode="NULLABLE"),
+        bigquery.SchemaField("reset_at", "TIMESTAMP", mode="REQUIRED"),
+    ]
 
     try:
-        bq_client.get_table(transactions_table_id)
+        transactions_table = bq_client.get_table(transactions_table_id)
+        # Tables created before recurring detection lack its period column.
+        if "recurring_period" not in {field.name for field in transactions_table.schema}:
+            bq_client.query(f"ALTER TABLE `{transactions_table_id}` ADD COLUMN IF NOT EXISTS recurring_period STRING").result()
+        # Partitioning and clustering cannot be added to an existing table; it has to be copied once.
+        partitioning = transactions_table.time_partitioning
+        if (partitioning is None or partitioning.type_ != bigquery.TimePartitioningType.MONTH
+                or partitioning.field != "transaction_date" or transactions_table.clustering_fields != ["account_id"]):
+            logger.warning(
+                f"Table {transactions_table_id} is not partitioned by month of transaction_date and clustered by "
+                f"account_id, so date range reports scan it in full. Migrate it once with: "
+                f"CREATE TABLE `{transactions_table_id}_partitioned` PARTITION BY TIMESTAMP_TRUNC(transaction_date, MONTH) "
+                f"CLUSTER BY account_id AS SELECT * FROM `{transactions_table_id}`; then swap the two tables."
+            )
     except NotFound:
         table = bigquery.Table(transactions_table_id, schema=transactions_schema)
+        # Reports filter on a date range, so only the months in range are scanned.
+        table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.MONTH, field="transaction_date")
+        table.clustering_fields = ["account_id"]
         bq_client.create_table(table)
 
     try:
         bq_client.get_table(rules_table_id)
     except NotFound:
         table = bigquery.Table(rules_table_id, schema=rules_schema)
-        bq_client.create_table(table)
\ No newline at end of file
+        bq_client.create_table(table)
+
+    try:
+        bq_client.get_table(ledger_table_id)
+    except NotFound:
+        table = bigquery.Table(ledger_table_id, schema=CATEGORIZATION_LEDGER_SCHEMA)
+        table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field="categorized_at")
+        table.clustering_fields = ["transaction_id"]
+        bq_client.create_table(table)
+
+    try:
+        bq_client.get_table(resets_table_id)
+    except NotFound:
+        table = bigquery.Table(resets_table_id, schema=resets_schema)
+        bq_client.create_table(table)
+
+    try:
+        bq_client.get_table(state_table_id)
+    except NotFound:
+        table = bigquery.Table(state_table_id, schema=CATEGORIZATION_LEDGER_SCHEMA)
+        table.clustering_fields = ["transaction_id"]
+        bq_client.create_table(table)
+
+    try:
+        bq_client.get_table(recurring_flags_table_id)
+    except NotFound:
+        table = bigquery.Table(recurring_flags_table_id, schema=RECURRING_FLAGS_SCHEMA)
+        table.clustering_fields = ["transaction_id"]
+        bq_client.create_table(table)
+
+    view_query = _categorized_transactions_view_query(dataset_id)
+    try:
+        view = bq_client.get_table(view_id)
+        # Views created by an earlier version are brought up to date.
+        if view.view_query != view_query:
+            view.view_query = view_query
+            bq_client.update_table(view, ["view_query"])
+    except NotFound:
+        table = bigquery.Table(view_id)
+        table.view_query = view_query
+        bq_client.create_table(table)
+
+    # Reports read one scope through this function, so only the scope's categorizations are aggregated.
+    scoped_query = _categorized_transactions_view_query(dataset_id, SCOPED_TRANSACTIONS_FILTER)
+    try:
+        scoped_function_current = bq_client.get_routine(scoped_function_id).body.strip() == scoped_query.strip()
+    except NotFound:
+        scoped_function_current = False
+    if not scoped_function_current:
+        bq_client.query(f"""
+        CREATE OR REPLACE TABLE FUNCTION `{scoped_function_id}`({SCOPED_TRANSACTIONS_ARGUMENTS}) AS (
+        {scoped_query}
+        )
+        """).result()
+
+    try:
+        rule_stats_table = bq_client.get_table(rule_stats_table_id)
+        # Tables created before rules could be reactivated lack its timestamp column.
+        if "reactivated_at" not in {field.name for field in rule_stats_table.schema}:
+            bq_client.query(f"ALTER TABLE `{rule_stats_table_id}` ADD COLUMN IF NOT EXISTS reactivated_at TIMESTAMP").result()
+    except NotFound:
+        table = bigquery.Table(rule_stats_table_id, schema=rule_stats_schema)
+        bq_client.create_table(table)
+        # Seed the statistics of rules created before hit tracking from their historical matches.
+        # Every seeded rule starts a fresh grace period, so none is pruned on missing data alone.
+        backfill_query = f"""
+        INSERT INTO `{rule_stats_table_id}` (rule_id, hit_count, last_hit_at, created_at)
+        SELECT
+            r.rule_id,
+            COUNT(t.transaction_id),
+            IF(COUNT(t.transaction_id) > 0, CURRENT_TIMESTAMP(), NULL),
+            CURRENT_TIMESTAMP()
+        FROM `{rules_table_id}` AS r
+        LEFT JOIN `{view_id}` AS t ON t.rule_id = r.rule_id
+        GROUP BY r.rule_id
+        """
+        bq_client.query(backfill_query).result()
+
+    try:
+        rule_candidates_fields = {field.name for field in bq_client.get_table(rule_candidates_table_id).schema}
+    except NotFound:
+        rule_candidates_fields = set()
+    # Candidates are kept per transaction so a transaction counts once under its latest categorization.
+    # Tables from before hold running counts that cannot be corrected, so they are rebuilt.
+    if "transaction_id" not in rule_candidates_fields:
+        bq_client.delete_table(rule_candidates_table_id, not_found_ok=True)
+        table = bigquery.Table(rule_candidates_table_id, schema=RULE_CANDIDATES_SCHEMA)
+        table.clustering_fields = ["transaction_id"]
+        bq_client.create_table(table)
+        # Seed the candidates from the transactions whose latest categorization is LLM-powered.
+        backfill_query = f"""
+        INSERT INTO `{rule_candidates_table_id}`
+            (transaction_id, identifier, identifier_type, primary_category, secondary_category, transaction_type, categorized_at)
+        SELECT transaction_id, identifier, identifier_type, primary_category, secondary_category, transaction_type, categorization_update_timestamp
+        FROM `{view_id}`,
+            UNNEST([
+                STRUCT(merchant_name_cleaned AS identifier, 'merchant_name_cleaned' AS identifier_type),
+                STRUCT(description_cleaned AS identifier, 'description_cleaned' AS identifier_type)
+            ])
+        WHERE categorization_method = 'llm-powered' AND identifier IS NOT NULL AND transaction_type IS NOT NULL
+        """
+        bq_client.query(backfill_query).result()
+
+    try:
+        credit_features_table = bq_client.get_table(credit_features_table_id)
+        # Tables created before change detection by fingerprint lack its column; their accounts are recomputed once.
+        if "source_fingerprint" not in {field.name for field in credit_features_table.schema}:
+            bq_client.query(f"ALTER TABLE `{credit_features_table_id}` ADD COLUMN IF NOT EXISTS source_fingerprint INT64").result()
+    except NotFound:
+        table = bigquery.Table(credit_features_table_id, schema=CREDIT_FEATURES_TABLE_SCHEMA)
+        table.clustering_fields = ["account_id"]
+        bq_client.create_table(table)
+
+_ready_datasets = set()
+
+def ensure_tables(bq_client):
+    """Runs setup_bigquery_tables once per process for the current tenant's dataset."""
+    dataset_id = current_dataset()
+    if dataset_id not in _ready_datasets:
+        setup_bigquery_tables(bq_client)
+        _ready_datasets.add(dataset_id)
@@ -1,16 +1,25 @@
 # src/txn_agent/common/cancellation.py
 
+from src.txn_agent.common.tenancy import current_tenant, current_user
+
 class CancellationToken:
+    """
+    Tracks cancellation requests per tenant and user, so stopping a run leaves the
+    runs of other users and tenants going. The user id is used rather than the
+    session id because every sub-agent delegation runs in a new session, so a
+    cancel sent from the root agent must still reach a run started in a sub-agent.
+    """
+
     def __init__(self):
-        self._is_cancelled = False
+        self._cancelled_users = set()
 
     def request_cancellation(self):
-        self._is_cancelled = True
+        self._cancelled_users.add((current_tenant(), current_user()))
 
     def is_cancellation_requested(self):
-        return self._is_cancelled
+        return (current_tenant(), current_user()) in self._cancelled_users
 
     def reset(self):
-        self._is_cancelled = False
+        self._cancelled_users.discard((current_tenant(), current_user()))
 
-cancellation_token = CancellationToken()
\ No newline at end of file
+cancellation_token = CancellationToken()
@@ -8,4 +8,10 @@ VALID_CATEGORIES = {
         "Software & Tech", "Medical", "Insurance", "Bills & Utilities", "ATM Withdrawal", "Peer-to-Peer Debit",
         "Fees & Charges", "Business Services", "Other Expense", "Mortgage Payment", "Streaming Services"
     ]
+}
+
+VALID_CATEGORY_PAIRS = {
+    (primary_category, secondary_category)
+    for primary_category, secondary_categories in VALID_CATEGORIES.items()
+    for secondary_category in secondary_categories
 }
\ No newline at end of file
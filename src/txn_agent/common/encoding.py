@@ -0,0 +1,71 @@
+# src/txn_agent/common/encoding.py
+
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud import bigquery
+from src.txn_agent.common.constants import VALID_CATEGORIES, VALID_CATEGORY_PAIRS
+
+# Fixed dictionaries, so codes mean the same thing in every frame and batch.
+CATEGORY_PAIRS = sorted(VALID_CATEGORY_PAIRS)
+PRIMARY_CATEGORY_DTYPE = pd.CategoricalDtype(sorted(VALID_CATEGORIES))
+SECONDARY_CATEGORY_DTYPE = pd.CategoricalDtype(sorted({s for subs in VALID_CATEGORIES.values() for s in subs}))
+TRANSACTION_TYPE_DTYPE = pd.CategoricalDtype(["Debit", "Credit", "ZERO"])
+
+_PAIR_PRIMARY_CODES = np.array([PRIMARY_CATEGORY_DTYPE.categories.get_loc(p) for p, _ in CATEGORY_PAIRS])
+_PAIR_SECONDARY_CODES = np.array([SECONDARY_CATEGORY_DTYPE.categories.get_loc(s) for _, s in CATEGORY_PAIRS])
+_PAIR_CODE_TABLE = np.full((len(PRIMARY_CATEGORY_DTYPE.categories), len(SECONDARY_CATEGORY_DTYPE.categories)), -1)
+_PAIR_CODE_TABLE[_PAIR_PRIMARY_CODES, _PAIR_SECONDARY_CODES] = np.arange(len(CATEGORY_PAIRS))
+
+# Low-cardinality string columns that are dictionary encoded when query results are loaded.
+DICTIONARY_COLUMNS = (
+    "account_id", "merchant_name_cleaned", "transaction_type", "primary_category", "secondary_category",
+    "categorization_method", "identifier_type", "status", "persona_type", "consumer_name", "channel",
+)
+
+def encode_category_pairs(primary: pd.Series, secondary: pd.Series) -> np.ndarray:
+    """Returns the index of every (primary, secondary) pair in CATEGORY_PAIRS, or -1 for invalid pairs."""
+    primary_codes = PRIMARY_CATEGORY_DTYPE.categories.get_indexer(primary)
+    secondary_codes = SECONDARY_CATEGORY_DTYPE.categories.get_indexer(secondary)
+    valid = (primary_codes >= 0) & (secondary_codes >= 0)
+    return np.where(valid, _PAIR_CODE_TABLE[primary_codes, secondary_codes], -1)
+
+def decode_category_pairs(pair_codes: np.ndarray) -> tuple[pd.Categorical, pd.Categorical]:
+    """Returns the primary and secondary categories of CATEGORY_PAIRS indices as Categoricals."""
+    return (pd.Categorical.from_codes(_PAIR_PRIMARY_CODES[pair_codes], dtype=PRIMARY_CATEGORY_DTYPE),
+            pd.Categorical.from_codes(_PAIR_SECONDARY_CODES[pair_codes], dtype=SECONDARY_CATEGORY_DTYPE))
+
+def map_values(series: pd.Series, mapping: dict, default=np.nan) -> np.ndarray:
+    """
+    Maps every value of series through mapping as a float array. Categoricals are
+    mapped once per distinct value and expanded through their codes.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        mapped = np.array([mapping.get(value, default) for value in series.cat.categories], dtype=np.float64)
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, mapped[codes] if len(mapped) else default, default)
+    return series.map(mapping).to_numpy(dtype=np.float64, na_value=default)
+
+def text_values(series: pd.Series) -> pd.Series:
+    """Returns a string column as plain strings, with missing values as empty strings."""
+    return series.astype(object).where(series.notna(), '')
+
+def query_to_frame(client: bigquery.Client, query: str, job_config: bigquery.QueryJobConfig | None = None,
+                   dictionary_columns: tuple[str, ...] = DICTIONARY_COLUMNS) -> pd.DataFrame:
+    """
+    Runs a query and returns its result as a DataFrame in which the columns named in
+    dictionary_columns are dictionary encoded on the Arrow side, so they arrive as
+    pandas Categoricals that store each distinct string once.
+    """
+    arrow_table = client.query(query, job_config=job_config).to_arrow()
+    for index, field in enumerate(arrow_table.schema):
+        if field.name in dictionary_columns and pa.types.is_string(field.type):
+            arrow_table = arrow_table.set_column(index, field.name, pc.dictionary_encode(arrow_table.column(index)))
+    return arrow_table.to_pandas()
+
+def decode_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns df with its Categorical columns decoded to plain strings, for writing it back to BigQuery."""
+    categorical_columns = [column for column, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    return df.astype({column: object for column in categorical_columns})
@@ -0,0 +1,173 @@
+# src/txn_agent/common/features.py
+
+from __future__ import annotations
+import re
+import numpy as np
+import pandas as pd
+from src.txn_agent.common.constants import VALID_CATEGORIES
+
+EXPENSE_CATEGORIES = VALID_CATEGORIES["Expense"]
+SPEND_SHARE_COLUMNS = [f"spend_share_{re.sub(r'[^a-z0-9]+', '_', category.lower()).strip('_')}" for category in EXPENSE_CATEGORIES]
+SHIFT_WINDOW_MONTHS = 3
+
+# Columns of the credit feature table and their BigQuery types.
+FEATURE_COLUMNS = {
+    "account_id": "STRING",
+    "consumer_name": "STRING",
+    "persona_type": "STRING",
+    "first_transaction_date": "TIMESTAMP",
+    "last_transaction_date": "TIMESTAMP",
+    "months_observed": "INTEGER",
+    "transaction_count": "INTEGER",
+    "avg_monthly_income": "FLOAT",
+    "income_cv": "FLOAT",
+    "income_stability": "FLOAT",
+    "income_months_share": "FLOAT",
+    "avg_monthly_expense": "FLOAT",
+    "expense_volatility": "FLOAT",
+    "net_cash_flow_ratio": "FLOAT",
+    "recurring_obligation_ratio": "FLOAT",
+    "fee_frequency": "FLOAT",
+    "overdraft_frequency": "FLOAT",
+    "income_shift_3m": "FLOAT",
+    "expense_shift_3m": "FLOAT",
+    "max_income_drop_3m": "FLOAT",
+    "max_expense_jump_3m": "FLOAT",
+    "uncategorized_spend_share": "FLOAT",
+    **{column: "FLOAT" for column in SPEND_SHARE_COLUMNS},
+    "computed_at": "TIMESTAMP",
+}
+
+def _segment_sums(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Sums consecutive segments of values that begin at starts (every segment is non-empty)."""
+    return np.add.reduceat(values, starts) if len(values) else np.zeros(len(starts))
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+def compute_credit_features(transactions_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Computes one row of credit features per account from its full transaction
+    history. transactions_df needs `account_id`, `consumer_name`, `persona_type`,
+    `transaction_date`, `transaction_type`, `amount`, `primary_category`,
+    `secondary_category`, `is_recurring` and `is_overdraft`.
+
+    Every account's history is laid out as a run of calendar months in one flat
+    array, so monthly totals, their variability and the rolling windows that
+    detect life-event shifts are computed for all accounts at once with NumPy.
+    Income is credits and expenses are debits, both excluding transfers.
+    - income_stability: 1 / (1 + coefficient of variation of monthly income).
+    - expense_volatility: coefficient of variation of monthly expenses.
+    - recurring_obligation_ratio: recurring debits over income.
+    - fee_frequency / overdraft_frequency: fees and overdraft or NSF transactions per month.
+    - income_shift_3m / expense_shift_3m: relative change of the last three months
+      against the months before them.
+    - max_income_drop_3m / max_expense_jump_3m: the largest relative change between
+      consecutive three-month windows, which marks life events such as a job loss.
+    - spend_share_*: each expense category's share of debit spend.
+    """
+    if transactions_df.empty:
+        return pd.DataFrame(columns=list(FEATURE_COLUMNS))
+
+    timestamps = pd.to_datetime(transactions_df['transaction_date'], utc=True)
+    account_codes, accounts = pd.factorize(transactions_df['account_id'])
+    order = np.lexsort((timestamps.to_numpy(dtype='datetime64[ns]'), account_codes))
+    account_codes = account_codes[order]
+    timestamps = timestamps.iloc[order]
+    n_accounts = len(accounts)
+    starts = np.flatnonzero(np.r_[True, account_codes[1:] != account_codes[:-1]])
+    # The sort puts the accounts in code order, so segment i belongs to account i.
+    transaction_counts = np.diff(np.r_[starts, len(order)])
+
+    amounts = np.abs(transactions_df['amount'].to_numpy(dtype=np.float64, na_value=0.0)[order])
+    transaction_types = transactions_df['transaction_type'].to_numpy(dtype=object)[order]
+    is_transfer = (transactions_df['primary_category'].to_numpy(dtype=object)[order] == 'Transfer')
+    income = np.where((transaction_types == 'Credit') & ~is_transfer, amounts, 0.0)
+    expense = np.where((transaction_types == 'Debit') & ~is_transfer, amounts, 0.0)
+    categories = transactions_df['secondary_category'].iloc[order]
+    is_fee = (categories.to_numpy(dtype=object) == 'Fees & Charges').astype(np.float64)
+    is_recurring = transactions_df['is_recurring'].fillna(False).to_numpy(dtype=bool)[order]
+    is_overdraft = transactions_df['is_overdraft'].fillna(False).to_numpy(dtype=bool)[order].astype(np.float64)
+
+    # Flat month grid: account i owns months [month_offsets[i], month_offsets[i] + spans[i]).
+    months = (timestamps.dt.year.to_numpy() * 12 + timestamps.dt.month.to_numpy() - 1).astype(np.int64)
+    first_months = months[starts]
+    spans = months[np.r_[starts[1:], len(order)] - 1] - first_months + 1
+    month_offsets = np.r_[0, np.cumsum(spans)[:-1]]
+    cells = month_offsets[account_codes] + months - first_months[account_codes]
+    n_cells = int(spans.sum())
+    monthly_income = np.bincount(cells, weights=income, minlength=n_cells)
+    monthly_expense = np.bincount(cells, weights=expense, minlength=n_cells)
+
+    def monthly_mean_and_cv(monthly: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        means = _segment_sums(monthly, month_offsets) / spans
+        variances = _segment_sums(monthly ** 2, month_offsets) / spans - means ** 2
+        return means, _ratio(np.sqrt(np.maximum(variances, 0.0)), means)
+
+    avg_income, income_cv = monthly_mean_and_cv(monthly_income)
+    avg_expense, expense_cv = monthly_mean_and_cv(monthly_expense)
+    income_months = _segment_sums((monthly_income > 0).astype(np.float64), month_offsets)
+
+    # Last SHIFT_WINDOW_MONTHS months against the months before them.
+    cell_accounts = np.repeat(np.arange(n_accounts), spans)
+    cell_positions = np.arange(n_cells) - month_offsets[cell_accounts]
+    is_recent = cell_positions >= (spans - SHIFT_WINDOW_MONTHS)[cell_accounts]
+    recent_months = np.minimum(spans, SHIFT_WINDOW_MONTHS)
+    prior_months = spans - recent_months
+
+    def shift(monthly: np.ndarray) -> np.ndarray:
+        recent = np.bincount(cell_accounts, weights=np.where(is_recent, monthly, 0.0), minlength=n_accounts) / recent_months
+        prior = _ratio(np.bincount(cell_accounts, weights=np.where(is_recent, 0.0, monthly), minlength=n_accounts), prior_months)
+        return _ratio(recent - prior, prior)
+
+    # Consecutive rolling windows: the window ending at a month against the window ending SHIFT_WINDOW_MONTHS earlier.
+    def max_window_change(monthly: np.ndarray, sign: float) -> np.ndarray:
+        window = SHIFT_WINDOW_MONTHS
+        cumulative = np.r_[0.0, np.cumsum(monthly)]
+        has_windows = cell_positions >= 2 * window - 1
+        ends = np.arange(n_cells)[has_windows] + 1
+        current = cumulative[ends] - cumulative[ends - window]
+        previous = cumulative[ends - window] - cumulative[ends - 2 * window]
+        changes = np.where(previous > 0, sign * (current - previous) / np.where(previous > 0, previous, 1.0), np.nan)
+        result = pd.Series(changes).groupby(cell_accounts[has_windows]).max()
+        return result.reindex(range(n_accounts)).to_numpy()
+
+    # Debit spend per expense category.
+    category_codes = pd.Index(EXPENSE_CATEGORIES).get_indexer(categories)
+    is_debit = transaction_types == 'Debit'
+    debit_spend = np.where(is_debit, amounts, 0.0)
+    total_spend = np.bincount(account_codes, weights=debit_spend, minlength=n_accounts)
+    categorized = is_debit & (category_codes >= 0)
+    category_spend = np.bincount(account_codes[categorized] * len(EXPENSE_CATEGORIES) + category_codes[categorized],
+                                 weights=amounts[categorized], minlength=n_accounts * len(EXPENSE_CATEGORIES))
+    category_spend = category_spend.reshape(n_accounts, len(EXPENSE_CATEGORIES))
+
+    total_income = avg_income * spans
+    features_df = pd.DataFrame({
+        "account_id": np.asarray(accounts, dtype=object),
+        "consumer_name": transactions_df['consumer_name'].to_numpy(dtype=object)[order][starts],
+        "persona_type": transactions_df['persona_type'].to_numpy(dtype=object)[order][starts],
+        "first_transaction_date": pd.DatetimeIndex(timestamps.iloc[starts]),
+        "last_transaction_date": pd.DatetimeIndex(timestamps.iloc[np.r_[starts[1:], len(order)] - 1]),
+        "months_observed": spans,
+        "transaction_count": transaction_counts,
+        "avg_monthly_income": avg_income,
+        "income_cv": income_cv,
+        "income_stability": 1.0 / (1.0 + income_cv),
+        "income_months_share": income_months / spans,
+        "avg_monthly_expense": avg_expense,
+        "expense_volatility": expense_cv,
+        "net_cash_flow_ratio": _ratio(total_income - avg_expense * spans, total_income),
+        "recurring_obligation_ratio": _ratio(np.bincount(account_codes, weights=np.where(is_recurring, expense, 0.0), minlength=n_accounts), total_income),
+        "fee_frequency": np.bincount(account_codes, weights=is_fee, minlength=n_accounts) / spans,
+        "overdraft_frequency": np.bincount(account_codes, weights=is_overdraft, minlength=n_accounts) / spans,
+        "income_shift_3m": shift(monthly_income),
+        "expense_shift_3m": shift(monthly_expense),
+        "max_income_drop_3m": max_window_change(monthly_income, -1.0),
+        "max_expense_jump_3m": max_window_change(monthly_expense, 1.0),
+        "uncategorized_spend_share": _ratio(total_spend - category_spend.sum(axis=1), total_spend),
+    })
+    shares = np.divide(category_spend, total_spend[:, None], out=np.full(category_spend.shape, np.nan), where=total_spend[:, None] > 0)
+    features_df[SPEND_SHARE_COLUMNS] = shares
+    features_df["computed_at"] = pd.Timestamp.now(tz='UTC')
+    return features_df
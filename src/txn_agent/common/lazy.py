@@ -0,0 +1,95 @@
+# src/txn_agent/common/lazy.py
+
+from __future__ import annotations
+import asyncio
+import importlib
+import logging
+import threading
+from typing import Any
+from google.adk.tools import AgentTool, BaseTool, FunctionTool, ToolContext
+from google.genai import types
+from src.txn_agent.common.tenancy import tenant_tool
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+# Module level, because tools are pickled with the agent when it is deployed.
+_load_lock = threading.Lock()
+
+def load_object(path: str) -> Any:
+    """Imports and returns the object at a "package.module:attribute" path."""
+    module_name, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+class LazyAgentTool(BaseTool):
+    """
+    An AgentTool whose sub-agent is imported on its first delegation.
+    The tool declares the same single `request` parameter as AgentTool, so the
+    parent agent can offer it without importing the sub-agent module and the
+    BigQuery, Vertex AI and pandas dependencies of its tools.
+    """
+
+    def __init__(self, name: str, description: str, agent_path: str):
+        super().__init__(name=name, description=description)
+        self.agent_path = agent_path
+        self._agent_tool: AgentTool | None = None
+
+    def _get_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={"request": types.Schema(type=types.Type.STRING)},
+                required=["request"],
+            ),
+        )
+
+    def _load_agent_tool(self) -> AgentTool:
+        with _load_lock:
+            if self._agent_tool is None:
+                agent = load_object(self.agent_path)
+                if agent.name != self.name:
+                    raise ValueError(f"Lazy tool '{self.name}' loaded agent '{agent.name}' from {self.agent_path}.")
+                self._agent_tool = AgentTool(agent=agent)
+                logger.info(f"Loaded sub-agent '{self.name}' from {self.agent_path}.")
+            return self._agent_tool
+
+    async def run_async(self, *, args: dict[str, Any], tool_context: ToolContext) -> Any:
+        agent_tool = self._agent_tool
+        if agent_tool is None:
+            # The first import is slow, so it runs off the event loop.
+            agent_tool = await asyncio.to_thread(self._load_agent_tool)
+        return await agent_tool.run_async(args=args, tool_context=tool_context)
+
+class LazyFunctionTool(BaseTool):
+    """
+    A tenant-aware FunctionTool for a parameterless tool function that is imported
+    on its first call. It lets the root agent run single-tool workflows directly,
+    without a model call in between, while the function's module and its
+    dependencies stay out of the cold start.
+    """
+
+    def __init__(self, name: str, description: str, func_path: str, offload: bool = True):
+        super().__init__(name=name, description=description)
+        self.func_path = func_path
+        self.offload = offload
+        self._function_tool: FunctionTool | None = None
+
+    def _get_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(name=self.name, description=self.description)
+
+    def _load_function_tool(self) -> FunctionTool:
+        with _load_lock:
+            if self._function_tool is None:
+                func = load_object(self.func_path)
+                if func.__name__ != self.name:
+                    raise ValueError(f"Lazy tool '{self.name}' loaded function '{func.__name__}' from {self.func_path}.")
+                self._function_tool = FunctionTool(func=tenant_tool(func, offload=self.offload))
+                logger.info(f"Loaded tool '{self.name}' from {self.func_path}.")
+            return self._function_tool
+
+    async def run_async(self, *, args: dict[str, Any], tool_context: ToolContext) -> Any:
+        function_tool = self._function_tool
+        if function_tool is None:
+            function_tool = await asyncio.to_thread(self._load_function_tool)
+        return await function_tool.run_async(args=args, tool_context=tool_context)
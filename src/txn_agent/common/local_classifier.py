@@ -0,0 +1,207 @@
+# src/txn_agent/common/local_classifier.py
+
+from __future__ import annotations
+import logging
+import numpy as np
+import pandas as pd
+from src.txn_agent.common.encoding import CATEGORY_PAIRS, decode_category_pairs, encode_category_pairs, map_values, text_values
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+
+_PRIMARY_FOR_TRANSACTION_TYPE = {"Debit": "Expense", "Credit": "Income"}
+
+def _text_matrix(transactions_df: pd.DataFrame, max_chars: int) -> np.ndarray:
+    """Encodes the cleaned merchant name and description of every row as a fixed-width byte matrix."""
+    text = (" " + text_values(transactions_df['merchant_name_cleaned']) + " | "
+            + text_values(transactions_df['description_cleaned']) + " ").astype(str)
+    encoded = text.str.slice(0, max_chars).str.encode('ascii', errors='ignore').to_numpy(dtype=f'S{max_chars}')
+    return encoded.view(np.uint8).reshape(len(transactions_df), max_chars)
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    """Row-wise softmax that tolerates -inf scores; rows without any finite score get all-zero probabilities."""
+    top = scores.max(axis=1, keepdims=True)
+    probabilities = np.exp(scores - np.where(np.isfinite(top), top, 0.0))
+    totals = probabilities.sum(axis=1, keepdims=True)
+    return np.divide(probabilities, totals, out=np.zeros_like(probabilities), where=totals > 0)
+
+class LocalCategoryClassifier:
+    """
+    A lightweight in-process categorizer trained from already labeled transactions.
+    Character n-grams of the cleaned merchant name and description are hashed into
+    a fixed feature space and scored with a multinomial Naive Bayes model, combined
+    with an exact merchant lookup for merchants whose labels are consistent. All
+    hashing and scoring is vectorized over chunks of rows with NumPy.
+
+    Naive Bayes posteriors summed over a few hundred n-grams saturate near 1.0, so
+    class scores are normalized by the number of n-grams of a row and turned into
+    probabilities with a temperature fitted on held-out training rows. Predictions
+    are only usable for merchants seen in training (`known_merchant`).
+    """
+
+    def __init__(self, n_features: int = 2 ** 16, ngram_sizes: tuple[int, ...] = (3, 4, 5), max_chars: int = 96,
+                 alpha: float = 0.1, merchant_min_support: int = 3, merchant_min_purity: float = 0.95,
+                 holdout_share: float = 0.1, max_holdout_rows: int = 20000):
+        self.n_features = n_features
+        self.ngram_sizes = ngram_sizes
+        self.max_chars = max_chars
+        self.alpha = alpha
+        self.merchant_min_support = merchant_min_support
+        self.merchant_min_purity = merchant_min_purity
+        self.holdout_share = holdout_share
+        self.max_holdout_rows = max_holdout_rows
+        self.feature_log_probs = None
+        self.class_log_priors = None
+        self.observed_features = None
+        self.temperature = 1.0
+        self.merchant_classes = {}
+        self.merchant_purity = {}
+        self.known_merchants = {}
+        self.training_rows = 0
+
+    def _hashed_features(self, transactions_df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the hashed n-gram ids of every row and a mask of the n-grams that fall inside the text."""
+        chars = _text_matrix(transactions_df, self.max_chars).astype(np.uint64)
+        lengths = (chars != 0).sum(axis=1)
+        features, masks = [], []
+        for n in self.ngram_sizes:
+            width = self.max_chars - n + 1
+            hashed = np.full((len(chars), width), np.uint64(n), dtype=np.uint64)
+            for offset in range(n):
+                hashed = hashed * np.uint64(1_000_003) + chars[:, offset:offset + width]
+            features.append((hashed % np.uint64(self.n_features)).astype(np.int64))
+            masks.append(np.arange(width)[None, :] + n <= lengths[:, None])
+        return np.concatenate(features, axis=1), np.concatenate(masks, axis=1)
+
+    def _count_ngrams(self, labeled_df: pd.DataFrame, class_ids: np.ndarray, chunk_size: int) -> np.ndarray:
+        """Counts the n-grams of every class, accumulated chunk by chunk to bound memory."""
+        n_classes = len(CATEGORY_PAIRS)
+        counts = np.zeros(n_classes * self.n_features, dtype=np.int64)
+        for start in range(0, len(labeled_df), chunk_size):
+            features, mask = self._hashed_features(labeled_df.iloc[start:start + chunk_size])
+            row_classes = np.broadcast_to(class_ids[start:start + chunk_size, None], features.shape)
+            counts += np.bincount(row_classes[mask] * self.n_features + features[mask], minlength=len(counts))
+        return counts.reshape(n_classes, self.n_features)
+
+    def _set_model(self, counts: np.ndarray, class_counts: np.ndarray):
+        """
+        Derives the feature log probabilities and class priors. Classes without
+        training rows can never be predicted, and n-grams never seen in training
+        carry no evidence, so they are scored 0 for every class.
+        """
+        smoothed = counts.astype(np.float32) + self.alpha
+        self.feature_log_probs = np.log(smoothed / smoothed.sum(axis=1, keepdims=True)).T.copy()
+        self.observed_features = counts.sum(axis=0) > 0
+        self.feature_log_probs[~self.observed_features] = 0.0
+        with np.errstate(divide='ignore'):
+            self.class_log_priors = np.log(class_counts / class_counts.sum())
+
+    def _scores(self, transactions_df: pd.DataFrame) -> np.ndarray:
+        """
+        Returns the class scores of a chunk: the log prior plus the summed n-gram
+        log-likelihoods, divided by the row's count of n-grams seen in training.
+        Classes outside the primary category implied by transaction_type score -inf.
+        """
+        features, mask = self._hashed_features(transactions_df)
+        # Sum the log probabilities of each row's n-grams, skipping the padding positions.
+        ngram_counts = mask.sum(axis=1)
+        observed_counts = (mask & self.observed_features[features]).sum(axis=1)
+        offsets = np.concatenate(([0], np.cumsum(ngram_counts)[:-1]))
+        scores = np.tile(self.class_log_priors, (len(transactions_df), 1))
+        has_ngrams = ngram_counts > 0
+        if has_ngrams.any():
+            scores[has_ngrams] += np.add.reduceat(self.feature_log_probs[features[mask]], offsets[has_ngrams], axis=0)
+        scores /= np.maximum(observed_counts, 1)[:, None]
+        class_primaries = np.array([primary for primary, _ in CATEGORY_PAIRS])
+        expected_primary = transactions_df['transaction_type'].map(_PRIMARY_FOR_TRANSACTION_TYPE).to_numpy()
+        allowed = (class_primaries[None, :] == expected_primary[:, None]) | pd.isna(expected_primary)[:, None]
+        return np.where(allowed, scores, -np.inf)
+
+    def _fit_temperature(self, holdout_df: pd.DataFrame, holdout_class_ids: np.ndarray, chunk_size: int) -> float:
+        """Returns the softmax temperature that minimizes the negative log-likelihood of the held-out rows."""
+        scores = np.concatenate([self._scores(holdout_df.iloc[start:start + chunk_size])
+                                 for start in range(0, len(holdout_df), chunk_size)])
+        rows = np.arange(len(holdout_df))
+        best_temperature, best_loss = 1.0, np.inf
+        for temperature in np.geomspace(0.01, 10.0, 61):
+            probabilities = _softmax(scores / temperature)
+            loss = -np.log(np.maximum(probabilities[rows, holdout_class_ids], 1e-12)).mean()
+            if loss < best_loss:
+                best_temperature, best_loss = float(temperature), loss
+        return best_temperature
+
+    def fit(self, labeled_df: pd.DataFrame, chunk_size: int = 5000) -> "LocalCategoryClassifier":
+        """
+        Trains the model from rows with cleaned text fields and valid primary/secondary
+        categories. A deterministic share of the rows (by a hash of their text) is
+        first held out to fit the temperature; the final model is trained on all rows.
+        """
+        class_ids = encode_category_pairs(labeled_df['primary_category'], labeled_df['secondary_category'])
+        labeled_df = labeled_df[class_ids >= 0].reset_index(drop=True)
+        class_ids = class_ids[class_ids >= 0]
+        self.training_rows = len(labeled_df)
+        n_classes = len(CATEGORY_PAIRS)
+
+        text_hashes = pd.util.hash_pandas_object(labeled_df[['merchant_name_cleaned', 'description_cleaned']], index=False).to_numpy()
+        is_holdout = (text_hashes % np.uint64(1000)) < np.uint64(self.holdout_share * 1000)
+        holdout_counts = self._count_ngrams(labeled_df[is_holdout], class_ids[is_holdout], chunk_size)
+        counts = self._count_ngrams(labeled_df[~is_holdout], class_ids[~is_holdout], chunk_size)
+        train_class_counts = np.bincount(class_ids[~is_holdout], minlength=n_classes).astype(np.float64)
+        if is_holdout.any() and train_class_counts.any():
+            self._set_model(counts, train_class_counts)
+            holdout_rows = np.flatnonzero(is_holdout)[:self.max_holdout_rows]
+            self.temperature = self._fit_temperature(labeled_df.iloc[holdout_rows], class_ids[holdout_rows], chunk_size)
+        self._set_model(counts + holdout_counts, np.bincount(class_ids, minlength=n_classes).astype(np.float64))
+
+        # Exact merchant lookup for merchants that are labeled consistently.
+        merchant_stats = (labeled_df.assign(class_id=class_ids)
+                          .groupby(['merchant_name_cleaned', 'class_id'], observed=True).size()
+                          .rename('count').reset_index())
+        merchant_totals = merchant_stats.groupby('merchant_name_cleaned', observed=True)['count'].transform('sum')
+        merchant_stats['purity'] = merchant_stats['count'] / merchant_totals
+        consistent = merchant_stats[(merchant_totals >= self.merchant_min_support) &
+                                    (merchant_stats['purity'] >= self.merchant_min_purity)]
+        self.merchant_classes = dict(zip(consistent['merchant_name_cleaned'], consistent['class_id']))
+        self.merchant_purity = dict(zip(consistent['merchant_name_cleaned'], consistent['purity']))
+        self.known_merchants = dict.fromkeys(merchant_stats['merchant_name_cleaned'], 1.0)
+        logger.info(f"Trained local classifier on {self.training_rows} rows ({len(self.merchant_classes)} consistent merchants, "
+                    f"temperature {self.temperature:.3g}).")
+        return self
+
+    def predict(self, transactions_df: pd.DataFrame, chunk_size: int = 2000) -> pd.DataFrame:
+        """
+        Predicts categories for a batch. Returns a frame aligned with transactions_df
+        with Categorical `primary_category` and `secondary_category` columns, a
+        calibrated `confidence` and `known_merchant`, which is True for rows whose
+        merchant appeared in the training data.
+        Predictions are restricted to the primary category implied by transaction_type.
+        """
+        class_primaries = np.array([primary for primary, _ in CATEGORY_PAIRS])
+        class_ids = np.zeros(len(transactions_df), dtype=np.int64)
+        confidence = np.zeros(len(transactions_df), dtype=np.float64)
+
+        for start in range(0, len(transactions_df), chunk_size):
+            chunk_df = transactions_df.iloc[start:start + chunk_size]
+            probabilities = _softmax(self._scores(chunk_df) / self.temperature)
+            class_ids[start:start + len(chunk_df)] = probabilities.argmax(axis=1)
+            confidence[start:start + len(chunk_df)] = probabilities.max(axis=1)
+
+        # Consistently labeled merchants override the n-gram model.
+        merchants = transactions_df['merchant_name_cleaned']
+        merchant_classes = map_values(merchants, self.merchant_classes)
+        merchant_purity = map_values(merchants, self.merchant_purity)
+        has_merchant_label = ~np.isnan(merchant_classes)
+        merchant_class_ids = np.where(has_merchant_label, merchant_classes, 0).astype(np.int64)
+        expected_primary = transactions_df['transaction_type'].map(_PRIMARY_FOR_TRANSACTION_TYPE).to_numpy()
+        use_merchant_label = has_merchant_label & (pd.isna(expected_primary) | (class_primaries[merchant_class_ids] == expected_primary))
+        agrees = class_ids == merchant_class_ids
+        confidence = np.where(use_merchant_label, np.where(agrees, np.maximum(confidence, merchant_purity), merchant_purity), confidence)
+        class_ids = np.where(use_merchant_label, merchant_class_ids, class_ids)
+
+        primary_categories, secondary_categories = decode_category_pairs(class_ids)
+        return pd.DataFrame({
+            'primary_category': primary_categories,
+            'secondary_category': secondary_categories,
+            'confidence': confidence,
+            'known_merchant': ~np.isnan(map_values(merchants, self.known_merchants)),
+        }, index=transactions_df.index)
@@ -0,0 +1,95 @@
+# src/txn_agent/common/prompts.py
+
+from __future__ import annotations
+import json
+import logging
+import threading
+import pandas as pd
+from vertexai.generative_models import GenerationConfig, GenerativeModel
+from src.txn_agent.common.batching import CHARS_PER_TOKEN
+from src.txn_agent.common.constants import VALID_CATEGORIES
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+
+CATEGORIZATION_MODEL = "gemini-2.5-flash"
+# Context window of CATEGORIZATION_MODEL.
+CATEGORIZATION_MODEL_INPUT_TOKEN_LIMIT = 1048576
+# Prompt budget of one call. It stays far below the context window: the output limit caps
+# a batch at a few hundred rows anyway, and a long prompt slows down every call.
+CATEGORIZATION_PROMPT_TOKEN_BUDGET = 32768
+CATEGORIZATION_MAX_OUTPUT_TOKENS = 16384
+
+def compact_json(obj) -> str:
+    """Serializes an object to JSON without any insignificant whitespace."""
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+# The static part of every categorization prompt. It is built once per process and
+# sent as a system instruction, an identical prefix of every request that Gemini
+# caches implicitly, so that each batch only pays in full for its row payload.
+CATEGORIZATION_SYSTEM_INSTRUCTION = f"""You are an expert financial transaction categorizer.
+**Input Format:**
+You receive a JSON object `{{"m": [...], "t": [[i, m, d], ...]}}`.
+* `m` is the list of distinct cleaned merchant names in the batch.
+* Each entry of `t` is one transaction: `i` is its row number, `m` is an index into the merchant list (-1 when unknown) and `d` is the cleaned description.
+**Instructions:**
+1.  For each transaction, determine the correct primary and secondary category.
+2.  You **MUST** use only the categories provided in the "Valid Categories" section below.
+3.  Avoid using 'Other Expense' if a more specific category is available.
+4.  Your final output **MUST** be a valid JSON array with exactly one object per transaction.
+5.  Each object **MUST** contain three keys: `i` (the row number), `p` (the primary category) and `s` (the secondary category).
+**Valid Categories:**
+{compact_json(VALID_CATEGORIES)}
+"""
+
+# Enforces the output shape on the model side, so categories outside VALID_CATEGORIES
+# cannot be produced and no fence stripping or JSON repair is needed.
+CATEGORIZATION_RESPONSE_SCHEMA = {
+    "type": "array", "items": {
+        "type": "object", "properties": {
+            "i": {"type": "integer", "description": "The row number of the transaction in the batch."},
+            "p": {"type": "string", "enum": list(VALID_CATEGORIES), "description": "The primary category."},
+            "s": {"type": "string", "enum": [s for secondaries in VALID_CATEGORIES.values() for s in secondaries], "description": "The secondary category."}
+        }, "required": ["i", "p", "s"]
+    }
+}
+
+# The row payload of a batch gets what is left of the prompt budget once the system
+# instruction and response schema sent with every call are accounted for.
+CATEGORIZATION_MAX_INPUT_TOKENS = (
+    min(CATEGORIZATION_PROMPT_TOKEN_BUDGET, CATEGORIZATION_MODEL_INPUT_TOKEN_LIMIT)
+    - (len(CATEGORIZATION_SYSTEM_INSTRUCTION) + len(compact_json(CATEGORIZATION_RESPONSE_SCHEMA))) // CHARS_PER_TOKEN
+)
+
+CATEGORIZATION_GENERATION_CONFIG = GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=CATEGORIZATION_RESPONSE_SCHEMA,
+    temperature=0.0,
+    max_output_tokens=CATEGORIZATION_MAX_OUTPUT_TOKENS,
+)
+
+_categorization_model: GenerativeModel | None = None
+_categorization_model_lock = threading.Lock()
+
+def get_categorization_model() -> GenerativeModel:
+    """
+    Returns the categorization model with its static instructions attached as a
+    system instruction. The model is created once per process; tenant workers
+    call this concurrently, so creation is guarded by a lock.
+    """
+    global _categorization_model
+    with _categorization_model_lock:
+        if _categorization_model is None:
+            _categorization_model = GenerativeModel(CATEGORIZATION_MODEL, system_instruction=CATEGORIZATION_SYSTEM_INSTRUCTION)
+        return _categorization_model
+
+def build_categorization_payload(transactions_df: pd.DataFrame) -> str:
+    """
+    Builds the compact row payload for a categorization batch.
+    Merchant names are deduplicated into a lookup list and rows are referenced by
+    their position in the batch instead of their transaction_id.
+    """
+    merchant_codes, merchants = pd.factorize(transactions_df['merchant_name_cleaned'], use_na_sentinel=True)
+    descriptions = transactions_df['description_cleaned'].fillna('')
+    rows = [[i, int(code), description] for i, (code, description) in enumerate(zip(merchant_codes, descriptions))]
+    return compact_json({"m": list(merchants), "t": rows})
@@ -0,0 +1,46 @@
+# src/txn_agent/common/result_cache.py
+
+from __future__ import annotations
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, TypeVar
+from google.cloud import bigquery
+from src.txn_agent.common.tenancy import current_dataset, table_id
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class TableVersionedCache:
+    """
+    An in-process LRU cache for results derived from BigQuery tables.
+    Entries are keyed by the tenant's dataset, a caller supplied key and the
+    last modification time of every table the result was computed from, so a
+    cached result is reused until one of those tables changes. Checking the
+    modification time is a metadata call and does not run a query.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, client: bigquery.Client, table_names: list[str], key: tuple, compute: Callable[[], T]) -> T:
+        """Returns the cached result for key, computing and storing it when any source table has changed."""
+        versions = tuple(client.get_table(table_id(name)).modified for name in table_names)
+        cache_key = (current_dataset(), key, versions)
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                logger.info(f"Serving cached result for {key}.")
+                return self._entries[cache_key]
+
+        result = compute()
+        with self._lock:
+            self._entries[cache_key] = result
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
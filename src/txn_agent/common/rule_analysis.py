@@ -0,0 +1,60 @@
+# src/txn_agent/common/rule_analysis.py
+
+from __future__ import annotations
+import pandas as pd
+from src.txn_agent.common.constants import VALID_CATEGORY_PAIRS
+
+def find_invalid_rules(rules_df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the rules whose category pair is not part of VALID_CATEGORIES."""
+    pairs = pd.Series(list(zip(rules_df['primary_category'], rules_df['secondary_category'])), index=rules_df.index)
+    return rules_df[~pairs.isin(VALID_CATEGORY_PAIRS)]
+
+def find_shadowed_rules(rules_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the rules that can never be applied because another active rule has
+    the same identifier, identifier_type and transaction_type. Rule matching
+    picks the longest identifier, so of such duplicates only one ever wins; the
+    first rule of each group is kept and the others are reported.
+    """
+    active_df = rules_df[rules_df['status'] == 'active']
+    duplicated = active_df.duplicated(subset=['identifier', 'identifier_type', 'transaction_type'], keep='first')
+    return active_df[duplicated]
+
+def find_overlapping_rules(rules_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns pairs of active rules where one identifier is contained in a longer
+    one for the same identifier_type and transaction_type. The longer rule wins
+    for every transaction that contains it, so the shorter rule is partially
+    shadowed; `conflicting` marks pairs that assign different categories.
+    Substring candidates are looked up in a set instead of comparing every pair.
+    """
+    overlaps = []
+    active_df = rules_df[(rules_df['status'] == 'active') & rules_df['identifier'].notna()]
+    for (identifier_type, transaction_type), group_df in active_df.groupby(['identifier_type', 'transaction_type'], observed=True):
+        rules_by_identifier = {}
+        for rule in group_df.itertuples(index=False):
+            rules_by_identifier.setdefault(rule.identifier, rule)
+        lengths = sorted({len(identifier) for identifier in rules_by_identifier})
+        for longer_identifier, longer_rule in rules_by_identifier.items():
+            for length in lengths:
+                if length >= len(longer_identifier):
+                    break
+                for start in range(len(longer_identifier) - length + 1):
+                    shorter_rule = rules_by_identifier.get(longer_identifier[start:start + length])
+                    if shorter_rule is None:
+                        continue
+                    overlaps.append({
+                        "shorter_rule_id": shorter_rule.rule_id,
+                        "shorter_identifier": shorter_rule.identifier,
+                        "longer_rule_id": longer_rule.rule_id,
+                        "longer_identifier": longer_rule.identifier,
+                        "identifier_type": identifier_type,
+                        "transaction_type": transaction_type,
+                        "conflicting": (shorter_rule.primary_category, shorter_rule.secondary_category) !=
+                                       (longer_rule.primary_category, longer_rule.secondary_category),
+                    })
+    overlaps_df = pd.DataFrame(overlaps, columns=[
+        "shorter_rule_id", "shorter_identifier", "longer_rule_id", "longer_identifier",
+        "identifier_type", "transaction_type", "conflicting",
+    ])
+    return overlaps_df.drop_duplicates(subset=["shorter_rule_id", "longer_rule_id"])
@@ -0,0 +1,158 @@
+# src/txn_agent/common/tenancy.py
+
+from __future__ import annotations
+import asyncio
+import contextvars
+import inspect
+import json
+import os
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from google.adk.tools import ToolContext
+
+DEFAULT_TENANT = "default"
+TENANT_STATE_KEY = "tenant_id"
+DEFAULT_DATASET = f"{os.environ.get('GCP_PROJECT_ID', 'fsi-banking-agentspace')}.{os.environ.get('BQ_DATASET_ID', 'txns')}"
+TENANT_MAX_CONCURRENCY = int(os.environ.get("TXN_TENANT_MAX_CONCURRENCY", "2"))
+
+def _load_tenant_datasets() -> dict[str, str]:
+    """
+    Loads the tenant registry from the TXN_TENANT_DATASETS environment variable,
+    a JSON object mapping tenant ids to fully qualified `project.dataset` names.
+    """
+    tenant_datasets = {DEFAULT_TENANT: DEFAULT_DATASET}
+    configured = os.environ.get("TXN_TENANT_DATASETS")
+    if configured:
+        tenant_datasets.update(json.loads(configured))
+    return tenant_datasets
+
+TENANT_DATASETS = _load_tenant_datasets()
+
+_current_tenant = contextvars.ContextVar("current_tenant", default=DEFAULT_TENANT)
+_current_user = contextvars.ContextVar("current_user", default=None)
+_tenant_executors: dict[str, ThreadPoolExecutor] = {}
+_tenant_executors_lock = threading.Lock()
+_tenant_locks: dict[tuple[str, str], threading.Lock] = {}
+
+class UnknownTenantError(ValueError):
+    """Raised when a session refers to a tenant that is not in the registry."""
+
+def dataset_for_tenant(tenant_id: str | None) -> str:
+    """Returns the fully qualified dataset for a tenant id (the default tenant when None)."""
+    tenant_id = tenant_id or DEFAULT_TENANT
+    if tenant_id not in TENANT_DATASETS:
+        raise UnknownTenantError(f"Unknown tenant '{tenant_id}'. Configured tenants: {', '.join(sorted(TENANT_DATASETS))}.")
+    return TENANT_DATASETS[tenant_id]
+
+def current_tenant() -> str:
+    """Returns the tenant the current tool call is running for."""
+    return _current_tenant.get()
+
+def current_user() -> str | None:
+    """
+    Returns the id of the user the current tool call is made for, or None outside a
+    session. Unlike the session id, it is the same in the sessions ADK creates for
+    every sub-agent delegation.
+    """
+    return _current_user.get()
+
+def current_dataset() -> str:
+    """Returns the fully qualified dataset of the current tenant."""
+    return dataset_for_tenant(current_tenant())
+
+def table_id(table_name: str) -> str:
+    """Returns the fully qualified id of a table in the current tenant's dataset."""
+    return f"{current_dataset()}.{table_name}"
+
+def table(table_name: str) -> str:
+    """Returns a backtick-quoted table reference in the current tenant's dataset, for use in SQL."""
+    return f"`{table_id(table_name)}`"
+
+@contextmanager
+def use_tenant(tenant_id: str | None):
+    """Runs the enclosed block against the given tenant's dataset."""
+    tenant_id = tenant_id or DEFAULT_TENANT
+    dataset_for_tenant(tenant_id)
+    token = _current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+@contextmanager
+def use_user(user_id: str | None):
+    """Runs the enclosed block on behalf of the given user."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+def tenant_lock(name: str) -> threading.Lock:
+    """
+    Returns the current tenant's lock for the named kind of work, for work that
+    must not run twice at the same time for one tenant within this process.
+    """
+    with _tenant_executors_lock:
+        return _tenant_locks.setdefault((current_tenant(), name), threading.Lock())
+
+def _executor_for(tenant_id: str) -> ThreadPoolExecutor:
+    """
+    Returns the worker pool of a tenant. Each tenant has its own bounded pool and
+    queue, so a large backlog for one tenant never occupies another tenant's workers.
+    """
+    with _tenant_executors_lock:
+        if tenant_id not in _tenant_executors:
+            _tenant_executors[tenant_id] = ThreadPoolExecutor(
+                max_workers=TENANT_MAX_CONCURRENCY,
+                thread_name_prefix=f"tenant-{tenant_id}",
+            )
+        return _tenant_executors[tenant_id]
+
+def tenant_tool(func, *, offload: bool = True):
+    """
+    Wraps a synchronous tool function for use in a FunctionTool.
+    The tenant is resolved from the `tenant_id` session state key, the user id
+    is made available through current_user(), and the call runs on that
+    tenant's worker pool so the event loop stays free to serve
+    other sessions and tenants in parallel. Instant tools that must never wait
+    behind the tenant's queue (such as cancellation) pass offload=False.
+    Functions that declare a `tool_context` parameter receive it unchanged.
+    """
+    signature = inspect.signature(func, eval_str=True)
+    passes_tool_context = "tool_context" in signature.parameters
+
+    async def wrapper(tool_context: ToolContext | None = None, **kwargs):
+        tenant_id = tool_context.state.get(TENANT_STATE_KEY) if tool_context is not None else None
+        tenant_id = tenant_id or DEFAULT_TENANT
+        user_id = tool_context.user_id if tool_context is not None else None
+        try:
+            dataset_for_tenant(tenant_id)
+        except UnknownTenantError as e:
+            return f"🚨 **Error**: {e}"
+
+        if passes_tool_context:
+            kwargs["tool_context"] = tool_context
+
+        def run_for_tenant():
+            with use_tenant(tenant_id), use_user(user_id):
+                return func(**kwargs)
+
+        if not offload:
+            return run_for_tenant()
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor_for(tenant_id), context.run, run_for_tenant)
+
+    # Expose the wrapped function's parameters, plus tool_context, to the FunctionTool.
+    context_parameter = inspect.Parameter("tool_context", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=ToolContext)
+    parameters = [p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in signature.parameters.values() if p.name != "tool_context"]
+    wrapper.__signature__ = signature.replace(parameters=parameters + [context_parameter])
+    wrapper.__annotations__ = {**typing.get_type_hints(func), "tool_context": ToolContext}
+    wrapper.__name__ = func.__name__
+    wrapper.__qualname__ = func.__qualname__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__module__ = func.__module__
+    return wrapper
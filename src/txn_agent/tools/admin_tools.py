@@ -1,10 +1,12 @@
+import uuid
 from google.cloud import bigquery
 from typing import Literal
-from datetime import datetime, timedelta
+from src.txn_agent.common.bq_client import ensure_tables
+from src.txn_agent.common.tenancy import table
 
 def reset_all_transactions(timeframe: Literal["last 3 months", "last 6 months", "all transactions"], confirmation: Literal["CONFIRM"] | None = None) -> str:
     """
-    Resets all processing-derived fields in the transactions table back to NULL for a specified timeframe.
+    Resets the categorization of all transactions in a specified timeframe, so they are categorized again on the next run.
     This is a destructive operation that requires explicit confirmation.
     To proceed, you must pass the exact string "CONFIRM" to this tool.
     """
@@ -14,33 +16,45 @@ def reset_all_transactions(timeframe: Literal["last 3 months", "last 6 months",
                 'typing `CONFIRM`.')
 
     client = bigquery.Client()
-    
-    end_date = datetime.utcnow()
+    ensure_tables(client)
+
+    # The range is resolved on the server's clock, like every categorization timestamp.
     if timeframe == "last 3 months":
-        start_date = end_date - timedelta(days=90)
-        where_clause = f"WHERE transaction_date BETWEEN '{start_date.isoformat()}' AND '{end_date.isoformat()}'"
+        range_days = 90
     elif timeframe == "last 6 months":
-        start_date = end_date - timedelta(days=180)
-        where_clause = f"WHERE transaction_date BETWEEN '{start_date.isoformat()}' AND '{end_date.isoformat()}'"
+        range_days = 180
     else: # all transactions
-        where_clause = "WHERE true"
-
+        range_days = None
 
+    # A reset is a single appended row. The categorized_transactions view ignores every
+    # categorization of a covered transaction made before it, so no transaction is rewritten.
+    # The covered transactions no longer count towards rule suggestions.
     query = f"""
-    UPDATE `fsi-banking-agentspace.txns.transactions`
-    SET
-        merchant_name_cleaned = NULL,
-        description_cleaned = NULL,
-        primary_category = NULL,
-        secondary_category = NULL,
-        transaction_type = NULL,
-        categorization_method = NULL,
-        rule_id = NULL
-    {where_clause};
+    DECLARE reset_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP();
+    DECLARE range_start TIMESTAMP DEFAULT TIMESTAMP_SUB(reset_at, INTERVAL @range_days DAY);
+    DECLARE range_end TIMESTAMP DEFAULT IF(@range_days IS NULL, NULL, reset_at);
+
+    INSERT INTO {table('categorization_resets')} (reset_id, range_start, range_end, reset_at)
+    VALUES (@reset_id, range_start, range_end, reset_at);
+
+    DELETE FROM {table('rule_candidates')}
+    WHERE transaction_id IN (
+        SELECT transaction_id
+        FROM {table('transactions')}
+        WHERE (range_start IS NULL OR transaction_date >= range_start)
+          AND (range_end IS NULL OR transaction_date <= range_end)
+    );
     """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("reset_id", "STRING", str(uuid.uuid4())),
+            bigquery.ScalarQueryParameter("range_days", "INT64", range_days),
+        ]
+    )
     try:
-        job = client.query(query)
-        job.result()
-        return f"✅ **Success!** All derived fields in the `transactions` table have been reset for {timeframe}. {job.num_dml_affected_rows} rows affected."
+        client.query(query, job_config=job_config).result()
+        return (f"✅ **Success!** The categorizations of all transactions in {timeframe} have been reset; "
+                "they will be categorized again on the next run. The reset is recorded in the "
+                "`categorization_resets` table; the `transactions` table itself is not modified.")
     except Exception as e:
-        return f"🚨 **Error**: An error occurred while resetting transaction data: {e}"
\ No newline at end of file
+        return f"🚨 **Error**: An error occurred while resetting transaction data: {e}"
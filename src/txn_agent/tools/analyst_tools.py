@@ -1,17 +1,192 @@
 # src/txn_agent/tools/analyst_tools.py
 
+from __future__ import annotations
+import datetime
+import logging
+import math
+import time
+import uuid
+from typing import Callable, Literal
+import pandas as pd
+from google.api_core.exceptions import GoogleAPICallError
 from google.cloud import bigquery
-from typing import Literal
+from src.txn_agent.common.bq_client import CATEGORIZED_TRANSACTIONS_SOURCES, CREDIT_FEATURES_SCHEMA, ensure_tables
+from src.txn_agent.common.encoding import decode_categoricals, query_to_frame
+from src.txn_agent.common.features import FEATURE_COLUMNS, compute_credit_features
+from src.txn_agent.common.result_cache import TableVersionedCache
+from src.txn_agent.common.tenancy import current_dataset, table, table_id
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+_catalog_cache = TableVersionedCache(max_entries=128)
+CREDIT_FEATURE_ACCOUNTS_PER_SHARD = 100000
+
+def _scoped_transactions() -> str:
+    """
+    Returns the categorized transactions in the shared scope of the catalog queries, for
+    use in SQL. The scope is applied to the transactions table before the categorizations
+    are joined, so BigQuery prunes the partitions outside of the date range and only the
+    scope's categorizations are aggregated.
+    """
+    return (f"{table('categorized_transactions_in_scope')}(TIMESTAMP(@start_date), "
+            "TIMESTAMP(DATE_ADD(@end_date, INTERVAL 1 DAY)), @consumer_name, @persona_type)")
+
+def _run_catalog_query(title: str, key: tuple, start_date: str, end_date: str, consumer_name: str | None,
+                       persona_type: str | None, compute: Callable[[bigquery.Client, list], pd.DataFrame],
+                       source_tables: list[str] = CATEGORIZED_TRANSACTIONS_SOURCES) -> str:
+    """
+    Validates the shared scope parameters, runs a catalog query through the result
+    cache and renders its result as a markdown table. compute receives the client
+    and the scope query parameters.
+    """
+    try:
+        start, end = datetime.date.fromisoformat(start_date), datetime.date.fromisoformat(end_date)
+    except ValueError:
+        return f"🚨 **Invalid Dates**: Use the YYYY-MM-DD format for start_date and end_date (got '{start_date}' and '{end_date}')."
+    if start > end:
+        return f"🚨 **Invalid Dates**: start_date {start} is after end_date {end}."
+
+    scope_params = [
+        bigquery.ScalarQueryParameter("start_date", "DATE", start),
+        bigquery.ScalarQueryParameter("end_date", "DATE", end),
+        bigquery.ScalarQueryParameter("consumer_name", "STRING", consumer_name or None),
+        bigquery.ScalarQueryParameter("persona_type", "STRING", persona_type or None),
+    ]
+    client = bigquery.Client()
+    ensure_tables(client)
+    try:
+        results = _catalog_cache.get_or_compute(client, source_tables, key + (start, end, consumer_name or None, persona_type or None),
+                                                lambda: compute(client, scope_params))
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error running the {title} report: {e}")
+        return f"🚨 **Query Failed**: A database error occurred while running the {title} report: {e}"
+
+    scope = ", ".join(filter(None, [f"{start} to {end}", consumer_name and f"consumer `{consumer_name}`",
+                                    persona_type and f"persona `{persona_type}`"]))
+    if results.empty:
+        return f"👍 **{title}** ({scope}): No transactions match this scope."
+    return f"📊 **{title}** ({scope})\n\n{results.to_markdown(index=False)}"
+
+def spend_by_category(start_date: str, end_date: str, consumer_name: str | None = None, persona_type: str | None = None) -> str:
+    """
+    Reports spending per primary and secondary category between start_date and
+    end_date (YYYY-MM-DD, inclusive), optionally for a single consumer or persona:
+    transaction count, total and average spend and each category's share of spend.
+    """
+    def compute(client: bigquery.Client, scope_params: list) -> pd.DataFrame:
+        query = f"""
+        SELECT
+            IFNULL(primary_category, 'Uncategorized') AS primary_category,
+            IFNULL(secondary_category, 'Uncategorized') AS secondary_category,
+            COUNT(*) AS transactions,
+            ROUND(SUM(ABS(amount)), 2) AS total_spend,
+            ROUND(AVG(ABS(amount)), 2) AS avg_spend,
+            ROUND(SAFE_DIVIDE(SUM(ABS(amount)), SUM(SUM(ABS(amount))) OVER ()), 4) AS share_of_spend
+        FROM {_scoped_transactions()}
+        WHERE transaction_type = 'Debit'
+          AND IFNULL(primary_category, '') != 'Transfer'
+        GROUP BY 1, 2
+        ORDER BY total_spend DESC
+        """
+        return query_to_frame(client, query, bigquery.QueryJobConfig(query_parameters=scope_params))
+
+    return _run_catalog_query("Spend by Category", ("spend_by_category",), start_date, end_date, consumer_name, persona_type, compute)
+
+def income_vs_expense_by_month(start_date: str, end_date: str, consumer_name: str | None = None, persona_type: str | None = None) -> str:
+    """
+    Reports income (credits) against expenses (debits) per calendar month between
+    start_date and end_date (YYYY-MM-DD, inclusive), optionally for a single
+    consumer or persona, with the net cash flow and savings rate of every month.
+    Transfers are excluded from both sides.
+    """
+    def compute(client: bigquery.Client, scope_params: list) -> pd.DataFrame:
+        query = f"""
+        SELECT
+            FORMAT_TIMESTAMP('%Y-%m', transaction_date) AS month,
+            ROUND(SUM(IF(transaction_type = 'Credit', ABS(amount), 0)), 2) AS income,
+            ROUND(SUM(IF(transaction_type = 'Debit', ABS(amount), 0)), 2) AS expenses,
+            ROUND(SUM(IF(transaction_type = 'Credit', ABS(amount), 0)) - SUM(IF(transaction_type = 'Debit', ABS(amount), 0)), 2) AS net,
+            ROUND(SAFE_DIVIDE(SUM(IF(transaction_type = 'Credit', ABS(amount), 0)) - SUM(IF(transaction_type = 'Debit', ABS(amount), 0)),
+                              SUM(IF(transaction_type = 'Credit', ABS(amount), 0))), 4) AS savings_rate
+        FROM {_scoped_transactions()}
+        WHERE IFNULL(primary_category, '') != 'Transfer'
+        GROUP BY 1
+        ORDER BY 1
+        """
+        return query_to_frame(client, query, bigquery.QueryJobConfig(query_parameters=scope_params))
+
+    return _run_catalog_query("Income vs. Expense by Month", ("income_vs_expense_by_month",), start_date, end_date,
+                              consumer_name, persona_type, compute)
+
+def top_merchants(start_date: str, end_date: str, consumer_name: str | None = None, persona_type: str | None = None,
+                  limit: int = 10) -> str:
+    """
+    Reports the merchants with the highest spend between start_date and end_date
+    (YYYY-MM-DD, inclusive), optionally for a single consumer or persona, with
+    their transaction count, total spend and most frequent category. limit is
+    capped at 100.
+    """
+    limit = max(1, min(int(limit), 100))
+
+    def compute(client: bigquery.Client, scope_params: list) -> pd.DataFrame:
+        query = f"""
+        SELECT
+            merchant_name_cleaned AS merchant,
+            COUNT(*) AS transactions,
+            ROUND(SUM(ABS(amount)), 2) AS total_spend,
+            APPROX_TOP_COUNT(secondary_category, 1)[OFFSET(0)].value AS top_category
+        FROM {_scoped_transactions()}
+        WHERE transaction_type = 'Debit'
+          AND merchant_name_cleaned IS NOT NULL
+        GROUP BY 1
+        ORDER BY total_spend DESC
+        LIMIT @limit
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=scope_params + [bigquery.ScalarQueryParameter("limit", "INT64", limit)])
+        return query_to_frame(client, query, job_config)
+
+    return _run_catalog_query("Top Merchants", ("top_merchants", limit), start_date, end_date, consumer_name, persona_type, compute)
+
+def rule_coverage(start_date: str, end_date: str, consumer_name: str | None = None, persona_type: str | None = None) -> str:
+    """
+    Reports how the transactions between start_date and end_date (YYYY-MM-DD,
+    inclusive), optionally of a single consumer or persona, were categorized:
+    transactions and share per categorization method, and for rule-based rows the
+    number of distinct rules applied and the most used rule.
+    """
+    def compute(client: bigquery.Client, scope_params: list) -> pd.DataFrame:
+        query = f"""
+        WITH Scoped AS (
+            SELECT
+                IFNULL(categorization_method, IF(primary_category IS NULL, 'uncategorized', 'pre-loaded')) AS categorization_method,
+                rule_id
+            FROM {_scoped_transactions()}
+        )
+        SELECT
+            s.categorization_method,
+            COUNT(*) AS transactions,
+            ROUND(COUNT(*) / SUM(COUNT(*)) OVER (), 4) AS share,
+            COUNT(DISTINCT s.rule_id) AS distinct_rules,
+            APPROX_TOP_COUNT(r.identifier, 1)[SAFE_OFFSET(0)].value AS most_used_rule
+        FROM Scoped AS s
+        LEFT JOIN {table('rules')} AS r USING (rule_id)
+        GROUP BY 1
+        ORDER BY transactions DESC
+        """
+        return query_to_frame(client, query, bigquery.QueryJobConfig(query_parameters=scope_params))
+
+    return _run_catalog_query("Rule Coverage", ("rule_coverage",), start_date, end_date, consumer_name, persona_type, compute,
+                              source_tables=CATEGORIZED_TRANSACTIONS_SOURCES + ['rules'])
 
 def execute_sql(query: str) -> str:
     """
     Executes a read-only SQL query against the BigQuery database and returns the results
-    in a markdown table.
+    in a markdown table. Unqualified table names resolve to the session's dataset.
     """
     client = bigquery.Client()
+    job_config = bigquery.QueryJobConfig(default_dataset=current_dataset())
     try:
-        query_job = client.query(query)
-        results = query_job.to_dataframe()
+        results = query_to_frame(client, query, job_config)
         return results.to_markdown()
     except Exception as e:
         return f"🚨 **Query Failed**: {e}"
@@ -25,9 +200,118 @@ def execute_confirmed_update(query: str, confirmation: Literal["CONFIRM"]) -> st
         return "⚠️ **Confirmation Required**: To execute this query, please provide 'CONFIRM'."
     
     client = bigquery.Client()
+    job_config = bigquery.QueryJobConfig(default_dataset=current_dataset())
     try:
-        query_job = client.query(query)
+        query_job = client.query(query, job_config=job_config)
         query_job.result()  # Wait for the job to complete
         return f"✅ **Success!** The query was executed and affected {query_job.num_dml_affected_rows} rows."
     except Exception as e:
-        return f"🚨 **Update Failed**: {e}"
\ No newline at end of file
+        return f"🚨 **Update Failed**: {e}"
+
+def build_credit_features(incremental: bool = True) -> str:
+    """
+    Computes credit-scoring features for every account (income stability, expense
+    volatility, category spend shares, recurring obligations, fee and overdraft
+    frequency and life-event shifts) and upserts them into the `credit_features`
+    table. With incremental, only accounts whose transactions changed since their
+    features were last computed are recomputed: each account's transactions are
+    fingerprinted, so new, late-loaded or backdated transactions, recategorizations,
+    resets and recurring flags are all detected regardless of their timestamps.
+    Accounts are processed in shards of CREDIT_FEATURE_ACCOUNTS_PER_SHARD, each
+    computed in one columnar pass and merged into the table at the end.
+    """
+    logger.info(f"Building credit features (incremental={incremental})...")
+    started_at = time.monotonic()
+    client = bigquery.Client()
+    ensure_tables(client)
+    suffix = str(uuid.uuid4()).replace('-', '')
+    pending_table_id = table_id(f"temp_feature_accounts_{suffix}")
+    staged_table_id = table_id(f"temp_credit_features_{suffix}")
+
+    # Accounts whose history changed after their features were computed. The fingerprint is an
+    # order-independent hash of every input of compute_credit_features, so any added, removed
+    # or changed transaction changes it.
+    pending_query = f"""
+    WITH AccountFingerprints AS (
+        SELECT
+            account_id,
+            BIT_XOR(FARM_FINGERPRINT(TO_JSON_STRING(STRUCT(
+                transaction_id, consumer_name, persona_type, transaction_date, transaction_type, amount,
+                primary_category, secondary_category, is_recurring, description_cleaned, description_raw
+            )))) AS source_fingerprint
+        FROM {table('categorized_transactions')}
+        GROUP BY account_id
+    )
+    SELECT a.account_id, a.source_fingerprint
+    FROM AccountFingerprints AS a
+    LEFT JOIN {table('credit_features')} AS f USING (account_id)
+    WHERE NOT @incremental
+       OR f.source_fingerprint IS NULL
+       OR f.source_fingerprint != a.source_fingerprint
+    """
+    shard_query = f"""
+    SELECT
+        account_id, consumer_name, persona_type, transaction_date, transaction_type, amount,
+        primary_category, secondary_category, is_recurring,
+        REGEXP_CONTAINS(UPPER(IFNULL(description_cleaned, description_raw)), r'OVERDRAFT|NSF|INSUFFICIENT FUNDS') AS is_overdraft
+    FROM {table('categorized_transactions')}
+    WHERE account_id IN (
+        SELECT account_id FROM `{pending_table_id}`
+        WHERE MOD(ABS(FARM_FINGERPRINT(account_id)), @shard_count) = @shard
+    )
+    """
+    stored_columns = list(FEATURE_COLUMNS) + ["source_fingerprint"]
+    updated_columns = ", ".join(f"{column} = S.{column}" for column in stored_columns if column != "account_id")
+    merge_query = f"""
+    MERGE {table('credit_features')} AS F
+    USING (
+        SELECT S.*, P.source_fingerprint
+        FROM `{staged_table_id}` AS S
+        JOIN `{pending_table_id}` AS P USING (account_id)
+    ) AS S
+    ON F.account_id = S.account_id
+    WHEN MATCHED THEN
+        UPDATE SET {updated_columns}
+    WHEN NOT MATCHED THEN
+        INSERT ({", ".join(stored_columns)}) VALUES ({", ".join(f"S.{column}" for column in stored_columns)})
+    """
+    try:
+        pending_config = bigquery.QueryJobConfig(
+            destination=pending_table_id,
+            write_disposition="WRITE_TRUNCATE",
+            query_parameters=[bigquery.ScalarQueryParameter("incremental", "BOOL", incremental)],
+        )
+        client.query(pending_query, job_config=pending_config).result()
+        pending_accounts = client.get_table(pending_table_id).num_rows
+        if not pending_accounts:
+            return "👍 **Credit Features Up to Date**: No account has new or recategorized transactions."
+
+        shard_count = math.ceil(pending_accounts / CREDIT_FEATURE_ACCOUNTS_PER_SHARD)
+        staged_accounts = 0
+        load_config = bigquery.LoadJobConfig(schema=CREDIT_FEATURES_SCHEMA, write_disposition="WRITE_APPEND")
+        for shard in range(shard_count):
+            shard_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ScalarQueryParameter("shard_count", "INT64", shard_count),
+                bigquery.ScalarQueryParameter("shard", "INT64", shard),
+            ])
+            features_df = compute_credit_features(query_to_frame(client, shard_query, shard_config))
+            if not features_df.empty:
+                client.load_table_from_dataframe(decode_categoricals(features_df), staged_table_id, job_config=load_config).result()
+                staged_accounts += len(features_df)
+            logger.info(f"Computed credit features for shard {shard + 1} of {shard_count} ({len(features_df)} accounts).")
+        # Without staged features the staging table was never created, so there is nothing to merge.
+        if not staged_accounts:
+            return f"⚠️ **No Credit Features Computed**: None of the {pending_accounts} changed accounts yielded features, so `credit_features` was left unchanged."
+        merge_job = client.query(merge_query)
+        merge_job.result()
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error while building credit features: {e}")
+        return f"🚨 **Error**: A database error occurred while building credit features: {e}"
+    finally:
+        client.delete_table(pending_table_id, not_found_ok=True)
+        client.delete_table(staged_table_id, not_found_ok=True)
+
+    elapsed = time.monotonic() - started_at
+    logger.info(f"✅ Updated credit features for {merge_job.num_dml_affected_rows} accounts in {elapsed:.1f}s.")
+    return (f"✅ **Credit Features Updated!** Features of {merge_job.num_dml_affected_rows} accounts were "
+            f"{'refreshed' if incremental else 'rebuilt'} in `credit_features` ({shard_count} shard(s), {elapsed:.1f}s).")
@@ -0,0 +1,149 @@
+# src/txn_agent/tools/audit_tools.py
+
+from __future__ import annotations
+import logging
+import pandas as pd
+from google.api_core.exceptions import GoogleAPICallError
+from google.cloud import bigquery
+from src.txn_agent.common.bq_client import CATEGORIZED_TRANSACTIONS_SOURCES, ensure_tables
+from src.txn_agent.common.constants import VALID_CATEGORY_PAIRS
+from src.txn_agent.common.result_cache import TableVersionedCache
+from src.txn_agent.common.rule_analysis import find_invalid_rules, find_overlapping_rules, find_shadowed_rules
+from src.txn_agent.common.tenancy import table
+
+# Set up a logger for this module
+logger = logging.getLogger(__name__)
+_audit_cache = TableVersionedCache(max_entries=32)
+
+def _collect_audit_metrics(client: bigquery.Client) -> dict:
+    """
+    Computes every transaction metric in a single scan of the transactions table
+    and returns it together with the rules table, all in one query job.
+    """
+    query = f"""
+    SELECT
+        (
+            SELECT AS STRUCT
+                COUNT(*) AS total_transactions,
+                COUNT(*) - COUNT(DISTINCT transaction_id) AS duplicate_transaction_ids,
+                COUNTIF(primary_category IS NULL) AS uncategorized,
+                COUNTIF(categorization_method = 'rule-based') AS rule_based,
+                COUNTIF(categorization_method = 'model') AS model_based,
+                COUNTIF(categorization_method = 'llm-powered') AS llm_powered,
+                COUNTIF(primary_category IS NOT NULL AND categorization_method IS NULL) AS preloaded,
+                COUNTIF(primary_category IS NOT NULL
+                        AND CONCAT(primary_category, '|', IFNULL(secondary_category, '')) NOT IN UNNEST(@valid_pairs)) AS invalid_category_pairs,
+                APPROX_TOP_COUNT(
+                    IF(primary_category IS NOT NULL
+                       AND CONCAT(primary_category, '|', IFNULL(secondary_category, '')) NOT IN UNNEST(@valid_pairs),
+                       CONCAT(primary_category, ' / ', IFNULL(secondary_category, 'NULL')), NULL), 11) AS top_invalid_pairs,
+                COUNTIF(amount < 0 AND transaction_type != 'Debit') AS negative_not_debit,
+                COUNTIF(amount > 0 AND transaction_type != 'Credit') AS positive_not_credit,
+                COUNTIF(transaction_type IS NULL) AS missing_transaction_type,
+                COUNTIF((primary_category = 'Income' AND transaction_type = 'Debit') OR
+                        (primary_category = 'Expense' AND transaction_type = 'Credit')) AS category_type_mismatches,
+                COUNTIF(merchant_name_cleaned IS NULL) AS null_merchant_name_cleaned,
+                COUNTIF(description_cleaned IS NULL) AS null_description_cleaned,
+                COUNTIF(categorization_method = 'rule-based' AND rule_id IS NULL) AS rule_based_without_rule_id
+            FROM {table('categorized_transactions')}
+        ) AS transactions,
+        ARRAY(
+            SELECT AS STRUCT rule_id, primary_category, secondary_category, identifier, identifier_type, transaction_type, status
+            FROM {table('rules')}
+        ) AS rules
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("valid_pairs", "STRING", sorted(f"{p}|{s}" for p, s in VALID_CATEGORY_PAIRS)),
+        ]
+    )
+    row = next(iter(client.query(query, job_config=job_config).result()))
+    metrics = dict(row['transactions'])
+    metrics['top_invalid_pairs'] = [entry for entry in metrics['top_invalid_pairs'] if entry['value'] is not None][:10]
+    rules_df = pd.DataFrame([dict(rule) for rule in row['rules']], columns=[
+        'rule_id', 'primary_category', 'secondary_category', 'identifier', 'identifier_type', 'transaction_type', 'status',
+    ])
+    return {
+        "transactions": metrics,
+        "rules_total": len(rules_df),
+        "rules_active": int((rules_df['status'] == 'active').sum()),
+        "invalid_rules": find_invalid_rules(rules_df),
+        "shadowed_rules": find_shadowed_rules(rules_df),
+        "overlapping_rules": find_overlapping_rules(rules_df),
+    }
+
+def _percent(count: int, total: int) -> str:
+    return f"{count / total:.1%}" if total else "n/a"
+
+def run_data_quality_audit() -> str:
+    """
+    Runs a full data quality audit of the transactions and rules tables and returns
+    a markdown report. Covers categorization coverage by method, invalid category
+    pairs, transaction type/amount sign mismatches, missing cleaned fields,
+    duplicate transaction_ids and shadowed or overlapping rules. Results are cached
+    until either table changes.
+    """
+    logger.info("Running data quality audit...")
+    client = bigquery.Client()
+    ensure_tables(client)
+    try:
+        audit = _audit_cache.get_or_compute(client, CATEGORIZED_TRANSACTIONS_SOURCES + ['rules'], ('data_quality_audit',),
+                                            lambda: _collect_audit_metrics(client))
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error during data quality audit: {e}")
+        return f"🚨 **Error**: A database error occurred while running the data quality audit: {e}"
+
+    txns = audit['transactions']
+    total = txns['total_transactions']
+    categorized = total - txns['uncategorized']
+    report = f"""
+    🛡️ **Data Quality Audit**
+
+    **Categorization Coverage** ({total} transactions)
+    | Method | Transactions | Share |
+    |---|---|---|
+    | Rule-Based | {txns['rule_based']} | {_percent(txns['rule_based'], total)} |
+    | Local Model | {txns['model_based']} | {_percent(txns['model_based'], total)} |
+    | LLM-Powered | {txns['llm_powered']} | {_percent(txns['llm_powered'], total)} |
+    | Pre-Loaded (no method) | {txns['preloaded']} | {_percent(txns['preloaded'], total)} |
+    | Uncategorized | {txns['uncategorized']} | {_percent(txns['uncategorized'], total)} |
+    | **Total Categorized** | {categorized} | {_percent(categorized, total)} |
+
+    **Consistency Checks**
+    | Check | Issues |
+    |---|---|
+    | Invalid category pairs | {txns['invalid_category_pairs']} |
+    | Income debits / expense credits | {txns['category_type_mismatches']} |
+    | Negative amount not marked 'Debit' | {txns['negative_not_debit']} |
+    | Positive amount not marked 'Credit' | {txns['positive_not_credit']} |
+    | Missing transaction_type | {txns['missing_transaction_type']} |
+    | Null merchant_name_cleaned | {txns['null_merchant_name_cleaned']} |
+    | Null description_cleaned | {txns['null_description_cleaned']} |
+    | Rule-based rows without rule_id | {txns['rule_based_without_rule_id']} |
+    | Duplicate transaction_ids | {txns['duplicate_transaction_ids']} |
+    """
+    if txns['top_invalid_pairs']:
+        report += "\n**Most Frequent Invalid Category Pairs:**\n| Category Pair | Count |\n|---|---|\n"
+        for entry in txns['top_invalid_pairs']:
+            report += f"| {entry['value']} | {entry['count']} |\n"
+
+    overlapping_df = audit['overlapping_rules']
+    report += f"""
+    **Rules Health** ({audit['rules_active']} active of {audit['rules_total']})
+    * **Invalid category rules**: {len(audit['invalid_rules'])}
+    * **Shadowed rules (exact duplicates that never apply)**: {len(audit['shadowed_rules'])}
+    * **Overlapping rules (identifier contained in a longer rule)**: {len(overlapping_df)}, of which conflicting: {int(overlapping_df['conflicting'].sum())}
+    """
+    if not audit['shadowed_rules'].empty:
+        report += "\n**Shadowed Rules:**\n| Rule ID | Identifier | Identifier Type | Transaction Type |\n|---|---|---|---|\n"
+        for rule in audit['shadowed_rules'].head(10).itertuples(index=False):
+            report += f"| `{rule.rule_id}` | `{rule.identifier}` | `{rule.identifier_type}` | `{rule.transaction_type}` |\n"
+    conflicting_df = overlapping_df[overlapping_df['conflicting']]
+    if not conflicting_df.empty:
+        report += "\n**Conflicting Overlaps:**\n| Shorter Rule | Longer Rule | Identifier Type | Transaction Type |\n|---|---|---|---|\n"
+        for overlap in conflicting_df.head(10).itertuples(index=False):
+            report += (f"| `{overlap.shorter_identifier}` (`{overlap.shorter_rule_id}`) | `{overlap.longer_identifier}` "
+                       f"(`{overlap.longer_rule_id}`) | `{overlap.identifier_type}` | `{overlap.transaction_type}` |\n")
+
+    logger.info("Data quality audit complete.")
+    return report
@@ -1,14 +1,45 @@
 # src/txn_agent/tools/categorization_tools.py
 
 from __future__ import annotations
+import functools
 import json
 import logging
+import time
 import uuid
-import re
-from google.api_core.exceptions import GoogleAPICallError
+import numpy as np
+import pandas as pd
+from google.api_core import retry
+from google.api_core.exceptions import (
+    Aborted,
+    DeadlineExceeded,
+    GoogleAPICallError,
+    InternalServerError,
+    RetryError,
+    ServiceUnavailable,
+    TooManyRequests,
+)
 from google.cloud import bigquery
-from vertexai.generative_models import GenerativeModel
-from src.txn_agent.common.constants import VALID_CATEGORIES
+from src.txn_agent.common.batching import AdaptiveBatchSizer
+from src.txn_agent.common.bq_client import (
+    CATEGORIZATION_LEDGER_SCHEMA,
+    CATEGORIZED_TRANSACTIONS_SOURCES,
+    RECURRING_FLAGS_SCHEMA,
+    RULE_CANDIDATES_SCHEMA,
+    compact_categorization_ledger,
+    ensure_tables,
+)
+from src.txn_agent.common.constants import VALID_CATEGORY_PAIRS
+from src.txn_agent.common.encoding import decode_categoricals, query_to_frame
+from src.txn_agent.common.local_classifier import LocalCategoryClassifier
+from src.txn_agent.common.prompts import (
+    CATEGORIZATION_GENERATION_CONFIG,
+    CATEGORIZATION_MAX_INPUT_TOKENS,
+    CATEGORIZATION_MAX_OUTPUT_TOKENS,
+    build_categorization_payload,
+    get_categorization_model,
+)
+from src.txn_agent.common.recurring import detect_recurring
+from src.txn_agent.common.tenancy import current_dataset, table, table_id, tenant_lock
 from src.txn_agent.tools import rules_manager_tools
 from src.txn_agent.common.cancellation import cancellation_token
 from src.txn_agent.tools.cleanup_tools import run_full_cleanup
@@ -16,19 +47,516 @@ from src.txn_agent.tools.cleanup_tools import run_full_cleanup
 # Set up a logger for this module
 logger = logging.getLogger(__name__)
 
-def _fix_json_array(json_string: str) -> str:
+LOCAL_MODEL_CONFIDENCE_THRESHOLD = 0.95
+LOCAL_MODEL_MIN_TRAINING_ROWS = 200
+LOCAL_MODEL_MAX_TRAINING_ROWS = 500000
+LLM_MAX_CONSECUTIVE_SERVICE_FAILURES = 3
+_local_classifiers = {}
+
+# Transient Vertex AI errors are retried with exponential backoff before a batch is given up.
+_LLM_RETRY = retry.Retry(
+    predicate=retry.if_exception_type(Aborted, DeadlineExceeded, InternalServerError, ServiceUnavailable, TooManyRequests),
+    initial=1.0,
+    maximum=32.0,
+    multiplier=2.0,
+    timeout=180.0,
+    on_error=lambda e: logger.warning(f"Transient Vertex AI error, retrying the batch: {e}"),
+)
+
+def _exclusive_per_tenant(func):
     """
-    Attempts to fix a malformed JSON array string by adding missing commas
-    between objects.
+    Runs a categorization tool only while no other categorization is running for
+    the tenant, so two sessions never send the same pending rows to the LLM.
+    A pending cancellation is cleared once the run has finished.
     """
-    # This regex looks for a closing brace immediately followed by an opening brace,
-    # with optional whitespace in between. This is a common indicator of a missing comma.
-    fixed_json_string = re.sub(r'}\s*{', '},{', json_string)
-    return fixed_json_string
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        lock = tenant_lock("categorization")
+        if not lock.acquire(blocking=False):
+            logger.warning(f"Refusing to start {func.__name__} while another categorization is running.")
+            return ("⏳ **Categorization Already Running**: Another categorization run for this dataset is still in progress. "
+                    "Please try again once it has finished.")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            cancellation_token.reset()
+            lock.release()
+    return wrapper
+
+class LLMServiceError(Exception):
+    """
+    Raised when Vertex AI keeps failing for a batch after retries. Carries the rows
+    categorized before the failure, so they are still written.
+    """
+
+    def __init__(self, error: Exception, categorized: list[dict]):
+        super().__init__(str(error))
+        self.categorized = categorized
+
+def _iter_streamed_array_items(text_chunks):
+    """
+    Incrementally parses a JSON array that arrives in chunks and yields each
+    element as soon as it is complete. Parsing stops quietly at a truncated or
+    malformed tail, so every element received before it is still returned.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    for chunk in text_chunks:
+        buffer += chunk
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+                position += 1
+            if position >= len(buffer) or buffer[position] == ']':
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element is not complete yet; wait for the next chunk.
+                break
+            yield item
+        buffer = buffer[position:]
+        position = 0
+
+def _iter_response_text(responses, stream_state: dict):
+    """
+    Yields the text of each streamed response chunk, skipping chunks without text.
+    The finish reason of the stream is recorded in stream_state.
+    """
+    for response in responses:
+        if response.candidates and response.candidates[0].finish_reason:
+            stream_state['finish_reason'] = response.candidates[0].finish_reason.name
+        try:
+            yield response.text
+        except ValueError:
+            # Chunks that only carry finish metadata or safety ratings have no text.
+            continue
+
+def _stream_categorizations(model, batch_df: pd.DataFrame, categorized: dict, stream_state: dict):
+    """
+    Makes one streamed LLM call for a batch and adds every valid item to
+    categorized, keyed by transaction_id, as soon as it arrives.
+    """
+    batch_transaction_ids = batch_df['transaction_id'].tolist()
+    stream_state.clear()
+    responses = model.generate_content(
+        build_categorization_payload(batch_df),
+        generation_config=CATEGORIZATION_GENERATION_CONFIG,
+        stream=True,
+    )
+    for item in _iter_streamed_array_items(_iter_response_text(responses, stream_state)):
+        if (isinstance(item, dict) and
+                isinstance(item.get('i'), int) and
+                0 <= item['i'] < len(batch_transaction_ids) and
+                (item.get('p'), item.get('s')) in VALID_CATEGORY_PAIRS):
+            categorized[batch_transaction_ids[item['i']]] = {
+                "transaction_id": batch_transaction_ids[item['i']],
+                "primary_category": item['p'],
+                "secondary_category": item['s'],
+            }
+        else:
+            logger.warning(f"Skipping invalid record from LLM: {item}")
+
+def _categorize_batch(model, batch_df: pd.DataFrame, batch_sizer: AdaptiveBatchSizer) -> tuple[list[dict], list[str]]:
+    """
+    Categorizes a batch of transactions with a single streamed LLM call; transient
+    service errors are retried with backoff. Valid items are kept even if the
+    response is cut short. Rows that come back missing or invalid are bisected and
+    retried until they succeed or a single row fails on its own. The outcome of
+    every call is reported to batch_sizer.
+    Returns the categorized rows and the transaction_ids that could not be categorized.
+    Raises LLMServiceError when the service still fails after retrying.
+    """
+    batch_transaction_ids = batch_df['transaction_id'].tolist()
+    categorized = {}
+    stream_state = {}
+    started_at = time.monotonic()
+    try:
+        _LLM_RETRY(_stream_categorizations)(model, batch_df, categorized, stream_state)
+    except (GoogleAPICallError, RetryError) as e:
+        # Service errors are not caused by the batch contents, so bisecting would not help.
+        logger.error(f"🚨 Vertex AI error while categorizing a batch of {len(batch_df)} transactions: {e}")
+        batch_sizer.record(len(batch_df), time.monotonic() - started_at, len(categorized), failed=True)
+        raise LLMServiceError(e, list(categorized.values())) from e
+    except Exception as e:
+        logger.warning(f"LLM response for a batch of {len(batch_df)} transactions could not be processed: {e}")
+        stream_state['failed'] = True
+
+    batch_sizer.record(
+        len(batch_df),
+        time.monotonic() - started_at,
+        len(categorized),
+        truncated=stream_state.get('finish_reason') == 'MAX_TOKENS',
+        failed=stream_state.get('failed', False),
+    )
+
+    remaining_df = batch_df[~batch_df['transaction_id'].isin(categorized.keys())]
+    if remaining_df.empty:
+        return list(categorized.values()), []
+    if len(batch_df) == 1:
+        logger.warning(f"Giving up on transaction {batch_transaction_ids[0]} after the LLM failed to categorize it.")
+        return [], batch_transaction_ids
+
+    logger.info(f"Retrying {len(remaining_df)} uncategorized rows of the batch in two halves.")
+    failed_ids = []
+    midpoint = (len(remaining_df) + 1) // 2
+    for half_df in (remaining_df.iloc[:midpoint], remaining_df.iloc[midpoint:]):
+        if half_df.empty or cancellation_token.is_cancellation_requested():
+            failed_ids.extend(half_df['transaction_id'])
+            continue
+        try:
+            half_categorized, half_failed = _categorize_batch(model, half_df, batch_sizer)
+        except LLMServiceError as e:
+            categorized.update({row['transaction_id']: row for row in e.categorized})
+            e.categorized = list(categorized.values())
+            raise
+        categorized.update({row['transaction_id']: row for row in half_categorized})
+        failed_ids.extend(half_failed)
+    return list(categorized.values()), failed_ids
+
+_CANDIDATE_FIELDS = ['merchant_name_cleaned', 'description_cleaned', 'transaction_type']
+
+def _server_timestamp(client: bigquery.Client) -> pd.Timestamp:
+    """
+    Returns the server's CURRENT_TIMESTAMP(), the clock of rule matches and resets,
+    for stamping rows written by load jobs.
+    """
+    return pd.Timestamp(next(iter(client.query("SELECT CURRENT_TIMESTAMP() AS now").result()))['now'])
+
+def _rule_candidates(batch_df: pd.DataFrame, categorized_at: pd.Timestamp) -> pd.DataFrame:
+    """
+    Returns the rule_candidates rows of a batch of LLM-powered categorizations, one
+    row per identifier type, so rule suggestions never rescan the transactions.
+    """
+    candidates_df = pd.concat(
+        [batch_df.assign(identifier=batch_df[identifier_type], identifier_type=identifier_type)
+         for identifier_type in ('merchant_name_cleaned', 'description_cleaned')],
+        ignore_index=True,
+    )
+    candidates_df = candidates_df[candidates_df['identifier'].notna() & candidates_df['transaction_type'].notna()]
+    return candidates_df[[field.name for field in RULE_CANDIDATES_SCHEMA if field.name != 'categorized_at']].assign(
+        categorized_at=categorized_at)
+
+def _append_categorizations(client: bigquery.Client, categorized_df: pd.DataFrame, method: str, run_id: str) -> int:
+    """
+    Appends categorizations (transaction_id, primary_category, secondary_category)
+    to the categorization ledger with a load job, stamped with the server's
+    CURRENT_TIMESTAMP(), the clock of rule matches and resets too. The transactions
+    table is never rewritten; the latest ledger entry of a transaction wins in the
+    categorized_transactions view, and rule_candidates follows it: LLM-powered
+    rows become candidates and earlier candidates of the batch are dropped.
+    Returns the number of appended rows. For 'llm-powered' rows, categorized_df
+    must also carry the cleaned merchant name, cleaned description and transaction type.
+    """
+    columns = ['transaction_id', 'primary_category', 'secondary_category'] + (_CANDIDATE_FIELDS if method == 'llm-powered' else [])
+    batch_df = decode_categoricals(categorized_df[columns])
+    categorized_at = _server_timestamp(client)
+    ledger_df = batch_df[['transaction_id', 'primary_category', 'secondary_category']].assign(
+        categorization_method=method, rule_id=None, run_id=run_id, categorized_at=categorized_at)
+    ledger_config = bigquery.LoadJobConfig(schema=CATEGORIZATION_LEDGER_SCHEMA, write_disposition="WRITE_APPEND")
+    client.load_table_from_dataframe(ledger_df, table_id('categorization_ledger'), job_config=ledger_config).result()
+
+    if method == 'llm-powered':
+        candidates_config = bigquery.LoadJobConfig(schema=RULE_CANDIDATES_SCHEMA, write_disposition="WRITE_APPEND")
+        client.load_table_from_dataframe(_rule_candidates(batch_df, categorized_at), table_id('rule_candidates'),
+                                         job_config=candidates_config).result()
+    delete_query = f"""
+    DELETE FROM {table('rule_candidates')}
+    WHERE transaction_id IN UNNEST(@transaction_ids) AND categorized_at < @categorized_at
+    """
+    delete_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("transaction_ids", "STRING", batch_df['transaction_id'].tolist()),
+            bigquery.ScalarQueryParameter("categorized_at", "TIMESTAMP", categorized_at.to_pydatetime()),
+        ]
+    )
+    client.query(delete_query, job_config=delete_config).result()
+    return len(batch_df)
+
+def _get_local_classifier(client: bigquery.Client) -> LocalCategoryClassifier | None:
+    """
+    Returns a local classifier trained on the current tenant's rule-based and
+    LLM-powered labels, or None when there is too little labeled data. Models are
+    cached per dataset and retrained when the transactions or their categorizations change.
+    """
+    dataset = current_dataset()
+    modified = tuple(client.get_table(table_id(name)).modified for name in CATEGORIZED_TRANSACTIONS_SOURCES)
+    cached = _local_classifiers.get(dataset)
+    if cached and cached[0] == modified:
+        return cached[1]
+
+    # Labels produced by the model itself are excluded so it never trains on its own output.
+    # Ordering by a fingerprint of the id makes the sample uniform and stable between retrains.
+    training_query = f"""
+    SELECT merchant_name_cleaned, description_cleaned, transaction_type, primary_category, secondary_category
+    FROM {table('categorized_transactions')}
+    WHERE categorization_method IN ('rule-based', 'llm-powered')
+    ORDER BY FARM_FINGERPRINT(transaction_id)
+    LIMIT @max_training_rows
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("max_training_rows", "INT64", LOCAL_MODEL_MAX_TRAINING_ROWS)]
+    )
+    labeled_df = query_to_frame(client, training_query, job_config)
+    classifier = None
+    if len(labeled_df) >= LOCAL_MODEL_MIN_TRAINING_ROWS:
+        classifier = LocalCategoryClassifier().fit(labeled_df)
+    else:
+        logger.info(f"Only {len(labeled_df)} labeled transactions available; skipping the local model.")
+    _local_classifiers[dataset] = (modified, classifier)
+    return classifier
+
+def _accepted_predictions(predictions_df: pd.DataFrame) -> np.ndarray:
+    """
+    Returns a mask of the local model's predictions that are written without the LLM:
+    those for merchants the model was trained on with a calibrated confidence of at
+    least LOCAL_MODEL_CONFIDENCE_THRESHOLD. Unseen merchants always go to the LLM.
+    """
+    return (predictions_df['known_merchant'] & (predictions_df['confidence'] >= LOCAL_MODEL_CONFIDENCE_THRESHOLD)).to_numpy()
+
+def _apply_local_classifier(client: bigquery.Client, run_id: str, scope_table_id: str | None = None) -> int:
+    """
+    Categorizes pending transactions in-process with the local classifier and
+    writes the accepted predictions (see _accepted_predictions) with
+    categorization_method = 'model' to the ledger. Returns the number of categorized rows.
+    """
+    classifier = _get_local_classifier(client)
+    if classifier is None:
+        return 0
+
+    select_uncategorized_query = f"""
+    SELECT transaction_id, description_cleaned, merchant_name_cleaned, transaction_type
+    FROM {table('categorized_transactions')}
+    WHERE {_pending_condition(scope_table_id)}
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("run_id", "STRING", run_id)]
+    )
+    uncategorized_df = query_to_frame(client, select_uncategorized_query, job_config)
+    if uncategorized_df.empty:
+        return 0
+
+    predictions_df = classifier.predict(uncategorized_df)
+    confident = _accepted_predictions(predictions_df)
+    logger.info(f"Local model is confident for {confident.sum()} of {len(uncategorized_df)} uncategorized transactions.")
+    if not confident.any():
+        return 0
+
+    categorized_df = predictions_df[confident].assign(transaction_id=uncategorized_df['transaction_id'][confident])
+    updated_count = _append_categorizations(client, categorized_df, 'model', run_id)
+    logger.info(f"✅ Successfully updated {updated_count} transactions with local model categories.")
+    return updated_count
+
+def _apply_recurring_detection(client: bigquery.Client) -> int:
+    """
+    Detects recurring series for every account and merchant with transactions that
+    have not been analyzed yet: they were loaded without an is_recurring flag and
+    have no entry in recurring_flags. All transactions of those series are re-scored
+    in-process and their flags are appended to recurring_flags with a load job; the
+    latest entry of a transaction wins in the categorized_transactions view, so the
+    transactions table is never rewritten. Returns the number of transactions flagged recurring.
+    """
+    select_series_query = f"""
+    WITH PendingSeries AS (
+        SELECT DISTINCT
+            t.account_id,
+            COALESCE(t.merchant_name_cleaned, t.description_cleaned, '') AS merchant_key,
+            IFNULL(t.transaction_type, '') AS transaction_type
+        FROM {table('transactions')} AS t
+        LEFT JOIN (SELECT DISTINCT transaction_id FROM {table('recurring_flags')}) AS f USING (transaction_id)
+        WHERE t.is_recurring IS NULL AND f.transaction_id IS NULL
+    )
+    SELECT
+        t.transaction_id,
+        t.account_id,
+        p.merchant_key AS merchant_name_cleaned,
+        p.transaction_type,
+        t.transaction_date,
+        t.amount
+    FROM {table('transactions')} AS t
+    JOIN PendingSeries AS p
+    ON t.account_id = p.account_id
+        AND COALESCE(t.merchant_name_cleaned, t.description_cleaned, '') = p.merchant_key
+        AND IFNULL(t.transaction_type, '') = p.transaction_type
+    """
+    series_df = query_to_frame(client, select_series_query)
+    if series_df.empty:
+        return 0
+
+    recurring_df = detect_recurring(series_df)
+    flags_df = recurring_df[['transaction_id', 'is_recurring', 'recurring_period']].assign(detected_at=_server_timestamp(client))
+    job_config = bigquery.LoadJobConfig(schema=RECURRING_FLAGS_SCHEMA, write_disposition="WRITE_APPEND")
+    client.load_table_from_dataframe(flags_df, table_id('recurring_flags'), job_config=job_config).result()
+
+    recurring_count = int(recurring_df['is_recurring'].sum())
+    logger.info(f"✅ Flagged {recurring_count} of {len(recurring_df)} re-scored transactions as recurring.")
+    return recurring_count
+
+def _pending_condition(scope_table_id: str | None, alias: str = "") -> str:
+    """
+    Returns the SQL condition on the categorized_transactions view that selects the
+    transactions a run still has to categorize: every uncategorized transaction, or
+    with scope_table_id, the scoped transactions not yet categorized by this run
+    (the query must then bind @run_id).
+    """
+    if scope_table_id is None:
+        return f"{alias}primary_category IS NULL"
+    return (f"{alias}transaction_id IN (SELECT transaction_id FROM `{scope_table_id}`) "
+            f"AND IFNULL({alias}run_id, '') != @run_id")
+
+def _apply_rules(client: bigquery.Client, run_id: str, scope_table_id: str | None = None) -> int:
+    """
+    Categorizes pending transactions with the active rules; the longest matching
+    identifier wins. A single script matches rules once, appends the matches to the
+    ledger, drops their rule candidates and records per-rule hit statistics. Returns the number of matched rows.
+    """
+    rules_script = f"""
+    CREATE TEMP TABLE rule_matches AS
+    SELECT
+        t.transaction_id,
+        r.rule_id,
+        r.primary_category,
+        r.secondary_category
+    FROM {table('categorized_transactions')} AS t
+    JOIN {table('rules')} AS r
+    ON (
+        (r.identifier_type = 'merchant_name_cleaned' AND t.merchant_name_cleaned LIKE '%' || r.identifier || '%') OR
+        (r.identifier_type = 'description_cleaned' AND t.description_cleaned LIKE '%' || r.identifier || '%')
+    ) AND t.transaction_type = r.transaction_type
+    WHERE {_pending_condition(scope_table_id, alias="t.")} AND r.status = 'active'
+    QUALIFY ROW_NUMBER() OVER(PARTITION BY t.transaction_id ORDER BY LENGTH(r.identifier) DESC) = 1;
+
+    INSERT INTO {table('categorization_ledger')}
+        (transaction_id, primary_category, secondary_category, categorization_method, rule_id, run_id, categorized_at)
+    SELECT transaction_id, primary_category, secondary_category, 'rule-based', rule_id, @run_id, CURRENT_TIMESTAMP()
+    FROM rule_matches;
+
+    DELETE FROM {table('rule_candidates')}
+    WHERE transaction_id IN (SELECT transaction_id FROM rule_matches);
+
+    MERGE {table('rule_stats')} AS S
+    USING (SELECT rule_id, COUNT(*) AS hits FROM rule_matches GROUP BY rule_id) AS H
+    ON S.rule_id = H.rule_id
+    WHEN MATCHED THEN
+        UPDATE SET hit_count = IFNULL(S.hit_count, 0) + H.hits, last_hit_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN
+        INSERT (rule_id, hit_count, last_hit_at) VALUES (H.rule_id, H.hits, CURRENT_TIMESTAMP());
 
+    SELECT COUNT(*) AS matched FROM rule_matches;
+    """
+    rules_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("run_id", "STRING", run_id)]
+    )
+    rules_updated_count = next(iter(client.query(rules_script, job_config=rules_config).result()))['matched']
+    logger.info(f"Rules-based categorization affected {rules_updated_count} rows.")
+    return rules_updated_count
+
+def _apply_llm_categorization(client: bigquery.Client, run_id: str, batch_sizer: AdaptiveBatchSizer,
+                              scope_table_id: str | None = None) -> dict:
+    """
+    Categorizes the remaining pending transactions with the LLM in adaptively sized
+    batches, appends the results to the ledger and learns new rules from them.
+    The pending rows are selected from the categorized_transactions view once into a
+    temporary table and paged through in transaction_id order, so rows the LLM could
+    not categorize are simply passed over. Stops early when cancellation is requested
+    or after LLM_MAX_CONSECUTIVE_SERVICE_FAILURES batches in a row failed on service
+    errors; the rows not reached stay uncategorized for the next run.
+    Returns the number of `categorized`, `failed` and `deferred` rows and the
+    `service_error` that stopped the run, if any.
+    """
+    outcome = {"categorized": 0, "failed": 0, "deferred": 0, "service_error": None}
+    pending_table_id = table_id(f"temp_llm_pending_{str(uuid.uuid4()).replace('-', '')}")
+    logger.info("Stage 2: Selecting the transactions pending LLM categorization.")
+    pending_query = f"""
+    SELECT transaction_id, description_cleaned, merchant_name_cleaned, transaction_type
+    FROM {table('categorized_transactions')}
+    WHERE {_pending_condition(scope_table_id)}
+    """
+    pending_config = bigquery.QueryJobConfig(
+        destination=pending_table_id,
+        write_disposition="WRITE_TRUNCATE",
+        clustering_fields=["transaction_id"],
+        query_parameters=[bigquery.ScalarQueryParameter("run_id", "STRING", run_id)],
+    )
+    page_query = f"""
+    SELECT transaction_id, description_cleaned, merchant_name_cleaned, transaction_type
+    FROM `{pending_table_id}`
+    WHERE transaction_id > @after_transaction_id
+    ORDER BY transaction_id
+    LIMIT @batch_size
+    """
+    try:
+        client.query(pending_query, job_config=pending_config).result()
+        pending_count = client.get_table(pending_table_id).num_rows
+        logger.info(f"Found {pending_count} transactions to categorize with the LLM.")
+        after_transaction_id = ""
+        consecutive_service_failures = 0
+        while pending_count and not cancellation_token.is_cancellation_requested():
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter("after_transaction_id", "STRING", after_transaction_id),
+                    bigquery.ScalarQueryParameter("batch_size", "INT64", batch_sizer.size),
+                ]
+            )
+            uncategorized_df = query_to_frame(client, page_query, job_config)
+            if uncategorized_df.empty:
+                logger.info("✅ No new transactions found requiring LLM categorization.")
+                break
+
+            batch_df = batch_sizer.fit(uncategorized_df)
+            after_transaction_id = batch_df['transaction_id'].iloc[-1]
+            logger.info(f"Sending a batch of {len(batch_df)} transactions to Gemini for categorization...")
+            print("Applying LLM-powered categorization for remaining transactions...")
+            try:
+                categorized_data, failed_ids = _categorize_batch(get_categorization_model(), batch_df, batch_sizer)
+                consecutive_service_failures = 0
+            except LLMServiceError as e:
+                # The batch's uncategorized rows are left pending rather than marked failed.
+                categorized_data, failed_ids = e.categorized, []
+                consecutive_service_failures += 1
+                if consecutive_service_failures >= LLM_MAX_CONSECUTIVE_SERVICE_FAILURES:
+                    outcome["service_error"] = str(e)
+                    logger.error(f"🚨 Stopping LLM categorization after {consecutive_service_failures} consecutive service failures.")
+            outcome["failed"] += len(failed_ids)
+            logger.info(f"Received and validated {len(categorized_data)} categorizations from LLM.")
+            if failed_ids:
+                logger.warning(f"{len(failed_ids)} transactions could not be categorized by the LLM and will be skipped for this run.")
+
+            if categorized_data:
+                # Stage 3: Applying LLM-based categorizations to BigQuery.
+                logger.info("Stage 3: Applying LLM-based categorizations to BigQuery.")
+                categorized_df = pd.DataFrame(categorized_data).merge(batch_df[['transaction_id'] + _CANDIDATE_FIELDS], on='transaction_id')
+                updated_count = _append_categorizations(client, categorized_df, 'llm-powered', run_id)
+                outcome["categorized"] += updated_count
+                logger.info(f"✅ Successfully updated {updated_count} transactions with LLM categories.")
+
+                # Stage 4: Learn from LLM categorizations and create new rules
+                learn_and_create_rules_from_llm_categorizations(client)
+            else:
+                logger.warning("LLM categorization ran, but no new valid category suggestions were produced.")
+            if outcome["service_error"]:
+                break
+        outcome["deferred"] = pending_count - outcome["categorized"] - outcome["failed"]
+    finally:
+        client.delete_table(pending_table_id, not_found_ok=True)
+    return outcome
+
+def _compact_ledger(client: bigquery.Client):
+    """
+    Compacts the categorization ledger before a run reads the categorized_transactions
+    view. A failed compaction only makes reads costlier, so the run goes on.
+    """
+    try:
+        compacted_count = compact_categorization_ledger(client)
+        logger.info(f"Compacted the latest categorizations of {compacted_count} transactions into categorization_state.")
+    except GoogleAPICallError as e:
+        logger.warning(f"Could not compact the categorization ledger, continuing without it: {e}")
+
+@_exclusive_per_tenant
 def run_categorization() -> str:
     """
-    Categorizes transactions using a hybrid rules-based and LLM-powered approach.
+    Categorizes transactions using a hybrid approach: existing rules first, then a
+    local model trained on earlier results, and the LLM for whatever remains.
     """
     cancellation_token.reset()
     logger.info("Starting categorization process...")
@@ -41,196 +569,73 @@ def run_categorization() -> str:
 
 
     client = bigquery.Client()
+    ensure_tables(client)
+    _compact_ledger(client)
+    # Every categorization of this run is appended to the ledger under the same run_id.
+    run_id = str(uuid.uuid4())
     total_updated_count = 0
     
     analytics = {
         "rule_based_count": 0,
+        "model_based_count": 0,
         "llm_based_count": 0,
+        "recurring_count": 0,
         "total_categorized": 0,
         "category_distribution": {}
     }
 
+    # Stage 0: Flag recurring transactions
+    logger.info("Stage 0: Detecting recurring transactions.")
+    print("Detecting recurring transactions...")
+    try:
+        analytics["recurring_count"] = _apply_recurring_detection(client)
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error during recurring transaction detection: {e}")
+        return f"🚨 An error occurred during recurring transaction detection: {e}"
+
     # Stage 1: Apply existing rules
     logger.info("Stage 1: Applying rules-based categorization.")
     print("Applying rule-based categorization...")
-    rules_merge_query = """
-    MERGE `fsi-banking-agentspace.txns.transactions` AS T
-    USING (
-        SELECT
-            t.transaction_id,
-            r.rule_id,
-            r.primary_category,
-            r.secondary_category
-        FROM `fsi-banking-agentspace.txns.transactions` AS t
-        JOIN `fsi-banking-agentspace.txns.rules` AS r
-        ON (
-            (r.identifier_type = 'merchant_name_cleaned' AND t.merchant_name_cleaned LIKE '%' || r.identifier || '%') OR
-            (r.identifier_type = 'description_cleaned' AND t.description_cleaned LIKE '%' || r.identifier || '%')
-        ) AND t.transaction_type = r.transaction_type
-        WHERE t.primary_category IS NULL AND r.status = 'active'
-        QUALIFY ROW_NUMBER() OVER(PARTITION BY t.transaction_id ORDER BY LENGTH(r.identifier) DESC) = 1
-    ) AS R
-    ON T.transaction_id = R.transaction_id
-    WHEN MATCHED THEN
-        UPDATE SET
-            primary_category = R.primary_category,
-            secondary_category = R.secondary_category,
-            categorization_method = 'rule-based',
-            rule_id = R.rule_id
-    """
     try:
-        merge_job = client.query(rules_merge_query)
-        merge_job.result()
-        rules_updated_count = merge_job.num_dml_affected_rows or 0
+        rules_updated_count = _apply_rules(client, run_id)
         total_updated_count += rules_updated_count
         analytics["rule_based_count"] = rules_updated_count
-        logger.info(f"Rules-based categorization affected {rules_updated_count} rows.")
     except GoogleAPICallError as e:
         logger.error(f"🚨 BigQuery error during rule-based categorization: {e}")
         return f"🚨 An error occurred during rule-based categorization: {e}"
 
-    # Stage 2: Fetch and process uncategorized transactions in a loop
-    while True:
-        if cancellation_token.is_cancellation_requested():
-            return "🛑 Operation cancelled by user."
-        logger.info("Stage 2: Fetching uncategorized transactions for LLM.")
-        select_uncategorized_query = """
-        SELECT transaction_id, description_cleaned, merchant_name_cleaned
-        FROM `fsi-banking-agentspace.txns.transactions`
-        WHERE primary_category IS NULL
-        LIMIT 100;
-        """
-        try:
-            uncategorized_df = client.query(select_uncategorized_query).to_dataframe()
-        except GoogleAPICallError as e:
-            logger.error(f"🚨 BigQuery error retrieving uncategorized transactions: {e}")
-            return f"🚨 Failed to retrieve uncategorized transactions: {e}"
-
-        if uncategorized_df.empty:
-            logger.info("✅ No new transactions found requiring LLM categorization.")
-            break
-
-        logger.info(f"Found {len(uncategorized_df)} transactions to categorize with the LLM.")
-        print("Applying LLM-powered categorization for remaining transactions...")
-        model = GenerativeModel("gemini-2.5-flash")
-
-        prompt = f"""
-        You are an expert financial transaction categorizer. Your task is to categorize the transactions in the following JSON data.
-        **Instructions:**
-        1.  For each transaction object, determine the correct `primary_category` and `secondary_category`.
-        2.  You **MUST** use only the categories provided in the "Valid Categories" section below.
-        3.  Avoid using 'Other Expense' if a more specific category is available.
-        4.  Your final output **MUST** be a valid JSON array of objects.
-        5.  Each object in the array **MUST** contain three keys: `transaction_id`, `primary_category`, and `secondary_category`. All values must be strings.
-        **Valid Categories:**
-        ```json
-        {json.dumps(VALID_CATEGORIES, indent=4)}
-        ```
-        **Transactions to Categorize:**
-        ```json
-        {uncategorized_df.to_json(orient='records')}
-        ```
-        """
-
-        response_text = ""
-        categorized_data = []
-        try:
-            logger.info("Sending batch to Gemini for categorization...")
-            response = model.generate_content(prompt)
-            response_text = response.text
-            cleaned_response = response_text.strip().replace('```json', '').replace('```', '').strip()
-            
-            try:
-                parsed_json = json.loads(cleaned_response)
-            except json.JSONDecodeError:
-                # If parsing fails, try to fix the JSON and parse again
-                cleaned_response = _fix_json_array(cleaned_response)
-                parsed_json = json.loads(cleaned_response)
-
-
-            if isinstance(parsed_json, list):
-                for item in parsed_json:
-                    if (isinstance(item, dict) and
-                            'transaction_id' in item and
-                            'primary_category' in item and
-                            'secondary_category' in item and
-                            isinstance(item.get('transaction_id'), str) and
-                            isinstance(item.get('primary_category'), str) and
-                            isinstance(item.get('secondary_category'), str)):
-                        categorized_data.append(item)
-                    else:
-                        logger.warning(f"Skipping invalid record from LLM: {item}")
-            else:
-                 logger.warning(f"LLM response was not a list, but a {type(parsed_json)}.")
-
-            logger.info(f"Received and validated {len(categorized_data)} categorizations from LLM.")
-
-        except (json.JSONDecodeError, AttributeError, Exception) as e:
-            logger.error(f"🚨 Failed to parse or validate LLM response: {e}. Raw response: {response_text}")
-            return f"🚨 Failed to parse or validate LLM response: {e}. Response was: {response_text}"
-
-        if not categorized_data:
-            logger.warning("LLM categorization ran, but no new valid category suggestions were produced.")
-            continue
-
-        # Stage 3: Applying LLM-based categorizations to BigQuery.
-        logger.info("Stage 3: Applying LLM-based categorizations to BigQuery.")
-        
-        temp_table_id = f"fsi-banking-agentspace.txns.temp_categorizations_{str(uuid.uuid4()).replace('-', '')}"
-
-        try:
-            # Create a temporary table
-            temp_table_schema = [
-                bigquery.SchemaField("transaction_id", "STRING"),
-                bigquery.SchemaField("primary_category", "STRING"),
-                bigquery.SchemaField("secondary_category", "STRING"),
-            ]
-            temp_table = bigquery.Table(temp_table_id, schema=temp_table_schema)
-            client.create_table(temp_table)
-
-            # Stream the data into the temporary table
-            errors = client.insert_rows_json(temp_table_id, categorized_data)
-            if errors:
-                logger.error(f"🚨 Errors occurred while inserting rows into temporary table: {errors}")
-                return "🚨 An error occurred while preparing categorized data."
-
-            # Perform the MERGE operation
-            llm_merge_query = f"""
-            MERGE `fsi-banking-agentspace.txns.transactions` AS T
-            USING `{temp_table_id}` AS S
-            ON T.transaction_id = S.transaction_id
-            WHEN MATCHED AND T.primary_category IS NULL THEN
-                UPDATE SET
-                    primary_category = S.primary_category,
-                    secondary_category = S.secondary_category,
-                    categorization_method = 'llm-powered'
-            """
-            llm_merge_job = client.query(llm_merge_query)
-            llm_merge_job.result()
-            updated_count = llm_merge_job.num_dml_affected_rows or 0
-            total_updated_count += updated_count
-            analytics["llm_based_count"] += updated_count
-            logger.info(f"✅ Successfully updated {updated_count} transactions with LLM categories.")
-            
-            # Stage 4: Learn from LLM categorizations and create new rules
-            if updated_count > 0:
-                learn_and_create_rules_from_llm_categorizations(client)
+    # Stage 1b: Accept confident predictions from the local classifier
+    logger.info("Stage 1b: Applying local model categorization.")
+    print("Applying local model categorization...")
+    try:
+        model_updated_count = _apply_local_classifier(client, run_id)
+        total_updated_count += model_updated_count
+        analytics["model_based_count"] = model_updated_count
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error during local model categorization: {e}")
+        return f"🚨 An error occurred during local model categorization: {e}"
 
-        except GoogleAPICallError as e:
-            logger.error(f"🚨 BigQuery error during LLM-based categorization update: {e}")
-            return f"🚨 An error occurred during LLM-based categorization: {e}"
-        finally:
-            # Clean up the temporary table
-            client.delete_table(temp_table_id, not_found_ok=True)
-            logger.info(f"Cleaned up temporary table: {temp_table_id}")
+    # Stages 2 and 3: Categorize the remaining transactions with the LLM
+    batch_sizer = AdaptiveBatchSizer(max_input_tokens=CATEGORIZATION_MAX_INPUT_TOKENS, max_output_tokens=CATEGORIZATION_MAX_OUTPUT_TOKENS)
+    try:
+        llm_outcome = _apply_llm_categorization(client, run_id, batch_sizer)
+        total_updated_count += llm_outcome["categorized"]
+        analytics["llm_based_count"] = llm_outcome["categorized"]
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error during LLM-based categorization: {e}")
+        return f"🚨 An error occurred during LLM-based categorization: {e}"
+    if cancellation_token.is_cancellation_requested():
+        return "🛑 Operation cancelled by user."
 
     # Final analytics gathering
     analytics["total_categorized"] = total_updated_count
+    analytics["llm_batching"] = batch_sizer.summary()
+    logger.info(f"LLM batch sizing metrics: {analytics['llm_batching']}")
     
-    dist_query = """
+    dist_query = f"""
     SELECT primary_category, secondary_category, COUNT(*) as count
-    FROM `fsi-banking-agentspace.txns.transactions`
-    WHERE categorization_method IN ('rule-based', 'llm-powered')
+    FROM {table('categorized_transactions')}
+    WHERE categorization_method IN ('rule-based', 'model', 'llm-powered')
     GROUP BY 1, 2
     ORDER BY count DESC
     LIMIT 10
@@ -250,7 +655,16 @@ def run_categorization() -> str:
 
     * **Total Transactions Categorized**: {analytics['total_categorized']}
     * **By Rule-Based Method**: {analytics['rule_based_count']}
+    * **By Local Model**: {analytics['model_based_count']}
     * **By LLM-Powered Method**: {analytics['llm_based_count']}
+    * **Left Uncategorized (LLM could not categorize)**: {llm_outcome['failed']}
+    * **Recurring Transactions Flagged**: {analytics['recurring_count']}
+
+    **LLM Batching:**
+    * **Batches / LLM Calls**: {analytics['llm_batching']['batches']} / {analytics['llm_batching']['llm_calls']}
+    * **Batch Size (min / avg / max)**: {analytics['llm_batching']['min_batch_size']} / {analytics['llm_batching']['avg_batch_size']} / {analytics['llm_batching']['max_batch_size']}
+    * **Truncated / Failed Calls**: {analytics['llm_batching']['truncated_calls']} / {analytics['llm_batching']['failed_calls']}
+    * **Throughput**: {analytics['llm_batching']['rows_per_second']} rows/sec
 
     **Top 10 Category Assignments:**
     | Primary Category | Secondary Category | Count |
@@ -259,6 +673,9 @@ def run_categorization() -> str:
     for item in analytics['category_distribution']:
         report += f"| {item['primary_category']} | {item['secondary_category']} | {item['count']} |\n"
 
+    if llm_outcome["service_error"]:
+        report += (f"\n    ⚠️ **LLM Service Unavailable**: Vertex AI kept failing ({llm_outcome['service_error']}), so the run stopped early. "
+                   f"{llm_outcome['deferred']} transactions are still uncategorized and will be picked up by the next run.\n")
     return report
 
 def learn_and_create_rules_from_llm_categorizations(client: bigquery.Client):
@@ -267,30 +684,26 @@ def learn_and_create_rules_from_llm_categorizations(client: bigquery.Client):
     """
     logger.info("Learning from LLM categorizations to create new rules...")
 
-    query = """
-    WITH LlmCategorizedMerchants AS (
-        SELECT
-            merchant_name_cleaned,
-            primary_category,
-            secondary_category,
-            transaction_type,
-            COUNT(*) AS transaction_count
-        FROM `fsi-banking-agentspace.txns.transactions`
-        WHERE categorization_method = 'llm-powered' AND transaction_type IS NOT NULL
-        GROUP BY 1, 2, 3, 4
-        HAVING COUNT(*) > 1
-    )
-    SELECT * FROM LlmCategorizedMerchants
-    WHERE NOT EXISTS (
+    query = f"""
+    SELECT
+        C.identifier AS merchant_name_cleaned,
+        C.primary_category,
+        C.secondary_category,
+        C.transaction_type
+    FROM {table('rule_candidates')} AS C
+    WHERE C.identifier_type = 'merchant_name_cleaned'
+    AND NOT EXISTS (
         SELECT 1
-        FROM `fsi-banking-agentspace.txns.rules` AS R
-        WHERE R.identifier = LlmCategorizedMerchants.merchant_name_cleaned
-        AND R.transaction_type = LlmCategorizedMerchants.transaction_type
+        FROM {table('rules')} AS R
+        WHERE R.identifier = C.identifier
+        AND R.transaction_type = C.transaction_type
         AND R.identifier_type = 'merchant_name_cleaned'
-    );
+    )
+    GROUP BY 1, 2, 3, 4
+    HAVING COUNT(*) > 1;
     """
     try:
-        new_rules_df = client.query(query).to_dataframe()
+        new_rules_df = query_to_frame(client, query)
 
         if new_rules_df.empty:
             logger.info("No new rule creation opportunities found from the latest LLM categorizations.")
@@ -298,16 +711,91 @@ def learn_and_create_rules_from_llm_categorizations(client: bigquery.Client):
 
         logger.info(f"Found {len(new_rules_df)} new merchants to create rules for.")
 
-        for _, row in new_rules_df.iterrows():
+        for row in new_rules_df.itertuples(index=False):
             if cancellation_token.is_cancellation_requested():
                 logger.info("Cancellation requested, stopping rule creation.")
                 break
             rules_manager_tools.create_rule(
-                primary_category=row['primary_category'],
-                secondary_category=row['secondary_category'],
-                identifier=row['merchant_name_cleaned'],
+                primary_category=row.primary_category,
+                secondary_category=row.secondary_category,
+                identifier=row.merchant_name_cleaned,
                 identifier_type='merchant_name_cleaned',
-                transaction_type=row['transaction_type']
+                transaction_type=row.transaction_type
             )
     except GoogleAPICallError as e:
-        logger.error(f"🚨 BigQuery error when trying to learn from LLM categorizations: {e}")
\ No newline at end of file
+        logger.error(f"🚨 BigQuery error when trying to learn from LLM categorizations: {e}")
+
+@_exclusive_per_tenant
+def apply_rule_changes(rule_ids: list[str]) -> str:
+    """
+    Re-categorizes only the transactions affected by created, reactivated or
+    deactivated rules: the transactions currently categorized by one of the rules,
+    and, for the active ones, the uncategorized, model or LLM categorized transactions
+    of the rule's transaction type whose identifier field contains the rule's
+    identifier. Those rows go through the rules, the local model and the LLM again;
+    every other transaction is left untouched.
+    """
+    cancellation_token.reset()
+    logger.info(f"Applying the changes of rules {rule_ids} to affected transactions...")
+    client = bigquery.Client()
+    ensure_tables(client)
+    _compact_ledger(client)
+    run_id = str(uuid.uuid4())
+    scope_table_id = table_id(f"temp_rule_change_{str(uuid.uuid4()).replace('-', '')}")
+
+    scope_query = f"""
+    SELECT DISTINCT t.transaction_id
+    FROM {table('categorized_transactions')} AS t
+    JOIN {table('rules')} AS r
+    ON r.rule_id IN UNNEST(@rule_ids)
+    WHERE t.rule_id = r.rule_id
+       OR (
+           r.status = 'active'
+           AND t.transaction_type = r.transaction_type
+           AND (t.primary_category IS NULL OR t.categorization_method IN ('model', 'llm-powered'))
+           AND (
+               (r.identifier_type = 'merchant_name_cleaned' AND t.merchant_name_cleaned LIKE '%' || r.identifier || '%') OR
+               (r.identifier_type = 'description_cleaned' AND t.description_cleaned LIKE '%' || r.identifier || '%')
+           )
+       )
+    """
+    scope_config = bigquery.QueryJobConfig(
+        destination=scope_table_id,
+        write_disposition="WRITE_TRUNCATE",
+        query_parameters=[bigquery.ArrayQueryParameter("rule_ids", "STRING", rule_ids)],
+    )
+    batch_sizer = AdaptiveBatchSizer(max_input_tokens=CATEGORIZATION_MAX_INPUT_TOKENS, max_output_tokens=CATEGORIZATION_MAX_OUTPUT_TOKENS)
+    try:
+        client.query(scope_query, job_config=scope_config).result()
+        affected_count = client.get_table(scope_table_id).num_rows
+        if not affected_count:
+            return "👍 **No Transactions Affected**: No transactions need to be re-categorized for these rules."
+        logger.info(f"Re-categorizing {affected_count} transactions affected by {len(rule_ids)} rule changes.")
+
+        rules_count = _apply_rules(client, run_id, scope_table_id)
+        model_count = _apply_local_classifier(client, run_id, scope_table_id)
+        llm_outcome = _apply_llm_categorization(client, run_id, batch_sizer, scope_table_id)
+        llm_count = llm_outcome["categorized"]
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error while applying rule changes: {e}")
+        return f"🚨 **Error**: A database error occurred while re-categorizing the transactions affected by the rules: {e}"
+    finally:
+        client.delete_table(scope_table_id, not_found_ok=True)
+
+    unchanged_count = affected_count - rules_count - model_count - llm_count
+    report = f"""
+    ✅ **Rule Changes Applied!** {affected_count} transactions were affected by {len(rule_ids)} rule(s) and re-evaluated.
+
+    * **By Rule-Based Method**: {rules_count}
+    * **By Local Model**: {model_count}
+    * **By LLM-Powered Method**: {llm_count}
+    * **Unchanged (could not be re-categorized)**: {unchanged_count}
+    """
+    if cancellation_token.is_cancellation_requested():
+        report += "\n    🛑 The re-categorization was cancelled before all affected transactions were processed.\n"
+    elif llm_outcome["service_error"]:
+        report += (f"\n    ⚠️ Vertex AI kept failing ({llm_outcome['service_error']}), so the re-categorization stopped early; "
+                   f"{llm_outcome['deferred']} transactions keep their previous categories. Apply the rule changes again later.\n")
+    elif llm_outcome["failed"]:
+        report += f"\n    ⚠️ The LLM could not categorize {llm_outcome['failed']} transactions; they keep their previous categories.\n"
+    return report
@@ -1,4 +1,5 @@
 from google.cloud import bigquery
+from src.txn_agent.common.tenancy import table
 
 def run_full_cleanup() -> str:
     """
@@ -8,16 +9,16 @@ def run_full_cleanup() -> str:
     """
     client = bigquery.Client()
 
-    standardize_query = """
-    UPDATE `fsi-banking-agentspace.txns.transactions`
+    standardize_query = f"""
+    UPDATE {table('transactions')}
     SET
         merchant_name_cleaned = TRIM(REGEXP_REPLACE(UPPER(merchant_name_raw), r'[^A-Z0-9]+', ' ')),
         description_cleaned = TRIM(REGEXP_REPLACE(UPPER(description_raw), r'[^A-Z0-9]+', ' '))
     WHERE merchant_name_cleaned IS NULL OR description_cleaned IS NULL;
     """
 
-    correct_type_query = """
-    UPDATE `fsi-banking-agentspace.txns.transactions`
+    correct_type_query = f"""
+    UPDATE {table('transactions')}
     SET
         transaction_type = CASE
             WHEN amount < 0 THEN 'Debit'
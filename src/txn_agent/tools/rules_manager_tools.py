@@ -3,14 +3,23 @@
 from __future__ import annotations
 import logging
 import uuid
+from typing import Literal
 from google.api_core.exceptions import GoogleAPICallError
+from google.adk.tools import ToolContext
 from google.cloud import bigquery
+from src.txn_agent.common.bq_client import ensure_tables
 from src.txn_agent.common.constants import VALID_CATEGORIES
+from src.txn_agent.common.encoding import query_to_frame
+from src.txn_agent.common.rule_analysis import find_shadowed_rules
+from src.txn_agent.common.tenancy import table
 import pandas as pd
 
 # Set up a logger for this module
 logger = logging.getLogger(__name__)
-_rule_suggestions_cache = None
+
+SUGGESTION_SETS_STATE_KEY = "rule_suggestion_sets"
+MAX_SUGGESTION_SETS = 5
+_detached_suggestion_state = {}
 
 def create_rule(primary_category: str, secondary_category: str, identifier: str, identifier_type: str, transaction_type: str, persona: str = 'general', confidence: float = 0.99) -> str:
     """
@@ -19,6 +28,7 @@ def create_rule(primary_category: str, secondary_category: str, identifier: str,
     """
     logger.info(f"Attempting to create a new rule for identifier: '{identifier}'")
     client = bigquery.Client()
+    ensure_tables(client)
 
     # Validation checks
     if secondary_category in ['Other Expense', 'Other Income']:
@@ -37,9 +47,9 @@ def create_rule(primary_category: str, secondary_category: str, identifier: str,
         return f"⚠️ **Invalid Identifier Type**: `{identifier_type}` is not a valid identifier type. It must be either 'merchant_name_cleaned' or 'description_cleaned'."
 
     # Check for existing or conflicting rules
-    check_query = """
+    check_query = f"""
     SELECT rule_id, primary_category, secondary_category
-    FROM `fsi-banking-agentspace.txns.rules`
+    FROM {table('rules')}
     WHERE @identifier LIKE '%' || identifier || '%'
       AND identifier_type = @identifier_type
       AND transaction_type = @transaction_type
@@ -55,12 +65,12 @@ def create_rule(primary_category: str, secondary_category: str, identifier: str,
     try:
         existing_rules = client.query(check_query, job_config=job_config_check).to_dataframe()
         if not existing_rules.empty:
-            for _, rule in existing_rules.iterrows():
-                if rule['primary_category'] == primary_category and rule['secondary_category'] == secondary_category:
-                    return f"✅ **Rule Already Exists**: A rule with this exact configuration already exists (Rule ID: `{rule['rule_id']}`). No action was taken."
+            for rule in existing_rules.itertuples(index=False):
+                if rule.primary_category == primary_category and rule.secondary_category == secondary_category:
+                    return f"✅ **Rule Already Exists**: A rule with this exact configuration already exists (Rule ID: `{rule.rule_id}`). No action was taken."
                 else:
-                    return (f"⚠️ **Conflicting Rule Alert**: A conflicting rule already exists (Rule ID: `{rule['rule_id']}`) "
-                            f"that categorizes '{identifier}' as `{rule['primary_category']} / {rule['secondary_category']}`. "
+                    return (f"⚠️ **Conflicting Rule Alert**: A conflicting rule already exists (Rule ID: `{rule.rule_id}`) "
+                            f"that categorizes '{identifier}' as `{rule.primary_category} / {rule.secondary_category}`. "
                             f"Please resolve this conflict before creating a new rule.")
     except GoogleAPICallError as e:
         logger.error(f"🚨 BigQuery error during rule check: {e}")
@@ -68,10 +78,13 @@ def create_rule(primary_category: str, secondary_category: str, identifier: str,
 
     # If no conflicts, create the new rule
     rule_id = str(uuid.uuid4())
-    insert_query = """
-    INSERT INTO `fsi-banking-agentspace.txns.rules`
+    insert_query = f"""
+    INSERT INTO {table('rules')}
         (rule_id, primary_category, secondary_category, identifier, identifier_type, transaction_type, persona_type, confidence_score, status)
-    VALUES (@rule_id, @primary_category, @secondary_category, @identifier, @identifier_type, @transaction_type, @persona, @confidence, 'active')
+    VALUES (@rule_id, @primary_category, @secondary_category, @identifier, @identifier_type, @transaction_type, @persona, @confidence, 'active');
+
+    INSERT INTO {table('rule_stats')} (rule_id, hit_count, created_at)
+    VALUES (@rule_id, 0, CURRENT_TIMESTAMP());
     """
     job_config_insert = bigquery.QueryJobConfig(
         query_parameters=[
@@ -93,7 +106,7 @@ def create_rule(primary_category: str, secondary_category: str, identifier: str,
         logger.error(f"🚨 BigQuery error creating rule: {e}")
         return f"🚨 **Error**: A database error occurred while creating the new rule: {e}"
 
-def update_rule_status(rule_id: int, status: str) -> str:
+def update_rule_status(rule_id: str, status: str) -> str:
     """Updates the status of a rule (e.g., 'active', 'inactive')."""
     logger.info(f"Attempting to update rule ID {rule_id} to status '{status}'")
     if status not in ['active', 'inactive']:
@@ -101,125 +114,273 @@ def update_rule_status(rule_id: int, status: str) -> str:
         return "⚠️ **Invalid Status**: The status must be either 'active' or 'inactive'."
 
     client = bigquery.Client()
-    query = """
-    UPDATE `fsi-banking-agentspace.txns.rules`
+    ensure_tables(client)
+    query = f"""
+    UPDATE {table('rules')}
     SET status = @status
     WHERE rule_id = @rule_id
     """
     job_config = bigquery.QueryJobConfig(
         query_parameters=[
             bigquery.ScalarQueryParameter("status", "STRING", status),
-            bigquery.ScalarQueryParameter("rule_id", "INT64", rule_id),
+            bigquery.ScalarQueryParameter("rule_id", "STRING", rule_id),
         ]
     )
     try:
-        client.query(query, job_config=job_config).result()
+        update_job = client.query(query, job_config=job_config)
+        update_job.result()
+        if not update_job.num_dml_affected_rows:
+            logger.warning(f"Rule {rule_id} was not found.")
+            return f"⚠️ **Rule Not Found**: No rule with Rule ID `{rule_id}` exists."
+        if status == 'active':
+            # A reactivated rule gets a fresh grace period before prune_dead_rules considers it stale again.
+            reactivate_query = f"""
+            MERGE {table('rule_stats')} AS T
+            USING (SELECT @rule_id AS rule_id) AS S
+            ON T.rule_id = S.rule_id
+            WHEN MATCHED THEN
+                UPDATE SET reactivated_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN
+                INSERT (rule_id, hit_count, created_at, reactivated_at)
+                VALUES (S.rule_id, 0, CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP())
+            """
+            reactivate_config = bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter("rule_id", "STRING", rule_id)]
+            )
+            client.query(reactivate_query, job_config=reactivate_config).result()
         logger.info(f"Successfully updated rule {rule_id}.")
         return f"✅ **Rule Updated!** The status of Rule ID `{rule_id}` has been successfully updated to `{status}`."
     except GoogleAPICallError as e:
         logger.error(f"🚨 BigQuery error updating rule {rule_id}: {e}")
         return f"🚨 **Error**: A database error occurred while updating the rule: {e}"
 
-def suggest_new_rules() -> str:
+def _suggestion_state(tool_context: ToolContext | None):
+    """Returns the state that holds suggestion sets: the session's state, or a process-local fallback outside a session."""
+    return tool_context.state if tool_context is not None else _detached_suggestion_state
+
+def suggest_new_rules(tool_context: ToolContext | None = None) -> str:
     """
-    Analyzes LLM-categorized transactions to suggest new, high-confidence rules
-    for merchants that frequently get categorized by the LLM.
+    Suggests new, high-confidence rules for merchants and descriptions that
+    are currently categorized by the LLM. Reads the incrementally maintained
+    rule_candidates table and stores the suggestions as a set in the session,
+    identified by a suggestion_set_id that `bulk_create_rules` consumes.
     """
-    global _rule_suggestions_cache
-    logger.info("Analyzing LLM-categorized transactions for new rule suggestions.")
+    logger.info("Reading rule candidates for new rule suggestions.")
     client = bigquery.Client()
-    query = """
-    WITH PotentialRules AS (
-        SELECT
-            identifier,
-            identifier_type,
-            primary_category,
-            secondary_category,
-            transaction_type,
-            COUNT(*) AS transaction_count
-        FROM (
-            SELECT
-                merchant_name_cleaned as identifier,
-                'merchant_name_cleaned' as identifier_type,
-                primary_category,
-                secondary_category,
-                transaction_type
-            FROM `fsi-banking-agentspace.txns.transactions`
-            WHERE categorization_method = 'llm-powered'
-            UNION ALL
-            SELECT
-                description_cleaned as identifier,
-                'description_cleaned' as identifier_type,
-                primary_category,
-                secondary_category,
-                transaction_type
-            FROM `fsi-banking-agentspace.txns.transactions`
-            WHERE categorization_method = 'llm-powered'
-        )
+    ensure_tables(client)
+    # The most frequent label of each identifier is suggested, unless an existing rule already covers it.
+    query = f"""
+    WITH CandidateCounts AS (
+        SELECT identifier, identifier_type, primary_category, secondary_category, transaction_type, COUNT(*) AS transaction_count
+        FROM {table('rule_candidates')}
         GROUP BY 1, 2, 3, 4, 5
         HAVING COUNT(*) > 1
+    ),
+    RankedCandidates AS (
+        SELECT
+            *,
+            ROW_NUMBER() OVER(PARTITION BY identifier, identifier_type, transaction_type ORDER BY transaction_count DESC) AS label_rank
+        FROM CandidateCounts
     )
     SELECT
-        pr.identifier,
-        pr.identifier_type,
-        pr.primary_category,
-        pr.secondary_category,
-        pr.transaction_type,
-        pr.transaction_count
-    FROM PotentialRules pr
-    WHERE NOT EXISTS (
+        c.identifier,
+        c.identifier_type,
+        c.primary_category,
+        c.secondary_category,
+        c.transaction_type,
+        c.transaction_count
+    FROM RankedCandidates c
+    WHERE c.label_rank = 1
+    AND c.secondary_category NOT IN ('Other Expense', 'Other Income')
+    AND NOT EXISTS (
         SELECT 1
-        FROM `fsi-banking-agentspace.txns.rules` r
-        WHERE pr.identifier LIKE '%' || r.identifier || '%'
-        AND pr.identifier_type = r.identifier_type
-        AND pr.transaction_type = r.transaction_type
+        FROM {table('rules')} r
+        WHERE c.identifier LIKE '%' || r.identifier || '%'
+        AND c.identifier_type = r.identifier_type
+        AND c.transaction_type = r.transaction_type
     )
-    AND pr.secondary_category NOT IN ('Other Expense', 'Other Income')
-    ORDER BY pr.transaction_count DESC
+    ORDER BY c.transaction_count DESC
     LIMIT 10;
     """
     try:
-        suggestions_df = client.query(query).to_dataframe()
-        _rule_suggestions_cache = suggestions_df.to_dict(orient='records')
-
-        if suggestions_df.empty:
-            logger.info("No new rule suggestions found.")
-            return "👍 **No New Suggestions**: I couldn't find any new rule suggestions at this time."
-
-        suggestions_str = "💡 **Here are some new rule suggestions for your approval:**\n\n"
-        suggestions_str += "| Identifier | Identifier Type | Suggested Category | Transaction Type | Based On |\n"
-        suggestions_str += "|---|---|---|---|---|\n"
-        for _, row in suggestions_df.iterrows():
-            suggestions_str += (
-                f"| `{row['identifier']}` | `{row['identifier_type']}` | `{row['primary_category']} / {row['secondary_category']}` | `{row['transaction_type']}` | `{row['transaction_count']} recent transactions` |\n"
-            )
-
-        logger.info(f"Generated {len(suggestions_df)} new rule suggestions.")
-        return suggestions_str
+        suggestions_df = query_to_frame(client, query)
     except GoogleAPICallError as e:
         logger.error(f"🚨 BigQuery error generating new rule suggestions: {e}")
         return f"🚨 **Error**: A database error occurred while generating new rule suggestions: {e}"
 
-def bulk_create_rules() -> str:
+    if suggestions_df.empty:
+        logger.info("No new rule suggestions found.")
+        return "👍 **No New Suggestions**: I couldn't find any new rule suggestions at this time."
+
+    suggestions = [
+        {
+            "identifier": row.identifier,
+            "identifier_type": row.identifier_type,
+            "primary_category": row.primary_category,
+            "secondary_category": row.secondary_category,
+            "transaction_type": row.transaction_type,
+            "transaction_count": int(row.transaction_count),
+        }
+        for row in suggestions_df.itertuples(index=False)
+    ]
+    # Sets are stored per session and replaced as a whole so the change is persisted with the session.
+    state = _suggestion_state(tool_context)
+    suggestion_sets = dict(state.get(SUGGESTION_SETS_STATE_KEY) or {})
+    suggestion_set_id = str(uuid.uuid4())
+    suggestion_sets[suggestion_set_id] = suggestions
+    state[SUGGESTION_SETS_STATE_KEY] = dict(list(suggestion_sets.items())[-MAX_SUGGESTION_SETS:])
+
+    suggestions_str = "💡 **Here are some new rule suggestions for your approval:**\n\n"
+    suggestions_str += "| Identifier | Identifier Type | Suggested Category | Transaction Type | Based On |\n"
+    suggestions_str += "|---|---|---|---|---|\n"
+    for suggestion in suggestions:
+        suggestions_str += (
+            f"| `{suggestion['identifier']}` | `{suggestion['identifier_type']}` | `{suggestion['primary_category']} / {suggestion['secondary_category']}` | `{suggestion['transaction_type']}` | `{suggestion['transaction_count']} recent transactions` |\n"
+        )
+    suggestions_str += f"\nSuggestion set ID: `{suggestion_set_id}`"
+
+    logger.info(f"Generated {len(suggestions)} new rule suggestions in set {suggestion_set_id}.")
+    return suggestions_str
+
+def bulk_create_rules(suggestion_set_id: str, tool_context: ToolContext | None = None) -> str:
     """
-    Creates all rules from the last set of suggestions.
+    Creates all rules from a set of suggestions returned by `suggest_new_rules`,
+    identified by its suggestion_set_id. The whole set is checked against existing
+    rules and inserted in a single query; a set can only be approved once.
     """
-    global _rule_suggestions_cache
-    if not _rule_suggestions_cache:
-        return "⚠️ **No Suggestions to Approve**: Please run `suggest_new_rules` first to generate a list of suggestions."
-
-    results = []
-    for suggestion in _rule_suggestions_cache:
-        result = create_rule(
-            primary_category=suggestion['primary_category'],
-            secondary_category=suggestion['secondary_category'],
-            identifier=suggestion['identifier'],
-            identifier_type=suggestion['identifier_type'],
-            transaction_type=suggestion['transaction_type']
+    state = _suggestion_state(tool_context)
+    suggestion_sets = dict(state.get(SUGGESTION_SETS_STATE_KEY) or {})
+    suggestions = suggestion_sets.get(suggestion_set_id)
+    if not suggestions:
+        return ("⚠️ **No Suggestions to Approve**: No pending suggestion set with ID "
+                f"`{suggestion_set_id}` was found. Please run `suggest_new_rules` first to generate a list of suggestions.")
+
+    client = bigquery.Client()
+    ensure_tables(client)
+    # Suggestions that conflict with an existing rule, or with one created since they were suggested, are skipped.
+    insert_query = f"""
+    CREATE TEMP TABLE new_rules AS
+    SELECT s.*
+    FROM UNNEST(@suggestions) AS s
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM {table('rules')} AS r
+        WHERE s.identifier LIKE '%' || r.identifier || '%'
+        AND s.identifier_type = r.identifier_type
+        AND s.transaction_type = r.transaction_type
+    );
+
+    INSERT INTO {table('rules')}
+        (rule_id, primary_category, secondary_category, identifier, identifier_type, transaction_type, persona_type, confidence_score, status)
+    SELECT rule_id, primary_category, secondary_category, identifier, identifier_type, transaction_type, 'general', 0.99, 'active'
+    FROM new_rules;
+
+    INSERT INTO {table('rule_stats')} (rule_id, hit_count, created_at)
+    SELECT rule_id, 0, CURRENT_TIMESTAMP() FROM new_rules;
+
+    SELECT rule_id, identifier, identifier_type, transaction_type FROM new_rules;
+    """
+    suggestion_params = [
+        bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("rule_id", "STRING", str(uuid.uuid4())),
+            bigquery.ScalarQueryParameter("primary_category", "STRING", suggestion['primary_category']),
+            bigquery.ScalarQueryParameter("secondary_category", "STRING", suggestion['secondary_category']),
+            bigquery.ScalarQueryParameter("identifier", "STRING", suggestion['identifier']),
+            bigquery.ScalarQueryParameter("identifier_type", "STRING", suggestion['identifier_type']),
+            bigquery.ScalarQueryParameter("transaction_type", "STRING", suggestion['transaction_type']),
         )
-        results.append(result)
-    
-    # Clear the cache after processing
-    _rule_suggestions_cache = None
-    
-    return "✅ **Bulk Rule Creation Complete!**\n\n" + "\n".join(results)
\ No newline at end of file
+        for suggestion in suggestions
+    ]
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("suggestions", "STRUCT", suggestion_params)]
+    )
+    try:
+        created_rows = client.query(insert_query, job_config=job_config).result()
+        created_rules = {(row['identifier'], row['identifier_type'], row['transaction_type']): row['rule_id'] for row in created_rows}
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error creating rules from suggestion set {suggestion_set_id}: {e}")
+        return f"🚨 **Error**: A database error occurred while creating the suggested rules: {e}"
+
+    # The set is consumed so it cannot be approved twice.
+    del suggestion_sets[suggestion_set_id]
+    state[SUGGESTION_SETS_STATE_KEY] = suggestion_sets
+    logger.info(f"Created {len(created_rules)} of {len(suggestions)} suggested rules from set {suggestion_set_id}.")
+
+    summary = "| Identifier | Identifier Type | Category | Transaction Type | Result |\n|---|---|---|---|---|\n"
+    for suggestion in suggestions:
+        rule_id = created_rules.get((suggestion['identifier'], suggestion['identifier_type'], suggestion['transaction_type']))
+        result = f"Created (Rule ID: `{rule_id}`)" if rule_id else "Skipped, already covered by an existing rule"
+        summary += (f"| `{suggestion['identifier']}` | `{suggestion['identifier_type']}` | "
+                    f"`{suggestion['primary_category']} / {suggestion['secondary_category']}` | `{suggestion['transaction_type']}` | {result} |\n")
+    return f"✅ **Bulk Rule Creation Complete!** {len(created_rules)} of {len(suggestions)} rules were created.\n\n{summary}"
+
+def prune_dead_rules(min_age_days: int = 365, confirmation: Literal["CONFIRM"] | None = None) -> str:
+    """
+    Deactivates active rules that are dead weight in rule-based categorization:
+    rules that have not matched any transaction within `min_age_days` of their
+    creation, reactivation or last hit, and shadowed rules. A rule is shadowed only if it is an
+    exact duplicate of another active rule, i.e. it has the same identifier,
+    identifier_type and transaction_type; rules that merely overlap are kept.
+    Keep the default of a year so rules of merchants that bill quarterly or
+    yearly are not pruned between two charges.
+    Without confirmation the tool only lists the rules it would deactivate.
+    To proceed, you must pass the exact string "CONFIRM" to this tool.
+    """
+    logger.info(f"Looking for dead rules (min_age_days={min_age_days}).")
+    client = bigquery.Client()
+    ensure_tables(client)
+
+    rules_query = f"""
+    SELECT
+        r.rule_id, r.identifier, r.identifier_type, r.transaction_type, r.primary_category, r.secondary_category, r.status,
+        IFNULL(s.hit_count, 0) AS hit_count,
+        GREATEST(COALESCE(s.last_hit_at, s.created_at), COALESCE(s.reactivated_at, s.created_at))
+            < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL @min_age_days DAY) AS is_stale
+    FROM {table('rules')} AS r
+    LEFT JOIN {table('rule_stats')} AS s USING (rule_id)
+    WHERE r.status = 'active'
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("min_age_days", "INT64", min_age_days)]
+    )
+    try:
+        rules_df = query_to_frame(client, rules_query, job_config)
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error while collecting rule statistics: {e}")
+        return f"🚨 **Error**: A database error occurred while collecting rule statistics: {e}"
+
+    # Of identical rules, the one with the most hits is kept.
+    shadowed_df = find_shadowed_rules(rules_df.sort_values('hit_count', ascending=False, kind='stable'))
+    dead_df = rules_df[rules_df['is_stale'].fillna(False).astype(bool)]
+    reasons = {rule_id: f"no hits in {min_age_days} days" for rule_id in dead_df['rule_id']}
+    reasons.update({rule_id: "exact duplicate of another rule" for rule_id in shadowed_df['rule_id']})
+    if not reasons:
+        return "👍 **No Dead Rules**: Every active rule has matched transactions recently and none are shadowed."
+
+    prune_df = rules_df[rules_df['rule_id'].isin(reasons.keys())]
+    summary = "| Rule ID | Identifier | Identifier Type | Transaction Type | Hits | Reason |\n|---|---|---|---|---|---|\n"
+    for rule in prune_df.itertuples(index=False):
+        summary += (f"| `{rule.rule_id}` | `{rule.identifier}` | `{rule.identifier_type}` | `{rule.transaction_type}` "
+                    f"| {rule.hit_count} | {reasons[rule.rule_id]} |\n")
+
+    if confirmation != "CONFIRM":
+        return (f"🧹 **{len(prune_df)} rules can be deactivated:**\n\n{summary}\n"
+                'To deactivate them, confirm with `CONFIRM`.')
+
+    update_query = f"""
+    UPDATE {table('rules')}
+    SET status = 'inactive'
+    WHERE rule_id IN UNNEST(@rule_ids)
+    """
+    update_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ArrayQueryParameter("rule_ids", "STRING", sorted(reasons.keys()))]
+    )
+    try:
+        update_job = client.query(update_query, job_config=update_config)
+        update_job.result()
+        logger.info(f"Deactivated {update_job.num_dml_affected_rows} dead rules.")
+        return f"✅ **Dead Rules Deactivated!** {update_job.num_dml_affected_rows} rules were set to `inactive`.\n\n{summary}"
+    except GoogleAPICallError as e:
+        logger.error(f"🚨 BigQuery error deactivating dead rules: {e}")
+        return f"🚨 **Error**: A database error occurred while deactivating dead rules: {e}"
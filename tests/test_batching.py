@@ -0,0 +1,75 @@
+# tests/test_batching.py
+
+import pandas as pd
+from src.txn_agent.common.batching import CHARS_PER_TOKEN, AdaptiveBatchSizer
+from src.txn_agent.common.prompts import (
+    CATEGORIZATION_MAX_INPUT_TOKENS,
+    CATEGORIZATION_PROMPT_TOKEN_BUDGET,
+    CATEGORIZATION_SYSTEM_INSTRUCTION,
+)
+
+def _candidates(count, description_length=20):
+    return pd.DataFrame({
+        'transaction_id': [f"T{i}" for i in range(count)],
+        'merchant_name_cleaned': ['MERCHANT'] * count,
+        'description_cleaned': ['X' * description_length] * count,
+    })
+
+def test_fit_takes_the_leading_rows_up_to_the_target_size():
+    sizer = AdaptiveBatchSizer(initial_size=10)
+    batch_df = sizer.fit(_candidates(50))
+    assert batch_df['transaction_id'].tolist() == [f"T{i}" for i in range(10)]
+
+def test_fit_respects_the_input_token_budget():
+    # Each row costs (400 + 8) // 4 + 8 = 110 tokens.
+    sizer = AdaptiveBatchSizer(initial_size=100, max_input_tokens=1000)
+    assert len(sizer.fit(_candidates(50, description_length=400))) == 9
+
+def test_input_budget_leaves_room_for_the_system_instruction():
+    instruction_tokens = len(CATEGORIZATION_SYSTEM_INSTRUCTION) // CHARS_PER_TOKEN
+    assert 0 < CATEGORIZATION_MAX_INPUT_TOKENS <= CATEGORIZATION_PROMPT_TOKEN_BUDGET - instruction_tokens
+
+def test_fit_respects_the_output_token_budget():
+    sizer = AdaptiveBatchSizer(initial_size=400, max_size=400, max_output_tokens=2400, output_headroom=0.5)
+    assert len(sizer.fit(_candidates(500))) == 50
+
+def test_fit_always_makes_progress_on_an_oversized_row():
+    sizer = AdaptiveBatchSizer(max_input_tokens=10)
+    assert len(sizer.fit(_candidates(3, description_length=1000))) == 1
+
+def test_size_grows_additively_after_full_successful_batches():
+    sizer = AdaptiveBatchSizer(initial_size=100, growth_step=25)
+    sizer.record(100, 5.0, 100)
+    sizer.record(125, 5.0, 125)
+    assert sizer.size == 150
+
+def test_partial_batches_do_not_grow_the_size():
+    sizer = AdaptiveBatchSizer(initial_size=100)
+    sizer.record(40, 5.0, 40)
+    assert sizer.size == 100
+
+def test_size_halves_on_truncation_and_failures():
+    sizer = AdaptiveBatchSizer(initial_size=200, min_size=5)
+    sizer.record(200, 5.0, 150, truncated=True)
+    assert sizer.size == 100
+    sizer.record(100, 5.0, 0, failed=True)
+    assert sizer.size == 50
+    assert (sizer.truncated_calls, sizer.failed_calls) == (1, 1)
+
+def test_size_shrinks_in_proportion_to_slow_calls_but_not_below_the_minimum():
+    sizer = AdaptiveBatchSizer(initial_size=100, min_size=20, target_latency_seconds=30.0)
+    sizer.record(100, 60.0, 100)
+    assert sizer.size == 50
+    sizer.record(50, 600.0, 50)
+    assert sizer.size == 20
+
+def test_summary_reports_batches_and_throughput():
+    sizer = AdaptiveBatchSizer(initial_size=10)
+    sizer.fit(_candidates(30))
+    sizer.record(10, 2.0, 10)
+    sizer.fit(_candidates(30))
+    sizer.record(35, 3.0, 40)
+    summary = sizer.summary()
+    assert summary['batches'] == 2 and summary['llm_calls'] == 2
+    assert (summary['min_batch_size'], summary['max_batch_size']) == (10, 30)
+    assert summary['rows_per_second'] == 10.0
@@ -0,0 +1,121 @@
+# tests/test_cancellation.py
+
+import asyncio
+import pytest
+from google.adk.agents import Agent
+from google.adk.models import BaseLlm, LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools import FunctionTool, ToolContext
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+from src.txn_agent.common import tenancy
+from src.txn_agent.common.cancellation import CancellationToken, cancellation_token
+from src.txn_agent.common.tenancy import tenant_lock, tenant_tool, use_tenant, use_user
+from src.txn_agent.tools import categorization_tools
+from src.txn_agent.tools.cancellation_tools import request_cancellation
+
+@pytest.fixture
+def two_tenants(monkeypatch):
+    monkeypatch.setitem(tenancy.TENANT_DATASETS, "acme", "project.acme")
+
+def test_cancellation_only_stops_the_requesting_user():
+    token = CancellationToken()
+    with use_user("user-a"):
+        token.request_cancellation()
+        assert token.is_cancellation_requested()
+    with use_user("user-b"):
+        assert not token.is_cancellation_requested()
+    with use_user("user-a"):
+        token.reset()
+        assert not token.is_cancellation_requested()
+
+def test_cancellation_is_scoped_to_the_tenant(two_tenants):
+    token = CancellationToken()
+    with use_user("user-a"):
+        token.request_cancellation()
+        with use_tenant("acme"):
+            assert not token.is_cancellation_requested()
+
+def test_tenant_locks_are_shared_within_a_tenant_only(two_tenants):
+    assert tenant_lock("categorization") is tenant_lock("categorization")
+    with use_tenant("acme"):
+        assert tenant_lock("categorization") is not tenant_lock("other work")
+        acme_lock = tenant_lock("categorization")
+    assert acme_lock is not tenant_lock("categorization")
+
+def test_a_second_categorization_of_a_tenant_is_refused_while_one_runs():
+    lock = tenant_lock("categorization")
+    with lock:
+        assert "Already Running" in categorization_tools.run_categorization()
+        assert "Already Running" in categorization_tools.apply_rule_changes(["rule-1"])
+    assert not lock.locked()
+
+class _ScriptedLlm(BaseLlm):
+    """A model that answers every request with the next of its scripted responses."""
+    responses: list
+
+    async def generate_content_async(self, llm_request, stream=False):
+        yield self.responses.pop(0)
+
+def _call(name, **args):
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]))
+
+def _reply(text):
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+def _run(agent):
+    async def run():
+        runner = InMemoryRunner(agent=agent, app_name="txn_agent")
+        session = await runner.session_service.create_session(app_name="txn_agent", user_id="analyst-1")
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        async for _ in runner.run_async(user_id="analyst-1", session_id=session.id, new_message=message):
+            pass
+    asyncio.run(run())
+
+@pytest.fixture
+def probe():
+    observed = []
+
+    def check_cancellation(tool_context: ToolContext | None = None) -> str:
+        """Records whether a cancellation is pending."""
+        observed.append((tool_context.session.id, cancellation_token.is_cancellation_requested()))
+        return "checked"
+
+    yield tenant_tool(check_cancellation), observed
+    cancellation_token._cancelled_users.clear()
+
+def _worker(name, tool, responses):
+    return AgentTool(agent=Agent(name=name, model=_ScriptedLlm(model="scripted", responses=responses), tools=[FunctionTool(func=tool)]))
+
+def test_cancellation_from_the_root_reaches_a_delegated_run(probe):
+    check_cancellation, observed = probe
+    root = Agent(
+        name="root",
+        model=_ScriptedLlm(model="scripted", responses=[_call("request_cancellation"), _call("worker", request="run"), _reply("done")]),
+        tools=[
+            FunctionTool(func=tenant_tool(request_cancellation, offload=False)),
+            _worker("worker", check_cancellation, [_call("check_cancellation"), _reply("ok")]),
+        ],
+    )
+    _run(root)
+    assert [requested for _, requested in observed] == [True]
+
+def test_cancellation_in_one_delegation_reaches_another(probe):
+    check_cancellation, observed = probe
+    cancel_tool = tenant_tool(request_cancellation, offload=False)
+    root = Agent(
+        name="root",
+        model=_ScriptedLlm(model="scripted", responses=[_call("canceller", request="stop"), _call("worker", request="run"), _reply("done")]),
+        tools=[
+            _worker("canceller", cancel_tool, [_call("request_cancellation"), _reply("stopped")]),
+            _worker("worker", check_cancellation, [_call("check_cancellation"), _reply("ok")]),
+        ],
+    )
+    _run(root)
+    assert [requested for _, requested in observed] == [True]
+
+def test_finished_run_clears_its_cancellation(probe):
+    with use_user("analyst-1"):
+        cancellation_token.request_cancellation()
+        categorization_tools._exclusive_per_tenant(lambda: None)()
+        assert not cancellation_token.is_cancellation_requested()
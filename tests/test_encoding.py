@@ -0,0 +1,94 @@
+# tests/test_encoding.py
+
+import warnings
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from src.txn_agent.common.encoding import (
+    CATEGORY_PAIRS,
+    PRIMARY_CATEGORY_DTYPE,
+    decode_categoricals,
+    decode_category_pairs,
+    encode_category_pairs,
+    map_values,
+    query_to_frame,
+    text_values,
+)
+
+class _FakeJob:
+    def __init__(self, arrow_table):
+        self.arrow_table = arrow_table
+
+    def to_arrow(self):
+        return self.arrow_table
+
+class _FakeClient:
+    def __init__(self, arrow_table):
+        self.arrow_table = arrow_table
+
+    def query(self, query, job_config=None):
+        return _FakeJob(self.arrow_table)
+
+def test_category_pairs_round_trip():
+    primary = pd.Series([p for p, _ in CATEGORY_PAIRS])
+    secondary = pd.Series([s for _, s in CATEGORY_PAIRS])
+    codes = encode_category_pairs(primary, secondary)
+    assert codes.tolist() == list(range(len(CATEGORY_PAIRS)))
+    decoded_primary, decoded_secondary = decode_category_pairs(codes)
+    assert list(decoded_primary) == primary.tolist()
+    assert list(decoded_secondary) == secondary.tolist()
+
+def test_invalid_category_pairs_encode_to_minus_one():
+    primary = pd.Series(["Income", "Expense", None, "Unknown"])
+    secondary = pd.Series(["Groceries", "Groceries", "Groceries", "Payroll"])
+    assert encode_category_pairs(primary, secondary).tolist() == [-1, CATEGORY_PAIRS.index(("Expense", "Groceries")), -1, -1]
+
+def test_unknown_categories_encode_without_deprecated_coercion():
+    # Unknown values from the LLM must not rely on pandas silently coercing them to NaN.
+    primary = pd.Series(["Expense", "Savings", None], dtype="category")
+    secondary = pd.Series(["Groceries", "Groceries", "Crypto"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", pd.errors.Pandas4Warning)
+        warnings.simplefilter("error", FutureWarning)
+        codes = encode_category_pairs(primary, secondary)
+    assert codes.tolist() == [CATEGORY_PAIRS.index(("Expense", "Groceries")), -1, -1]
+
+def test_map_values_on_categoricals_and_plain_series():
+    mapping = {"A": 1.0, "B": 2.0}
+    values = ["A", "C", None, "B"]
+    categorical = map_values(pd.Series(values, dtype="category"), mapping)
+    plain = map_values(pd.Series(values, dtype=object), mapping)
+    for mapped in (categorical, plain):
+        assert mapped[[0, 3]].tolist() == [1.0, 2.0]
+        assert np.isnan(mapped[[1, 2]]).all()
+    assert map_values(pd.Series(values, dtype="category"), mapping, default=0.0).tolist() == [1.0, 0.0, 0.0, 2.0]
+
+def test_map_values_on_an_empty_categorical():
+    assert map_values(pd.Series([None, None], dtype="category"), {"A": 1.0}, default=-1.0).tolist() == [-1.0, -1.0]
+
+def test_text_values_replaces_missing_values_with_empty_strings():
+    series = pd.Series(["COFFEE", None, "RENT"], dtype="category")
+    assert text_values(series).tolist() == ["COFFEE", "", "RENT"]
+
+def test_query_to_frame_dictionary_encodes_only_listed_string_columns():
+    arrow_table = pa.table({
+        "transaction_id": ["T1", "T2", "T3"],
+        "merchant_name_cleaned": ["NETFLIX", "NETFLIX", None],
+        "amount": [1.0, 2.0, 3.0],
+    })
+    frame = query_to_frame(_FakeClient(arrow_table), "SELECT 1")
+    assert isinstance(frame["merchant_name_cleaned"].dtype, pd.CategoricalDtype)
+    assert list(frame["merchant_name_cleaned"].cat.categories) == ["NETFLIX"]
+    assert not isinstance(frame["transaction_id"].dtype, pd.CategoricalDtype)
+    assert frame["amount"].tolist() == [1.0, 2.0, 3.0]
+
+def test_decode_categoricals_returns_plain_strings():
+    frame = pd.DataFrame({
+        "primary_category": pd.Categorical(["Expense", None], dtype=PRIMARY_CATEGORY_DTYPE),
+        "amount": [1.0, 2.0],
+    })
+    decoded = decode_categoricals(frame)
+    assert decoded["primary_category"].dtype == object
+    assert decoded["primary_category"].tolist()[0] == "Expense"
+    assert pd.isna(decoded["primary_category"].tolist()[1])
+    assert decoded["amount"].dtype == np.float64
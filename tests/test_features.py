@@ -0,0 +1,96 @@
+# tests/test_features.py
+
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from src.txn_agent.common.features import FEATURE_COLUMNS, SPEND_SHARE_COLUMNS, compute_credit_features
+
+def _transaction(account_id, date, amount, primary_category, secondary_category, is_recurring=False, is_overdraft=False):
+    return {
+        'account_id': account_id, 'consumer_name': f"Consumer {account_id}", 'persona_type': 'Salaried',
+        'transaction_date': pd.Timestamp(date, tz='UTC'), 'transaction_type': 'Credit' if amount > 0 else 'Debit',
+        'amount': amount, 'primary_category': primary_category, 'secondary_category': secondary_category,
+        'is_recurring': is_recurring, 'is_overdraft': is_overdraft,
+    }
+
+def _history():
+    transactions = []
+    for month in range(1, 7):
+        transactions.append(_transaction('A', f'2024-{month:02d}-01', 3000.0, 'Income', 'Payroll'))
+        transactions.append(_transaction('A', f'2024-{month:02d}-05', -1000.0, 'Expense', 'Rent Payment', is_recurring=True))
+        transactions.append(_transaction('A', f'2024-{month:02d}-10', -300.0, 'Expense', 'Groceries'))
+        transactions.append(_transaction('B', f'2024-{month:02d}-01', 4000.0 if month <= 3 else 1000.0, 'Income', 'Payroll'))
+    transactions.append(_transaction('A', '2024-03-15', -35.0, 'Expense', 'Fees & Charges', is_overdraft=True))
+    transactions.append(_transaction('B', '2024-02-20', 5000.0, 'Transfer', 'Other Income'))
+    return pd.DataFrame(transactions)
+
+def _features(transactions_df):
+    return compute_credit_features(transactions_df).set_index('account_id')
+
+def test_features_cover_every_column_once_per_account():
+    features_df = compute_credit_features(_history())
+    assert list(features_df.columns) == list(FEATURE_COLUMNS)
+    assert sorted(features_df['account_id']) == ['A', 'B']
+
+def test_history_and_income_features():
+    features = _features(_history()).loc['A']
+    assert features['months_observed'] == 6
+    assert features['transaction_count'] == 19
+    assert features['first_transaction_date'] == pd.Timestamp('2024-01-01', tz='UTC')
+    assert features['last_transaction_date'] == pd.Timestamp('2024-06-10', tz='UTC')
+    assert features['avg_monthly_income'] == pytest.approx(3000.0)
+    assert features['income_cv'] == pytest.approx(0.0)
+    assert features['income_stability'] == pytest.approx(1.0)
+    assert features['income_months_share'] == pytest.approx(1.0)
+
+def test_expense_recurring_and_fee_features():
+    features = _features(_history()).loc['A']
+    assert features['avg_monthly_expense'] == pytest.approx((1300.0 * 6 + 35.0) / 6)
+    assert features['recurring_obligation_ratio'] == pytest.approx(6000.0 / 18000.0)
+    assert features['fee_frequency'] == pytest.approx(1 / 6)
+    assert features['overdraft_frequency'] == pytest.approx(1 / 6)
+    assert features['net_cash_flow_ratio'] == pytest.approx((18000.0 - 7835.0) / 18000.0)
+
+def test_spend_shares_add_up_to_one():
+    features = _features(_history()).loc['A']
+    assert features['spend_share_groceries'] == pytest.approx(1800.0 / 7835.0)
+    assert features['spend_share_rent_payment'] == pytest.approx(6000.0 / 7835.0)
+    assert features[SPEND_SHARE_COLUMNS].sum() + features['uncategorized_spend_share'] == pytest.approx(1.0)
+
+def test_unknown_categories_count_as_uncategorized_spend():
+    # Categories outside the expense vocabulary must not rely on pandas silently coercing them to NaN.
+    history = _history()
+    history.loc[history['secondary_category'] == 'Groceries', 'secondary_category'] = 'Crypto'
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", pd.errors.Pandas4Warning)
+        warnings.simplefilter("error", FutureWarning)
+        features = _features(history).loc['A']
+    assert features['spend_share_groceries'] == pytest.approx(0.0)
+    assert features['uncategorized_spend_share'] == pytest.approx(1800.0 / 7835.0)
+
+def test_income_drop_is_detected_and_transfers_are_ignored():
+    features = _features(_history()).loc['B']
+    assert features['avg_monthly_income'] == pytest.approx(2500.0)
+    assert features['income_shift_3m'] == pytest.approx(-0.75)
+    assert features['max_income_drop_3m'] == pytest.approx(0.75)
+    assert features['transaction_count'] == 7
+    # Without debits the expense features are undefined rather than zero.
+    assert np.isnan(features['expense_volatility'])
+    assert np.isnan(features['spend_share_groceries'])
+
+def test_stable_account_has_no_shift():
+    features = _features(_history()).loc['A']
+    assert features['income_shift_3m'] == pytest.approx(0.0)
+    assert features['max_income_drop_3m'] == pytest.approx(0.0)
+
+def test_row_order_does_not_change_the_features():
+    transactions_df = _history()
+    shuffled_df = transactions_df.sample(frac=1.0, random_state=7).reset_index(drop=True)
+    columns = [column for column in FEATURE_COLUMNS if column not in ('account_id', 'computed_at')]
+    pd.testing.assert_frame_equal(_features(transactions_df)[columns].sort_index(), _features(shuffled_df)[columns].sort_index())
+
+def test_empty_history_returns_no_accounts():
+    features_df = compute_credit_features(_history().iloc[:0])
+    assert features_df.empty
+    assert list(features_df.columns) == list(FEATURE_COLUMNS)
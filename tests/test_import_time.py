@@ -0,0 +1,19 @@
+# tests/test_import_time.py
+
+import subprocess
+import sys
+from benchmarks.import_time import REPO_ROOT, measure_import
+
+ROOT_MODULE = "src.txn_agent.agents.root"
+
+def test_root_agent_does_not_import_heavy_dependencies():
+    # google.adk itself is needed to build the root agent; BigQuery, Vertex AI, pandas and NumPy are not.
+    _, _, loaded_heavy = measure_import(ROOT_MODULE)
+    assert loaded_heavy == []
+
+def test_root_agent_does_not_import_sub_agents_or_their_tools():
+    check = (f"import sys, {ROOT_MODULE}; "
+             "print(','.join(m for m in sys.modules if m.startswith(('src.txn_agent.tools', 'src.txn_agent.agents.'))))")
+    result = subprocess.run([sys.executable, "-c", check], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    loaded = set(filter(None, result.stdout.strip().split(",")))
+    assert loaded == {ROOT_MODULE, "src.txn_agent.agents.routing"}
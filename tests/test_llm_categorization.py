@@ -0,0 +1,87 @@
+# tests/test_llm_categorization.py
+
+import types
+import pandas as pd
+import pytest
+from google.api_core.exceptions import PermissionDenied, ServiceUnavailable
+from src.txn_agent.common.batching import AdaptiveBatchSizer
+from src.txn_agent.tools import categorization_tools
+from src.txn_agent.tools.categorization_tools import LLMServiceError, _categorize_batch, _iter_streamed_array_items
+
+def _response(text, finish_reason=None):
+    candidate = types.SimpleNamespace(finish_reason=types.SimpleNamespace(name=finish_reason) if finish_reason else None)
+    return types.SimpleNamespace(text=text, candidates=[candidate])
+
+class FakeModel:
+    """Streams scripted responses; an exception in the script is raised instead of a response."""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.calls = 0
+
+    def generate_content(self, payload, generation_config=None, stream=False):
+        self.calls += 1
+        script = self.scripts.pop(0)
+        if isinstance(script, Exception):
+            raise script
+        return iter(script)
+
+def _batch(size):
+    return pd.DataFrame({
+        'transaction_id': [f"T{i}" for i in range(size)],
+        'merchant_name_cleaned': [f"MERCHANT {i}" for i in range(size)],
+        'description_cleaned': [f"PURCHASE AT MERCHANT {i}" for i in range(size)],
+        'transaction_type': ['Debit'] * size,
+    })
+
+def _item(i):
+    return f'{{"i":{i},"p":"Expense","s":"Groceries"}}'
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(categorization_tools, "_LLM_RETRY", categorization_tools._LLM_RETRY.with_delay(initial=0.001, maximum=0.001))
+
+def test_streamed_items_are_yielded_across_chunk_boundaries():
+    chunks = ['[{"i":0,"p":"Exp', 'ense"},', ' {"i":1}', ',{"i":2,"s":"x"}]']
+    assert list(_iter_streamed_array_items(chunks)) == [{"i": 0, "p": "Expense"}, {"i": 1}, {"i": 2, "s": "x"}]
+
+def test_truncated_stream_keeps_complete_items():
+    assert list(_iter_streamed_array_items(['[{"i":0},{"i":1},{"i":2,"p":"Exp'])) == [{"i": 0}, {"i": 1}]
+
+def test_malformed_tail_stops_parsing_quietly():
+    assert list(_iter_streamed_array_items(['[{"i":0}, oops {"i":1}]'])) == [{"i": 0}]
+
+def test_batch_is_categorized_from_a_stream():
+    model = FakeModel([_response('[' + _item(0) + ','), _response(_item(1) + ']', 'STOP')])
+    categorized, failed = _categorize_batch(model, _batch(2), AdaptiveBatchSizer())
+    assert sorted(row['transaction_id'] for row in categorized) == ['T0', 'T1']
+    assert failed == []
+
+def test_missing_rows_are_bisected_until_a_single_row_fails():
+    model = FakeModel(
+        [_response('[' + _item(0) + ']')],  # T1 and T2 are missing.
+        [_response('[]')],                   # First half (T1): still missing.
+        [_response('[' + _item(0) + ']')],  # Second half (T2): categorized.
+    )
+    categorized, failed = _categorize_batch(model, _batch(3), AdaptiveBatchSizer())
+    assert sorted(row['transaction_id'] for row in categorized) == ['T0', 'T2']
+    assert failed == ['T1']
+
+def test_transient_service_errors_are_retried():
+    model = FakeModel(ServiceUnavailable("unavailable"), [_response('[' + _item(0) + ']')])
+    categorized, failed = _categorize_batch(model, _batch(1), AdaptiveBatchSizer())
+    assert model.calls == 2
+    assert [row['transaction_id'] for row in categorized] == ['T0'] and failed == []
+
+def test_persistent_service_errors_raise_instead_of_failing_rows():
+    batch_sizer = AdaptiveBatchSizer()
+    with pytest.raises(LLMServiceError) as raised:
+        _categorize_batch(FakeModel(PermissionDenied("denied")), _batch(4), batch_sizer)
+    assert raised.value.categorized == []
+    assert batch_sizer.failed_calls == 1
+
+def test_service_error_during_bisection_keeps_the_rows_categorized_so_far():
+    model = FakeModel([_response('[' + _item(0) + ']')], PermissionDenied("denied"))
+    with pytest.raises(LLMServiceError) as raised:
+        _categorize_batch(model, _batch(3), AdaptiveBatchSizer())
+    assert [row['transaction_id'] for row in raised.value.categorized] == ['T0']
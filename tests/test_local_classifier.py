@@ -0,0 +1,106 @@
+# tests/test_local_classifier.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.txn_agent.common.local_classifier import LocalCategoryClassifier
+from src.txn_agent.tools.categorization_tools import LOCAL_MODEL_CONFIDENCE_THRESHOLD, _accepted_predictions
+
+MERCHANTS = {
+    ("Expense", "Groceries"): ["TRADER JOES", "SAFEWAY", "WHOLE FOODS"],
+    ("Expense", "Coffee Shop"): ["STARBUCKS", "BLUE BOTTLE COFFEE"],
+    ("Expense", "Auto & Transport"): ["UBER", "SHELL OIL", "CHEVRON"],
+    ("Expense", "Shopping"): ["AMAZON", "TARGET"],
+    ("Expense", "Pharmacy"): ["CVS PHARMACY", "WALGREENS"],
+    ("Income", "Payroll"): ["ACME CORP PAYROLL"],
+}
+
+def _transactions(count, seed=0, label_noise=0.0):
+    rng = np.random.default_rng(seed)
+    pairs = list(MERCHANTS)
+    rows = []
+    for _ in range(count):
+        primary, secondary = pairs[rng.integers(len(pairs))]
+        merchant = MERCHANTS[(primary, secondary)][rng.integers(len(MERCHANTS[(primary, secondary)]))]
+        if primary == "Expense" and rng.random() < label_noise:
+            secondary = ["Groceries", "Coffee Shop", "Auto & Transport", "Shopping", "Pharmacy"][rng.integers(5)]
+        rows.append({
+            "merchant_name_cleaned": merchant,
+            "description_cleaned": f"{['POS DEBIT ', 'SQ *', ''][rng.integers(3)]}{merchant} #{rng.integers(100, 9999)} {['SF CA', 'NY NY'][rng.integers(2)]}",
+            "transaction_type": "Debit" if primary == "Expense" else "Credit",
+            "primary_category": primary,
+            "secondary_category": secondary,
+        })
+    return pd.DataFrame(rows)
+
+@pytest.fixture(scope="module")
+def classifier():
+    return LocalCategoryClassifier().fit(_transactions(3000))
+
+def test_known_merchants_are_predicted_and_accepted(classifier):
+    test_df = _transactions(500, seed=1)
+    predictions_df = classifier.predict(test_df)
+    assert (predictions_df['secondary_category'].astype(str) == test_df['secondary_category']).all()
+    assert _accepted_predictions(predictions_df).all()
+
+def test_unseen_merchant_is_rejected(classifier):
+    unseen_df = pd.DataFrame({
+        "merchant_name_cleaned": ["HOME DEPOT", "NETFLIX"],
+        "description_cleaned": ["HOME DEPOT #4521 SF CA", "NETFLIX.COM LOS GATOS CA"],
+        "transaction_type": ["Debit", "Debit"],
+    })
+    predictions_df = classifier.predict(unseen_df)
+    assert not predictions_df['known_merchant'].any()
+    assert not _accepted_predictions(predictions_df).any()
+
+def test_unseen_text_is_not_confident_on_noisy_labels():
+    classifier = LocalCategoryClassifier(merchant_min_support=10 ** 9).fit(_transactions(5000, label_noise=0.1))
+    predictions_df = classifier.predict(pd.DataFrame({
+        "merchant_name_cleaned": ["HOME DEPOT"],
+        "description_cleaned": ["HOME DEPOT #4521 SF CA"],
+        "transaction_type": ["Debit"],
+    }))
+    assert predictions_df['confidence'].iloc[0] < LOCAL_MODEL_CONFIDENCE_THRESHOLD
+
+def test_confidence_is_calibrated_on_noisy_labels():
+    # Without the merchant lookup, only the calibrated n-gram model decides.
+    classifier = LocalCategoryClassifier(merchant_min_support=10 ** 9).fit(_transactions(5000, label_noise=0.1))
+    test_df = _transactions(2000, seed=2, label_noise=0.1)
+    predictions_df = classifier.predict(test_df)
+    accuracy = (predictions_df['secondary_category'].astype(str) == test_df['secondary_category']).mean()
+    assert abs(predictions_df['confidence'].mean() - accuracy) < 0.1
+    assert classifier.temperature > 0.01
+
+def test_predictions_follow_the_transaction_type(classifier):
+    flipped_df = _transactions(100, seed=3).assign(transaction_type="Credit")
+    assert (classifier.predict(flipped_df)['primary_category'] == "Income").all()
+
+def test_classes_without_training_rows_are_never_predicted(classifier):
+    predictions_df = classifier.predict(_transactions(300, seed=4).assign(merchant_name_cleaned="UNKNOWN"))
+    trained = {secondary for _, secondary in MERCHANTS}
+    assert set(predictions_df['secondary_category'].astype(str)) <= trained
+
+def test_chunked_fit_matches_a_single_pass():
+    labeled_df = _transactions(400, seed=5)
+    chunked = LocalCategoryClassifier().fit(labeled_df, chunk_size=7)
+    single = LocalCategoryClassifier().fit(labeled_df, chunk_size=10 ** 6)
+    np.testing.assert_array_equal(chunked.feature_log_probs, single.feature_log_probs)
+    assert chunked.temperature == single.temperature
+
+def test_consistent_merchants_use_the_lookup_with_their_purity():
+    labeled_df = _transactions(600, seed=6)
+    labeled_df.loc[labeled_df['merchant_name_cleaned'] == "AMAZON", "secondary_category"] = "Groceries"
+    classifier = LocalCategoryClassifier().fit(labeled_df)
+    predictions_df = classifier.predict(pd.DataFrame({
+        "merchant_name_cleaned": ["AMAZON"], "description_cleaned": ["AMAZON MKTPLACE"], "transaction_type": ["Debit"],
+    }))
+    assert predictions_df['secondary_category'].iloc[0] == "Groceries"
+    assert predictions_df['confidence'].iloc[0] >= classifier.merchant_purity["AMAZON"]
+
+def test_transaction_types_without_trained_classes_get_no_confidence():
+    expense_df = _transactions(500, seed=7).query("primary_category == 'Expense'")
+    classifier = LocalCategoryClassifier().fit(expense_df)
+    predictions_df = classifier.predict(pd.DataFrame({
+        "merchant_name_cleaned": ["ACME CORP PAYROLL"], "description_cleaned": ["ACME CORP PAYROLL DIRECT DEP"], "transaction_type": ["Credit"],
+    }))
+    assert predictions_df['confidence'].iloc[0] == 0.0
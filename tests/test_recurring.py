@@ -0,0 +1,77 @@
+# tests/test_recurring.py
+
+import pandas as pd
+from src.txn_agent.common.recurring import detect_recurring
+
+def _series(merchant, dates, amounts, account_id='A1', transaction_type='Debit'):
+    return pd.DataFrame({
+        'transaction_id': [f"{account_id}-{merchant}-{transaction_type}-{i}" for i in range(len(dates))],
+        'account_id': account_id,
+        'merchant_name_cleaned': merchant,
+        'transaction_type': transaction_type,
+        'transaction_date': pd.to_datetime(dates, utc=True),
+        'amount': amounts,
+    })
+
+def _periods(result_df):
+    periods = result_df['recurring_period'].astype(object).where(result_df['recurring_period'].notna(), None)
+    return dict(zip(result_df['transaction_id'], periods))
+
+def test_monthly_subscription_is_recurring():
+    dates = pd.date_range('2024-01-15', periods=6, freq='MS') + pd.Timedelta(days=14)
+    result_df = detect_recurring(_series('NETFLIX', dates, [-15.49] * 6))
+    assert result_df['is_recurring'].all()
+    assert set(result_df['recurring_period']) == {'monthly'}
+
+def test_each_period_is_detected():
+    transactions_df = pd.concat([
+        _series('GYM', pd.date_range('2024-01-01', periods=4, freq='7D'), [-10.0] * 4),
+        _series('PAYROLL', pd.date_range('2024-01-05', periods=4, freq='14D'), [2000.0] * 4, transaction_type='Credit'),
+        _series('INSURANCE', ['2022-03-01', '2023-03-01', '2024-03-01'], [-600.0, -620.0, -640.0]),
+    ], ignore_index=True)
+    result_df = detect_recurring(transactions_df)
+    assert result_df['is_recurring'].all()
+    assert result_df.groupby(transactions_df['merchant_name_cleaned'])['recurring_period'].first().to_dict() == {
+        'GYM': 'weekly', 'INSURANCE': 'annual', 'PAYROLL': 'biweekly',
+    }
+
+def test_too_few_occurrences_are_not_recurring():
+    result_df = detect_recurring(_series('NETFLIX', ['2024-01-15', '2024-02-15'], [-15.49] * 2))
+    assert not result_df['is_recurring'].any()
+    assert result_df['recurring_period'].isna().all()
+
+def test_unstable_amounts_are_not_recurring():
+    dates = pd.date_range('2024-01-01', periods=6, freq='MS')
+    result_df = detect_recurring(_series('GROCER', dates, [-20.0, -150.0, -45.0, -300.0, -12.0, -90.0]))
+    assert not result_df['is_recurring'].any()
+
+def test_irregular_intervals_are_not_recurring():
+    dates = ['2024-01-01', '2024-01-31', '2024-03-01', '2024-03-05', '2024-03-09', '2024-04-08', '2024-04-12']
+    result_df = detect_recurring(_series('CAFE', dates, [-5.0] * len(dates)))
+    assert not result_df['is_recurring'].any()
+
+def test_series_are_split_by_account_and_transaction_type():
+    dates = pd.date_range('2024-01-01', periods=3, freq='MS')
+    transactions_df = pd.concat([
+        _series('NETFLIX', dates[:2], [-15.49] * 2, account_id='A1'),
+        _series('NETFLIX', dates[2:], [-15.49], account_id='A2'),
+        _series('SPOTIFY', dates, [-9.99] * 3),
+        _series('SPOTIFY', dates[:1], [9.99], transaction_type='Credit'),
+    ], ignore_index=True)
+    assert _periods(detect_recurring(transactions_df)) == {
+        'A1-NETFLIX-Debit-0': None, 'A1-NETFLIX-Debit-1': None, 'A2-NETFLIX-Debit-0': None,
+        'A1-SPOTIFY-Debit-0': 'monthly', 'A1-SPOTIFY-Debit-1': 'monthly', 'A1-SPOTIFY-Debit-2': 'monthly',
+        'A1-SPOTIFY-Credit-0': None,
+    }
+
+def test_unsorted_input_keeps_its_index():
+    dates = pd.date_range('2024-01-01', periods=4, freq='MS')
+    transactions_df = _series('NETFLIX', dates, [-15.49] * 4).iloc[::-1]
+    result_df = detect_recurring(transactions_df)
+    assert result_df.index.tolist() == transactions_df.index.tolist()
+    assert result_df['is_recurring'].all()
+
+def test_empty_input_returns_empty_result():
+    result_df = detect_recurring(_series('NETFLIX', [], []))
+    assert result_df.empty
+    assert list(result_df.columns) == ['transaction_id', 'is_recurring', 'recurring_period']
@@ -0,0 +1,66 @@
+# tests/test_routing.py
+
+from types import SimpleNamespace
+from google.adk.models import LlmRequest
+from google.genai import types
+from src.txn_agent.agents.routing import MAIN_MENU, ROUTED_CALL_STATE_KEY, route_menu_selection
+
+def _context(state=None):
+    return SimpleNamespace(state={} if state is None else state)
+
+def _text(role, text):
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+def _request(*contents):
+    return LlmRequest(contents=list(contents))
+
+def _function_call(response):
+    parts = [part for part in response.content.parts if part.function_call]
+    return parts[0].function_call if parts else None
+
+def test_greeting_and_empty_history_get_the_menu():
+    for llm_request in (_request(), _request(_text("user", "Hello!"))):
+        response = route_menu_selection(_context(), llm_request)
+        assert response.content.parts[0].text == MAIN_MENU
+
+def test_menu_number_after_the_menu_calls_the_tool():
+    context = _context()
+    response = route_menu_selection(context, _request(_text("user", "hi"), _text("model", MAIN_MENU), _text("user", "1.")))
+    assert _function_call(response).name == "run_categorization"
+    assert _function_call(response).args == {}
+    assert context.state[ROUTED_CALL_STATE_KEY] == "run_categorization"
+
+def test_menu_number_for_a_sub_agent_forwards_the_request():
+    response = route_menu_selection(_context(), _request(_text("model", MAIN_MENU), _text("user", "3")))
+    assert _function_call(response).name == "rules_manager"
+    assert _function_call(response).args == {"request": "Manage Rules"}
+
+def test_menu_number_without_the_menu_falls_through():
+    context = _context()
+    llm_request = _request(_text("model", "How many transactions do you want to see?"), _text("user", "3"))
+    assert route_menu_selection(context, llm_request) is None
+    assert ROUTED_CALL_STATE_KEY not in context.state
+
+def test_commands_route_without_the_menu():
+    response = route_menu_selection(_context(), _request(_text("user", "Run Audit")))
+    assert _function_call(response).name == "run_data_quality_audit"
+    response = route_menu_selection(_context(), _request(_text("user", "Stop categorization")))
+    assert _function_call(response).name == "request_cancellation"
+
+def test_free_text_falls_through():
+    llm_request = _request(_text("user", "What did I spend on groceries last month?"))
+    assert route_menu_selection(_context(), llm_request) is None
+
+def test_routed_tool_response_is_returned_as_text():
+    context = _context({ROUTED_CALL_STATE_KEY: "run_data_quality_audit"})
+    function_response = types.Part(function_response=types.FunctionResponse(
+        name="run_data_quality_audit", response={"result": "✅ **Audit Complete!**"}))
+    response = route_menu_selection(context, _request(types.Content(role="user", parts=[function_response])))
+    assert response.content.parts[0].text == "✅ **Audit Complete!**"
+    assert context.state[ROUTED_CALL_STATE_KEY] is None
+
+def test_response_of_another_tool_falls_through():
+    context = _context({ROUTED_CALL_STATE_KEY: "run_data_quality_audit"})
+    function_response = types.Part(function_response=types.FunctionResponse(name="run_full_cleanup", response={"result": "done"}))
+    assert route_menu_selection(context, _request(types.Content(role="user", parts=[function_response]))) is None
+    assert context.state[ROUTED_CALL_STATE_KEY] == "run_data_quality_audit"
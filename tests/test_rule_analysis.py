@@ -0,0 +1,60 @@
+# tests/test_rule_analysis.py
+
+import pandas as pd
+from src.txn_agent.common.rule_analysis import find_invalid_rules, find_overlapping_rules, find_shadowed_rules
+
+def _rules(*rules):
+    return pd.DataFrame([
+        {
+            'rule_id': rule_id, 'identifier': identifier, 'identifier_type': 'merchant_name_cleaned',
+            'transaction_type': 'Debit', 'primary_category': primary, 'secondary_category': secondary,
+            'status': status,
+        }
+        for rule_id, identifier, primary, secondary, status in rules
+    ])
+
+def test_find_invalid_rules_reports_unknown_category_pairs():
+    rules_df = _rules(
+        ("R1", "NETFLIX", "Expense", "Streaming Services", "active"),
+        ("R2", "SHELL", "Income", "Streaming Services", "active"),
+    )
+    assert find_invalid_rules(rules_df)['rule_id'].tolist() == ["R2"]
+
+def test_find_shadowed_rules_reports_exact_duplicates_after_the_first():
+    rules_df = _rules(
+        ("R1", "NETFLIX", "Expense", "Streaming Services", "active"),
+        ("R2", "NETFLIX", "Expense", "Shopping", "active"),
+        ("R3", "NETFLIX", "Expense", "Streaming Services", "active"),
+    )
+    assert find_shadowed_rules(rules_df)['rule_id'].tolist() == ["R2", "R3"]
+
+def test_find_shadowed_rules_ignores_inactive_and_differently_scoped_rules():
+    rules_df = _rules(
+        ("R1", "NETFLIX", "Expense", "Streaming Services", "active"),
+        ("R2", "NETFLIX", "Expense", "Streaming Services", "inactive"),
+        ("R3", "NETFLIX", "Expense", "Streaming Services", "active"),
+        ("R4", "NETFLIX INC", "Expense", "Streaming Services", "active"),
+    )
+    rules_df.loc[rules_df['rule_id'] == "R3", 'transaction_type'] = 'Credit'
+    assert find_shadowed_rules(rules_df).empty
+
+def test_find_overlapping_rules_pairs_contained_identifiers():
+    rules_df = _rules(
+        ("R1", "AMAZON", "Expense", "Shopping", "active"),
+        ("R2", "AMAZON PRIME", "Expense", "Streaming Services", "active"),
+        ("R3", "AMAZON MARKETPLACE", "Expense", "Shopping", "active"),
+        ("R4", "PRIME", "Expense", "Shopping", "inactive"),
+    )
+    overlaps_df = find_overlapping_rules(rules_df).sort_values('longer_rule_id')
+    assert overlaps_df[['shorter_rule_id', 'longer_rule_id', 'conflicting']].values.tolist() == [
+        ["R1", "R2", True],
+        ["R1", "R3", False],
+    ]
+
+def test_find_overlapping_rules_requires_the_same_scope():
+    rules_df = _rules(
+        ("R1", "AMAZON", "Expense", "Shopping", "active"),
+        ("R2", "AMAZON PRIME", "Expense", "Shopping", "active"),
+    )
+    rules_df.loc[rules_df['rule_id'] == "R2", 'identifier_type'] = 'description_cleaned'
+    assert find_overlapping_rules(rules_df).empty
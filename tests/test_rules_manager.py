@@ -0,0 +1,47 @@
+# tests/test_rules_manager.py
+
+import types
+import pyarrow as pa
+import pytest
+from src.txn_agent.tools import rules_manager_tools
+from src.txn_agent.tools.rules_manager_tools import prune_dead_rules, update_rule_status
+
+class FakeClient:
+    """Records every query; DML reports one affected row and queries return `rows`."""
+
+    def __init__(self):
+        self.queries = []
+        self.rows = pa.table({})
+
+    def query(self, query, job_config=None):
+        self.queries.append(query)
+        return types.SimpleNamespace(result=lambda: None, num_dml_affected_rows=1, to_arrow=lambda: self.rows)
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(rules_manager_tools.bigquery, "Client", lambda: client)
+    monkeypatch.setattr(rules_manager_tools, "ensure_tables", lambda client: None)
+    return client
+
+def _rule_stats_merges(client):
+    return [query for query in client.queries if "MERGE" in query and "rule_stats" in query]
+
+def test_reactivation_restarts_the_grace_period(client):
+    assert "Rule Updated" in update_rule_status("rule-1", "active")
+    [merge] = _rule_stats_merges(client)
+    assert "reactivated_at = CURRENT_TIMESTAMP()" in merge
+
+def test_deactivation_leaves_rule_stats_alone(client):
+    assert "Rule Updated" in update_rule_status("rule-1", "inactive")
+    assert _rule_stats_merges(client) == []
+
+def test_staleness_counts_from_the_latest_reactivation(client):
+    client.rows = pa.Table.from_pylist([{
+        'rule_id': 'rule-1', 'identifier': 'NETFLIX', 'identifier_type': 'merchant_name_cleaned', 'transaction_type': 'Debit',
+        'primary_category': 'Expense', 'secondary_category': 'Subscriptions', 'status': 'active', 'hit_count': 0, 'is_stale': False,
+    }])
+    assert "No Dead Rules" in prune_dead_rules()
+    [rules_query] = client.queries
+    staleness = rules_query.split("AS hit_count,")[1].split("AS is_stale")[0]
+    assert "s.reactivated_at" in staleness and "s.last_hit_at" in staleness and "GREATEST" in staleness